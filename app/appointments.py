@@ -0,0 +1,153 @@
+"""
+Indexed appointment store
+Monotonic ids with O(1) lookup, plus a per-(doctor, date) index of booked
+intervals kept sorted by start time. Bookings never overlap, so conflict
+checks only compare against the neighbouring intervals found by bisection.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+DEFAULT_DURATION_MINUTES = 30
+DAY_START = "08:00"
+DAY_END = "17:00"
+
+
+def parse_minutes(value: str) -> int:
+    """Minutes since midnight for '14:30' or '02:30 PM'"""
+    value = value.strip().upper()
+    fmt = "%I:%M %p" if value.endswith(("AM", "PM")) else "%H:%M"
+    parsed = datetime.strptime(value, fmt)
+    return parsed.hour * 60 + parsed.minute
+
+
+def format_minutes(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class AppointmentConflict(Exception):
+    def __init__(self, existing):
+        super().__init__(f"Conflicts with appointment {existing['id']}")
+        self.existing = existing
+
+
+class DaySchedule:
+    """Non-overlapping [start, end) intervals for one doctor on one date"""
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+
+    def conflict(self, start, end):
+        """Id of a booking overlapping [start, end), or None"""
+        i = bisect_right(self.starts, start)
+        if i > 0 and self.ends[i - 1] > start:
+            return self.ids[i - 1]
+        if i < len(self.starts) and self.starts[i] < end:
+            return self.ids[i]
+        return None
+
+    def insert(self, start, end, appointment_id):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, appointment_id)
+
+    def remove(self, start, appointment_id):
+        i = bisect_left(self.starts, start)
+        while self.ids[i] != appointment_id:
+            i += 1
+        del self.starts[i], self.ends[i], self.ids[i]
+
+    def free(self, duration, day_start, day_end):
+        """Gaps of at least `duration` minutes between day_start and day_end"""
+        slots = []
+        cursor = day_start
+        i = bisect_right(self.ends, day_start)
+        while cursor < day_end:
+            next_start = self.starts[i] if i < len(self.starts) else day_end
+            gap_end = min(next_start, day_end)
+            if gap_end - cursor >= duration:
+                slots.append((cursor, gap_end))
+            if i >= len(self.starts):
+                break
+            cursor = max(cursor, self.ends[i])
+            i += 1
+        return slots
+
+
+class AppointmentStore:
+    def __init__(self):
+        self._by_id = {}
+        self._schedules = {}
+        self._next_id = 1
+        # endpoints run in a thread pool; check-then-book must be atomic
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, appointment_id: int):
+        return self._by_id.get(appointment_id)
+
+    def all(self):
+        return list(self._by_id.values())
+
+    @staticmethod
+    def _interval(appointment):
+        start = parse_minutes(appointment["time"])
+        return start, start + appointment.get("duration_minutes", DEFAULT_DURATION_MINUTES)
+
+    def _schedule(self, doctor, date):
+        key = (doctor, date)
+        schedule = self._schedules.get(key)
+        if schedule is None:
+            schedule = self._schedules[key] = DaySchedule()
+        return schedule
+
+    def create(self, appointment: dict):
+        """Assign the next id and book it, raising AppointmentConflict on overlap"""
+        start, end = self._interval(appointment)
+        with self._lock:
+            schedule = self._schedule(appointment["doctor_name"], appointment["date"])
+            conflict_id = schedule.conflict(start, end)
+            if conflict_id is not None:
+                raise AppointmentConflict(self._by_id[conflict_id])
+            appointment["id"] = self._next_id
+            self._next_id += 1
+            self._by_id[appointment["id"]] = appointment
+            schedule.insert(start, end, appointment["id"])
+        return appointment
+
+    def load(self, appointment: dict):
+        """Index an already-persisted appointment, keeping its id"""
+        start, end = self._interval(appointment)
+        self._by_id[appointment["id"]] = appointment
+        self._schedule(appointment["doctor_name"], appointment["date"]).insert(start, end, appointment["id"])
+        self._next_id = max(self._next_id, appointment["id"] + 1)
+
+    def skip_past(self, appointment_id: int):
+        """Never hand out appointment_id or anything below it"""
+        with self._lock:
+            self._next_id = max(self._next_id, appointment_id + 1)
+
+    def cancel(self, appointment_id: int):
+        with self._lock:
+            appointment = self._by_id.pop(appointment_id, None)
+            if appointment is None:
+                return None
+            key = (appointment["doctor_name"], appointment["date"])
+            schedule = self._schedules[key]
+            schedule.remove(self._interval(appointment)[0], appointment_id)
+            if not schedule.ids:
+                del self._schedules[key]
+        return appointment
+
+    def free_slots(self, doctor: str, date: str, duration=DEFAULT_DURATION_MINUTES,
+                   day_start=DAY_START, day_end=DAY_END):
+        schedule = self._schedules.get((doctor, date)) or DaySchedule()
+        return [
+            {"start": format_minutes(s), "end": format_minutes(e)}
+            for s, e in schedule.free(duration, parse_minutes(day_start), parse_minutes(day_end))
+        ]
@@ -0,0 +1,259 @@
+"""
+Asynchronous HIPAA audit-log pipeline
+Handlers enqueue a record; a background writer batches records into
+JSON-lines and fsyncs each batch as a group. When the queue is full the
+configured backpressure policy either blocks the caller (for at most
+AUDIT_PUT_TIMEOUT seconds) or spills the record to a durable side file that
+the writer merges back in later.
+
+The writer survives I/O errors: a batch it cannot write goes to the spill
+file, and if that fails too it keeps the batch and retries with exponential
+backoff. Handlers never wait on a dead or stuck writer; their records go
+straight to the spill file, and only if that is unwritable as well does
+record() raise AuditUnavailable, so PHI is not served unaudited.
+accepting() tells a write endpoint up front whether a record would be taken,
+so it can shed the request before changing anything.
+hospital_audit_writer_alive and healthy() report the writer's state.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from prometheus_client import Counter, Gauge, Histogram
+
+AUDIT_LOG_PATH = os.getenv("AUDIT_LOG_PATH", "/home/ec2-user/hospital-audit.log")
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.05"))
+AUDIT_BACKPRESSURE = os.getenv("AUDIT_BACKPRESSURE", "block")  # "block" or "spill"
+# Longest a handler waits for queue space under "block" before spilling instead
+AUDIT_PUT_TIMEOUT = float(os.getenv("AUDIT_PUT_TIMEOUT", "2"))
+# Cap on the writer's retry backoff while the disk is failing
+AUDIT_RETRY_MAX_SECONDS = float(os.getenv("AUDIT_RETRY_MAX_SECONDS", "30"))
+
+audit_queue_depth = Gauge('hospital_audit_queue_depth', 'Audit records waiting to be written')
+audit_flush_seconds = Histogram('hospital_audit_flush_seconds', 'Audit batch write+fsync latency')
+audit_records = Counter('hospital_audit_records', 'Audit records by outcome', ['outcome'])
+audit_write_errors = Counter('hospital_audit_write_errors', 'Failed audit writes by target', ['target'])
+audit_writer_alive = Gauge('hospital_audit_writer_alive', '1 while the audit writer thread is running')
+
+
+class AuditUnavailable(Exception):
+    """Neither the audit log nor its spill file can take the record"""
+
+
+def _lines(entries):
+    # default=str: a stray non-JSON field must not make a record unwritable
+    return "".join(json.dumps(e, separators=(",", ":"), default=str) + "\n" for e in entries)
+
+
+class AuditPipeline:
+    def __init__(self, path=AUDIT_LOG_PATH, queue_size=AUDIT_QUEUE_SIZE, batch_size=AUDIT_BATCH_SIZE,
+                 flush_interval=AUDIT_FLUSH_INTERVAL, backpressure=AUDIT_BACKPRESSURE,
+                 put_timeout=AUDIT_PUT_TIMEOUT, retry_max=AUDIT_RETRY_MAX_SECONDS):
+        if backpressure not in ("block", "spill"):
+            raise ValueError(f"Unknown audit backpressure policy: {backpressure}")
+        self.path = path
+        self.spill_path = path + ".spill"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backpressure = backpressure
+        self.put_timeout = put_timeout
+        self.retry_max = retry_max
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._spill_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._file = None  # opened by the writer, so an unwritable path cannot break import
+        self._pending = []  # batch taken off the queue but not yet durable anywhere
+        self.last_error = None
+        self._spill_failed = False  # the last spill attempt failed; cleared by the next that succeeds
+        self._writer = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._writer.start()
+        audit_queue_depth.set_function(self._queue.qsize)
+        audit_writer_alive.set_function(lambda: 1 if self._writer.is_alive() else 0)
+        atexit.register(self.close)
+
+    def healthy(self) -> bool:
+        """Writer running and its last write attempt succeeded"""
+        return self._writer.is_alive() and self.last_error is None
+
+    def accepting(self) -> bool:
+        """Whether a record would be taken now: the queue has room, or the spill file is writable"""
+        if not self._stopped.is_set() and self._writer.is_alive() and not self._queue.full():
+            return True
+        if not self._spill_failed:
+            return True
+        try:
+            # the disk may be back: a cheap probe, so shedding does not outlive the failure
+            open(self.spill_path, "a").close()
+        except OSError:
+            return False
+        return True
+
+    # ---- Request path ----
+
+    def record(self, **fields):
+        """Enqueue one audit record; the only cost a handler pays"""
+        self._enqueue({"ts": datetime.utcnow().isoformat(timespec="microseconds"), **fields})
+
+    def record_many(self, entries):
+        """Enqueue one audit record per entry, sharing a timestamp (bulk writes)"""
+        ts = datetime.utcnow().isoformat(timespec="microseconds")
+        for fields in entries:
+            self._enqueue({"ts": ts, **fields})
+
+    def _enqueue(self, entry):
+        if self._stopped.is_set() or not self._writer.is_alive():
+            self._spill_or_raise([entry])
+            return
+        try:
+            if self.backpressure == "block":
+                self._queue.put(entry, timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            self._spill_or_raise([entry])
+
+    def _spill_or_raise(self, entries):
+        try:
+            self._spill(entries)
+        except OSError as e:
+            self._spill_failed = True
+            audit_write_errors.labels(target="spill").inc()
+            raise AuditUnavailable(f"Audit log and spill file unwritable: {e}") from e
+
+    def _spill(self, entries):
+        lines = _lines(entries)
+        with self._spill_lock, open(self.spill_path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._spill_failed = False
+        audit_records.labels(outcome="spilled").inc(len(entries))
+
+    # ---- Writer thread ----
+
+    def _drain_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _open_log(self):
+        self._file = open(self.path, "a", encoding="utf-8")
+        if self._file.tell():
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+            if torn:
+                self._file.write("\n")  # a crash mid-write left half a line; start ours on a fresh one
+
+    def _write(self, lines):
+        if self._file is None:
+            self._open_log()
+        start = time.perf_counter()
+        self._file.write(lines)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        audit_flush_seconds.observe(time.perf_counter() - start)
+
+    def _reopen(self):
+        """Drop the handle after a failed write; the next write opens the file again"""
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+
+    def _persist(self, batch):
+        """Write a batch to the log, or failing that to the spill file; OSError if neither works"""
+        try:
+            self._write(_lines(batch))
+            audit_records.labels(outcome="written").inc(len(batch))
+        except OSError:
+            audit_write_errors.labels(target="log").inc()
+            self._reopen()
+            try:
+                self._spill(batch)
+            except OSError:
+                audit_write_errors.labels(target="spill").inc()
+                raise
+
+    def _merge_spill(self):
+        """Move spilled records into the main log once the queue has caught up"""
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path) or os.path.getsize(self.spill_path) == 0:
+                return
+            with open(self.spill_path, "r", encoding="utf-8") as f:
+                data = f.read()
+            try:
+                self._write(data)
+            except OSError:
+                audit_write_errors.labels(target="log").inc()
+                self._reopen()
+                raise
+            os.truncate(self.spill_path, 0)
+
+    def _step(self):
+        if not self._pending:
+            self._pending = self._drain_batch()
+        if self._pending:
+            self._persist(self._pending)
+            self._pending = []
+        else:
+            self._merge_spill()
+
+    def _run(self):
+        delay = 0.0
+        while not (self._stopped.is_set() and self._queue.empty() and not self._pending):
+            try:
+                self._step()
+            except Exception as e:
+                # keep the batch and try again; nothing leaves _pending until it is durable
+                self.last_error = str(e)
+                delay = min(self.retry_max, delay * 2 or self.flush_interval)
+                print(f"Audit write failed, retrying in {delay:.2f}s: {e}")
+                time.sleep(delay)
+                continue
+            self.last_error = None
+            delay = 0.0
+        try:
+            self._merge_spill()
+        except OSError as e:
+            print(f"Audit spill left unmerged at {self.spill_path}: {e}")
+
+    def close(self, timeout: float = 10):
+        """Drain everything still queued and fsync it before exit"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            # the disk is still failing; the writer keeps retrying until the process exits
+            unwritten = self._queue.qsize() + len(self._pending)
+            print(f"Audit writer still retrying at exit, {unwritten} records not yet durable")
+            return
+        leftover = []
+        while not self._queue.empty():
+            leftover.append(self._queue.get_nowait())
+        if leftover:
+            try:
+                self._spill(leftover)
+            except OSError as e:
+                print(f"Audit records lost at exit ({len(leftover)}): {e}")
+        if self._file is not None:
+            self._file.close()
+
+
+audit_log = AuditPipeline()
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Indexed, time-range search over the HIPAA audit log
+Every segment (the live log plus rotated and gzip-compressed copies) gets a
+sidecar <segment>.idx holding its time bounds and per-user / per-patient
+offset lists. Time ranges are resolved by binary search over the mmapped
+segment, so a query touches only the segments and lines it needs.
+
+Binary search needs records in time order. Records that arrive more than
+AUDIT_ORDER_SLACK behind the newest one seen so far (spilled records merged
+back after a backlog) are listed in the index as late, with their
+timestamps; the search steps over them and adds the ones in range back.
+Lines that do not parse (a record torn by a crash) are skipped and counted,
+and lines in the pre-JSON logging format are read as records.
+
+Concurrent queries share one AuditSegment per file; its lock serialises
+index updates, and the sidecar is only rewritten when the index grew, via a
+unique temp file so separate processes cannot collide. Decompressed .gz
+segments are kept in a small LRU (AUDIT_GZ_CACHE_BYTES) instead of being
+inflated again on every query.
+
+Usage:
+    python audit_query.py --patient P003 --start 2025-11-01 --end 2025-12-01
+    python audit_query.py --user dr.smith --limit 50
+"""
+import argparse
+import glob
+import gzip
+import heapq
+import json
+import mmap
+import os
+import re
+import sys
+import tempfile
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+AUDIT_LOG_PATH = os.getenv("AUDIT_LOG_PATH", "/home/ec2-user/hospital-audit.log")
+
+# Records are appended in near time order; spilled records can land a little late
+AUDIT_ORDER_SLACK = timedelta(seconds=int(os.getenv("AUDIT_ORDER_SLACK", "300")))
+
+# Decompressed rotated segments kept in memory between queries
+AUDIT_GZ_CACHE_BYTES = int(os.getenv("AUDIT_GZ_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+_TS_PREFIX = b'{"ts":"'
+_TS_LEN = 26  # datetime.isoformat(timespec="microseconds")
+# log_access before the JSON pipeline: "%(asctime)s - USER=.. ROLE=.. ENDPOINT=.. PATIENT=.."
+_LEGACY_LINE = re.compile(
+    r"^(\d{4}-\d\d-\d\d) (\d\d:\d\d:\d\d),(\d{3}) - USER=(.*?) ROLE=(.*?) ENDPOINT=(.*) PATIENT=(.*)$")
+
+
+def _shift(ts: str, delta: timedelta) -> str:
+    return (datetime.fromisoformat(ts) + delta).isoformat(timespec="microseconds")
+
+
+def parse_line(line):
+    """Record for one log line (JSON or legacy text), or None if it is not a record"""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        match = _LEGACY_LINE.match(bytes(line).decode(errors="replace").rstrip("\r"))
+        if match is None:
+            return None
+        date, clock, millis, user, role, endpoint, patient = match.groups()
+        return {"ts": f"{date}T{clock}.{millis}000", "user": user, "role": role,
+                "endpoint": endpoint, "patient": None if patient == "None" else patient}
+    if not isinstance(record, dict) or not isinstance(record.get("ts"), str):
+        return None
+    return record
+
+
+def _record_in(line):
+    """(bytes skipped, record) for a line; a line torn by a crash may have the next record appended"""
+    record = parse_line(line)
+    if record is not None:
+        return 0, record
+    resumed = bytes(line).rfind(_TS_PREFIX)
+    if resumed > 0:
+        record = parse_line(line[resumed:])
+        if record is not None:
+            return resumed, record
+    return 0, None
+
+
+def _contains(offsets, offset) -> bool:
+    i = bisect_left(offsets, offset)
+    return i < len(offsets) and offsets[i] == offset
+
+
+def _ts_at(buf, pos: int):
+    """Timestamp of the record starting at pos (None if the line is not a record)"""
+    if buf[pos:pos + len(_TS_PREFIX)] == _TS_PREFIX and buf[pos + len(_TS_PREFIX) + _TS_LEN:
+                                                         pos + len(_TS_PREFIX) + _TS_LEN + 1] == b'"':
+        return buf[pos + len(_TS_PREFIX):pos + len(_TS_PREFIX) + _TS_LEN].decode()
+    end = buf.find(b"\n", pos)
+    record = parse_line(buf[pos:end if end >= 0 else len(buf)])
+    return None if record is None else record["ts"]
+
+
+def bisect_time(buf, target: str, skip=frozenset()) -> int:
+    """Offset of the first line whose timestamp is >= target.
+
+    Lines at offsets in `skip` (late records) and lines that are not records
+    are stepped over, so only the in-order lines steer the search.
+    """
+    lo, hi = 0, len(buf)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        line_start = buf.rfind(b"\n", 0, mid) + 1
+        # first usable line at or after line_start
+        pos, ts = line_start, None
+        while pos < len(buf):
+            newline = buf.find(b"\n", pos)
+            following = len(buf) if newline < 0 else newline + 1
+            if pos not in skip:
+                ts = _ts_at(buf, pos)
+                if ts is not None:
+                    break
+            pos = following
+        if ts is not None and ts < target:
+            lo = following
+        else:
+            hi = line_start
+    return lo
+
+
+class DecompressedCache:
+    """Contents of recently read .gz segments, least recently used evicted past `budget` bytes"""
+
+    def __init__(self, budget: int = AUDIT_GZ_CACHE_BYTES):
+        self.budget = budget
+        self.size = 0
+        self._entries = OrderedDict()  # path -> ((size, mtime), bytes)
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> bytes:
+        stat = os.stat(path)
+        key = (stat.st_size, stat.st_mtime)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == key:
+                self._entries.move_to_end(path)
+                return entry[1]
+        with gzip.open(path, "rb") as f:
+            data = f.read()
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.size -= len(old[1])
+            if len(data) <= self.budget:
+                self._entries[path] = (key, data)
+                self.size += len(data)
+            while self.size > self.budget:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+        return data
+
+
+_decompressed = DecompressedCache()
+
+
+class AuditSegment:
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.compressed = path.endswith(".gz")
+        self._index = None
+        self._lock = threading.Lock()  # one index update at a time per segment
+
+    def buffer(self):
+        """Segment contents as a bytes-like object (mmap for plain files)"""
+        if self.compressed:
+            return _decompressed.get(self.path)
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _empty_index(self):
+        return {"source_size": 0, "source_mtime": 0, "indexed": 0, "head": "",
+                "min_ts": None, "max_ts": None, "users": {}, "patients": {},
+                "late": [], "malformed": 0}
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return self._empty_index()
+        if "late" not in index:
+            return self._empty_index()  # written before late records were tracked, rebuild it
+        return index
+
+    def _save_index(self, index):
+        # a unique temp file per write: another worker may be saving this sidecar too
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.index_path) or ".",
+                                   prefix=os.path.basename(self.index_path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(index, f, separators=(",", ":"))
+            os.replace(tmp, self.index_path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def index(self):
+        """Load the sidecar index, extending it over any bytes appended since"""
+        with self._lock:
+            return self._update_index()
+
+    def _update_index(self):
+        stat = os.stat(self.path)
+        index = self._index if self._index is not None else self._load_index()
+        if (index["source_size"], index["source_mtime"]) == (stat.st_size, stat.st_mtime):
+            self._index = index
+            return index
+
+        buf = self.buffer()
+        head = bytes(buf[:64]).decode(errors="replace")
+        changed = False
+        if index["head"] != head or index["indexed"] > len(buf) or (self.compressed and index["indexed"]):
+            # new, rotated-in-place, truncated or recompressed segment: start over
+            index, changed = self._empty_index(), True
+        if index["indexed"] < len(buf):
+            indexed = index["indexed"]
+            self._extend(index, buf)
+            changed = changed or index["indexed"] != indexed
+        index.update(source_size=stat.st_size, source_mtime=stat.st_mtime, head=head)
+        if changed:
+            self._save_index(index)
+        self._index = index
+        return index
+
+    @staticmethod
+    def _extend(index, buf):
+        pos = index["indexed"]
+        end = len(buf)
+        floor, floor_minute = None, None  # records older than floor are late
+        while pos < end:
+            newline = buf.find(b"\n", pos)
+            if newline < 0:
+                break  # partial line still being written
+            line = buf[pos:newline]
+            if not line.strip():
+                pos = newline + 1
+                continue
+            try:
+                record, skipped = json.loads(line), 0
+            except ValueError:
+                skipped, record = _record_in(line)  # legacy text, or torn by a crash
+            else:
+                if type(record) is not dict or type(record.get("ts")) is not str:
+                    record = None
+            if skipped or record is None:
+                index["malformed"] += 1
+            if record is None:
+                pos = newline + 1
+                continue
+            start = pos + skipped
+            ts = record["ts"]
+            max_ts = index["max_ts"]
+            if max_ts is not None and max_ts[:16] != floor_minute:
+                # once per minute of log, rounded up so floor >= max_ts - slack: a late record is
+                # never missed, a few just inside the slack are merely listed as late too
+                floor_minute = max_ts[:16]
+                floor = _shift(floor_minute, timedelta(minutes=1) - AUDIT_ORDER_SLACK)
+            if floor is not None and ts < floor:
+                index["late"].append([start, ts])
+            if index["min_ts"] is None or ts < index["min_ts"]:
+                index["min_ts"] = ts
+            if index["max_ts"] is None or ts > index["max_ts"]:
+                index["max_ts"] = ts
+            if record.get("user") is not None:
+                index["users"].setdefault(str(record["user"]), []).append(start)
+            if record.get("patient") is not None:
+                index["patients"].setdefault(str(record["patient"]), []).append(start)
+            pos = newline + 1
+        index["indexed"] = pos
+
+    def overlaps(self, start, end):
+        index = self.index()
+        if index["min_ts"] is None:
+            return False
+        return (end is None or index["min_ts"] < end) and (start is None or index["max_ts"] >= start)
+
+    def search(self, start=None, end=None, user=None, patient=None):
+        index = self.index()
+        buf = self.buffer()
+        late = {offset for offset, _ in index["late"]}
+        lo = bisect_time(buf, _shift(start, -AUDIT_ORDER_SLACK), late) if start else 0
+        hi = bisect_time(buf, _shift(end, AUDIT_ORDER_SLACK), late) if end else index["indexed"]
+        hi = min(hi, index["indexed"])
+        # late records in range, wherever they sit; scan() and the postings leave them out so each comes once
+        late_hits = [offset for offset, ts in index["late"]
+                     if (not start or ts >= start) and (not end or ts < end)]
+
+        if user is not None or patient is not None:
+            postings = []
+            if user is not None:
+                postings.append(index["users"].get(user, []))
+            if patient is not None:
+                postings.append(index["patients"].get(patient, []))
+            offsets = min(postings, key=len)
+            offsets = offsets[bisect_left(offsets, lo):bisect_left(offsets, hi)]
+            if late:
+                offsets = [o for o in offsets if o not in late]
+            if len(postings) == 2:
+                other = set(max(postings, key=len))
+                offsets = [o for o in offsets if o in other]
+            extra = [o for o in late_hits if all(_contains(p, o) for p in postings)]
+            if extra:
+                offsets = sorted(offsets + extra)
+        else:
+            offsets = None
+
+        def scan():
+            pos = lo
+            while pos < hi:
+                newline = buf.find(b"\n", pos)
+                if pos not in late:
+                    yield pos
+                pos = newline + 1
+
+        def records():
+            ordered = offsets if offsets is not None else heapq.merge(scan(), sorted(late_hits))
+            for offset in ordered:
+                newline = buf.find(b"\n", offset)
+                skipped, record = _record_in(buf[offset:newline if newline >= 0 else len(buf)])
+                if record is None or (skipped and offset + skipped in late):
+                    continue  # not a record, or a late one already yielded from late_hits
+                yield record
+
+        for record in records():
+            ts = record["ts"]
+            if (start and ts < start) or (end and ts >= end):
+                continue
+            if user is not None and record.get("user") != user:
+                continue
+            if patient is not None and str(record.get("patient")) != patient:
+                continue
+            yield record
+
+
+class AuditLogIndex:
+    """Query interface over all segments of one audit log"""
+
+    def __init__(self, path: str = AUDIT_LOG_PATH):
+        self.path = path
+        self._segments = {}
+        self._lock = threading.Lock()  # every thread must share one AuditSegment per file
+
+    def segments(self):
+        paths = [p for p in glob.glob(self.path + "*")
+                 if not p.endswith((".idx", ".tmp", ".spill"))]
+        with self._lock:
+            self._segments = {p: self._segments.get(p) or AuditSegment(p) for p in paths}
+            segments = list(self._segments.values())
+        return sorted((s for s in segments if s.index()["min_ts"] is not None),
+                      key=lambda s: s.index()["min_ts"])
+
+    def query(self, start=None, end=None, user=None, patient=None, limit=1000):
+        """Records with start <= ts < end, optionally filtered by user and patient"""
+        for bound in (start, end):
+            if bound:
+                datetime.fromisoformat(bound)  # ValueError on malformed input
+        results = []
+        for segment in self.segments():
+            if not segment.overlaps(start, end):
+                continue
+            for record in segment.search(start, end, user, patient):
+                results.append(record)
+                if len(results) >= limit:
+                    return results
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the HIPAA audit log")
+    parser.add_argument("--log", default=AUDIT_LOG_PATH, help="audit log path (rotated segments are found next to it)")
+    parser.add_argument("--start", help="inclusive ISO date/time")
+    parser.add_argument("--end", help="exclusive ISO date/time")
+    parser.add_argument("--user")
+    parser.add_argument("--patient")
+    parser.add_argument("--limit", type=int, default=1000)
+    args = parser.parse_args()
+
+    records = AuditLogIndex(args.log).query(args.start, args.end, args.user, args.patient, args.limit)
+    for record in records:
+        sys.stdout.write(json.dumps(record) + "\n")
+    print(f"{len(records)} records", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
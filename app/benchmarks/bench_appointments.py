@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+AppointmentStore at one million bookings
+Times create (with conflict check), lookup by id, free-slot queries and
+cancellation
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from appointments import AppointmentStore, AppointmentConflict, format_minutes
+
+APPOINTMENTS = 1_000_000
+DOCTORS = 2_000
+DATES = [f"2025-{m:02d}-{d:02d}" for m in range(1, 13) for d in range(1, 29)]
+QUERIES = 100_000
+
+
+def timed(label, n, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed / n * 1e6:8.2f} us/op  ({n:,} ops)")
+    return result
+
+
+store = AppointmentStore()
+rng = random.Random(42)
+
+
+def book_all():
+    conflicts = 0
+    while len(store) < APPOINTMENTS:
+        try:
+            store.create({
+                "patient_name": "Patient",
+                "doctor_name": f"Dr. {rng.randrange(DOCTORS)}",
+                "date": rng.choice(DATES),
+                "time": format_minutes(rng.randrange(8 * 60, 17 * 60, 15)),
+                "duration_minutes": 15
+            })
+        except AppointmentConflict:
+            conflicts += 1
+    return conflicts
+
+
+print("=" * 60)
+conflicts = timed("create + conflict check", APPOINTMENTS, book_all)
+print(f"{'':<34} {conflicts:,} conflicting requests rejected")
+ids = [rng.randrange(1, store._next_id) for _ in range(QUERIES)]
+timed("get by id", QUERIES, lambda: [store.get(i) for i in ids])
+timed("free slots (doctor, date)", QUERIES,
+      lambda: [store.free_slots(f"Dr. {rng.randrange(DOCTORS)}", rng.choice(DATES), 30) for _ in range(QUERIES)])
+timed("cancel", QUERIES, lambda: [store.cancel(i) for i in ids])
+print("=" * 60)
@@ -1,13 +1,38 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import pyotp
 import jwt
+import asyncio
+import itertools
+import os
+import sys
+import threading
+import time
 from datetime import datetime, timedelta
+from typing import Optional
+from pydantic import BaseModel, Field
+from fastapi.encoders import jsonable_encoder
+from prometheus_client import Counter, generate_latest, CONTENT_TYPE_LATEST
+from fastapi.responses import JSONResponse, Response
+
+# Modules shared with the hospital portal (token_cache, db, ingest) are imported from its directory, not copied
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "hospital-app"))
+from token_cache import TokenCache
+from account_events import AccountEvents
 
 app = FastAPI()
 security = HTTPBearer()
 
 SECRET_KEY = "your-secret-key-change-in-production"
+TOKEN_LIFETIME = timedelta(hours=1)
+token_cache_lookups = Counter('hospital_token_cache_lookups', 'Validated-token cache lookups', ['result'])
+token_cache = TokenCache(
+    maxsize=10000,
+    hit_counter=token_cache_lookups.labels(result='hit'),
+    miss_counter=token_cache_lookups.labels(result='miss')
+)
+# Shared with the other workers once the database is set up below
+account_events = AccountEvents(token_cache, TOKEN_LIFETIME.total_seconds())
 USERS = {
     "doctor": {"password": "demo123", "role": "doctor", "mfa_secret": "JBSWY3DPEHPK3PXP"},
     "nurse": {"password": "demo123", "role": "nurse", "mfa_secret": "JBSWY3DPEHPK3PXP"},
@@ -18,16 +43,37 @@ def create_token(username: str, role: str):
     payload = {
         "username": username,
         "role": role,
-        "exp": datetime.utcnow() + timedelta(hours=1)
+        # fractional, so a token issued just after revoke_user in the same second is not caught by it
+        "iat": time.time(),
+        "exp": datetime.utcnow() + TOKEN_LIFETIME
     }
     return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=["HS256"])
+    token = credentials.credentials
+    payload = token_cache.get(token)
+    if payload is not None:
         return payload
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
     except:
         raise HTTPException(401, "Invalid token")
+    if token_cache.is_revoked(token, payload):
+        raise HTTPException(401, "Token revoked")
+    token_cache.put(token, payload)
+    return payload
+
+def revoke_token(token: str):
+    """Reject this token, in every worker, from now until it expires"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"], options={"verify_exp": False})
+    except jwt.InvalidTokenError:
+        return  # not one of ours, nothing to revoke
+    account_events.revoke_token(token, payload["exp"])
+
+def revoke_user_tokens(username: str):
+    """Reject every token issued to a user until now, in every worker"""
+    account_events.revoke_user(username)
 
 def require_role(required_role: str):
     def role_checker(token_data: dict = Depends(verify_token)):
@@ -59,6 +105,13 @@ def verify_mfa(username: str, code: str):
         return {"access_token": token, "role": user["role"]}
     raise HTTPException(401, "Invalid MFA")
 
+@app.post("/logout")
+def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """End this session: the token is refused from now on"""
+    verify_token(credentials)
+    revoke_token(credentials.credentials)
+    return {"status": "logged_out"}
+
 # Doctor-only endpoint
 @app.get("/patients", dependencies=[Depends(require_role("doctor"))])
 def get_patients():
@@ -74,18 +127,23 @@ def get_vitals():
 def get_users():
     return {"users": list(USERS.keys())}
 
-import logging
-from datetime import datetime
-
-# Configure logging
-logging.basicConfig(
-    filename='/home/ec2-user/hospital-audit.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(message)s'
-)
+from audit import audit_log, AuditUnavailable, AUDIT_LOG_PATH
+from audit_query import AuditLogIndex
+from appointments import AppointmentStore, AppointmentConflict, DEFAULT_DURATION_MINUTES
+from ingest import ingest
 
 def log_access(username: str, role: str, endpoint: str, patient_id: str = None):
-    logging.info(f"USER={username} ROLE={role} ENDPOINT={endpoint} PATIENT={patient_id}")
+    audit_log.record(user=username, role=role, endpoint=endpoint, patient=patient_id)
+
+@app.exception_handler(AuditUnavailable)
+def audit_unavailable(request: Request, exc: AuditUnavailable):
+    # Without a durable audit record the access must not go ahead
+    return JSONResponse({"detail": "Audit log unavailable"}, status_code=503)
+
+def admit_write():
+    """Shed a write before it does any work while the audit log cannot take its record"""
+    if not audit_log.accepting():
+        raise AuditUnavailable("Audit log not accepting records")
 
 # Update patients endpoint to log access
 @app.get("/patients/{patient_id}", dependencies=[Depends(require_role("doctor"))])
@@ -94,14 +152,77 @@ def get_patient(patient_id: str, token_data: dict = Depends(verify_token)):
     return {"patient_id": patient_id, "name": "John Doe", "status": "stable"}
 
 # In-memory database for demo
-appointments_db = []
+appointments_db = AppointmentStore()
+prescriptions_db = []
+billing_db = []
+
+# Optional PostgreSQL persistence: with DATABASE_URL set the lists above are
+# loaded from the database at startup and every write goes through it. Writes
+# only ever insert new ids, and the database refuses one another worker took.
+DATABASE_URL = os.getenv("DATABASE_URL")
+database = None
+storage = {}
+if DATABASE_URL:
+    from db import Database, DocumentStore, IdTaken, AccountEventStore
+    database = Database(DATABASE_URL)
+    database.apply_schema(os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql"))
+    for _name, _records in (("prescriptions", prescriptions_db), ("billing", billing_db)):
+        storage[_name] = DocumentStore(database, _name)
+        _records[:] = storage[_name].all()
+    storage["clinic_appointments"] = DocumentStore(database, "clinic_appointments")
+    for _appointment in storage["clinic_appointments"].all():
+        appointments_db.load(_appointment)
+    account_events.store = AccountEventStore(database)
+    account_events.store.prune(time.time())
+    account_events.sync()
+
+class IdSequence:
+    """Ids for a list-backed collection: monotonic, never reused even after a rollback"""
+
+    def __init__(self, records=()):
+        self._ids = itertools.count(max((r["id"] for r in records), default=0) + 1)
 
-@app.post("/appointments")
+    def take(self) -> int:
+        return next(self._ids)
+
+    def skip_past(self, record_id: int):
+        """Never hand out record_id or anything below it"""
+        self._ids = itertools.count(max(next(self._ids), record_id + 1))
+
+prescription_ids = IdSequence(prescriptions_db)
+invoice_ids = IdSequence(billing_db)
+id_sequences = {"clinic_appointments": appointments_db, "prescriptions": prescription_ids,
+                "billing": invoice_ids}
+# Serialises id assignment and append for the list-backed collections, so
+# each list stays in id order
+ingest_lock = threading.Lock()
+
+def persist(collection: str, *records):
+    """Insert new records into PostgreSQL (no-op when running in-memory).
+
+    Each worker hands out ids from its own sequence, so another worker may
+    have stored one of them first. Then nothing is written, this worker's
+    sequence skips past the highest stored id and the caller gets 409 (after
+    undoing its in-memory change) to retry.
+    """
+    if collection in storage and records:
+        try:
+            storage[collection].insert_many(records)
+        except IdTaken:
+            id_sequences[collection].skip_past(storage[collection].max_id())
+            raise HTTPException(409, "Id was taken by another worker; retry")
+
+def unpersist(collection: str, record_id):
+    if collection in storage:
+        storage[collection].delete(record_id)
+
+@app.post("/appointments", dependencies=[Depends(admit_write)])
 def create_appointment(
     patient_name: str,
     doctor_name: str,
     date: str,
     time: str,
+    duration_minutes: int = Query(DEFAULT_DURATION_MINUTES, ge=5, le=480),
     token_data: dict = Depends(verify_token)
 ):
     # Only doctors and nurses can create appointments
@@ -109,17 +230,26 @@ def create_appointment(
         raise HTTPException(403, "Requires doctor/nurse/admin role")
     
     appointment = {
-        "id": len(appointments_db) + 1,
         "patient_name": patient_name,
         "doctor_name": doctor_name,
         "date": date,
         "time": time,
+        "duration_minutes": duration_minutes,
         "created_by": token_data["username"]
     }
-    appointments_db.append(appointment)
-    
-    # Audit log
-    log_access(token_data["username"], token_data["role"], "/appointments POST", patient_name)
+    try:
+        appointments_db.create(appointment)
+    except ValueError:
+        raise HTTPException(400, "time must look like 14:30 or 02:30 PM")
+    except AppointmentConflict as conflict:
+        raise HTTPException(409, f"{doctor_name} is already booked at that time (appointment {conflict.existing['id']})")
+    try:
+        # Audited before it is stored, so a 503 from the audit log leaves nothing behind
+        log_access(token_data["username"], token_data["role"], "/appointments POST", patient_name)
+        persist("clinic_appointments", appointment)
+    except Exception:
+        appointments_db.cancel(appointment["id"])
+        raise
     
     return {"status": "created", "appointment": appointment}
 
@@ -127,9 +257,23 @@ def create_appointment(
 def list_appointments(token_data: dict = Depends(verify_token)):
     # All authenticated users can view appointments
     log_access(token_data["username"], token_data["role"], "/appointments GET", None)
-    return {"appointments": appointments_db}
+    return {"appointments": appointments_db.all()}
+
+@app.get("/appointments/free-slots")
+def free_slots(
+    doctor_name: str,
+    date: str,
+    duration_minutes: int = Query(DEFAULT_DURATION_MINUTES, ge=5, le=480),
+    token_data: dict = Depends(verify_token)
+):
+    log_access(token_data["username"], token_data["role"], "/appointments/free-slots GET", None)
+    return {
+        "doctor_name": doctor_name,
+        "date": date,
+        "free_slots": appointments_db.free_slots(doctor_name, date, duration_minutes)
+    }
 
-@app.delete("/appointments/{appointment_id}")
+@app.delete("/appointments/{appointment_id}", dependencies=[Depends(admit_write)])
 def cancel_appointment(
     appointment_id: int,
     token_data: dict = Depends(verify_token)
@@ -138,18 +282,17 @@ def cancel_appointment(
     if token_data["role"] not in ["doctor", "admin"]:
         raise HTTPException(403, "Requires doctor/admin role")
     
-    # Find and remove appointment
-    for apt in appointments_db:
-        if apt["id"] == appointment_id:
-            appointments_db.remove(apt)
-            log_access(token_data["username"], token_data["role"], f"/appointments DELETE {appointment_id}", apt["patient_name"])
-            return {"status": "cancelled", "appointment": apt}
+    apt = appointments_db.get(appointment_id)
+    if apt is not None:
+        log_access(token_data["username"], token_data["role"], f"/appointments DELETE {appointment_id}", apt["patient_name"])
+        apt = appointments_db.cancel(appointment_id)
+    if apt is not None:
+        unpersist("clinic_appointments", apt["id"])
+        return {"status": "cancelled", "appointment": apt}
     
     raise HTTPException(404, "Appointment not found")
 
-prescriptions_db = []
-
-@app.post("/prescriptions", dependencies=[Depends(require_role("doctor"))])
+@app.post("/prescriptions", dependencies=[Depends(require_role("doctor")), Depends(admit_write)])
 def write_prescription(
     patient_name: str,
     medication: str,
@@ -158,7 +301,6 @@ def write_prescription(
     token_data: dict = Depends(verify_token)
 ):
     prescription = {
-        "id": len(prescriptions_db) + 1,
         "patient_name": patient_name,
         "medication": medication,
         "dosage": dosage,
@@ -166,8 +308,15 @@ def write_prescription(
         "prescribed_by": token_data["username"],
         "date": "2025-11-08"
     }
-    prescriptions_db.append(prescription)
-    log_access(token_data["username"], token_data["role"], "/prescriptions POST", patient_name)
+    with ingest_lock:
+        prescription = {"id": prescription_ids.take(), **prescription}
+        prescriptions_db.append(prescription)
+    try:
+        log_access(token_data["username"], token_data["role"], "/prescriptions POST", patient_name)
+        persist("prescriptions", prescription)
+    except Exception:
+        remove_records(prescriptions_db, [prescription])
+        raise
     return {"status": "prescribed", "prescription": prescription}
 
 @app.get("/prescriptions")
@@ -175,9 +324,7 @@ def view_prescriptions(token_data: dict = Depends(verify_token)):
     log_access(token_data["username"], token_data["role"], "/prescriptions GET", None)
     return {"prescriptions": prescriptions_db}
 
-billing_db = []
-
-@app.post("/billing", dependencies=[Depends(require_role("admin"))])
+@app.post("/billing", dependencies=[Depends(require_role("admin")), Depends(admit_write)])
 def create_invoice(
     patient_name: str,
     service: str,
@@ -186,7 +333,6 @@ def create_invoice(
     token_data: dict = Depends(verify_token)
 ):
     invoice = {
-        "id": len(billing_db) + 1,
         "patient_name": patient_name,
         "service": service,
         "amount": amount,
@@ -195,8 +341,15 @@ def create_invoice(
         "date": "2025-11-08",
         "status": "pending"
     }
-    billing_db.append(invoice)
-    log_access(token_data["username"], token_data["role"], "/billing POST", patient_name)
+    with ingest_lock:
+        invoice = {"id": invoice_ids.take(), **invoice}
+        billing_db.append(invoice)
+    try:
+        log_access(token_data["username"], token_data["role"], "/billing POST", patient_name)
+        persist("billing", invoice)
+    except Exception:
+        remove_records(billing_db, [invoice])
+        raise
     return {"status": "invoice_created", "invoice": invoice}
 
 @app.get("/billing")
@@ -206,3 +359,160 @@ def view_invoices(token_data: dict = Depends(verify_token)):
         raise HTTPException(403, "Requires admin role")
     log_access(token_data["username"], token_data["role"], "/billing GET", None)
     return {"invoices": billing_db}
+
+audit_index = AuditLogIndex(AUDIT_LOG_PATH)
+
+@app.get("/admin/audit", dependencies=[Depends(require_role("admin"))])
+def search_audit_log(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    user: Optional[str] = None,
+    patient_id: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    token_data: dict = Depends(verify_token)
+):
+    # Access reports are themselves PHI access and get audited
+    log_access(token_data["username"], token_data["role"], "/admin/audit GET", patient_id)
+    try:
+        records = audit_index.query(start, end, user, patient_id, limit)
+    except ValueError:
+        raise HTTPException(400, "start/end must be ISO dates or datetimes")
+    return {"records": records, "count": len(records)}
+
+# ============== BULK INGESTION ==============
+# Each endpoint takes a JSON array or an application/x-ndjson stream and
+# returns one result per record (see ingest.py)
+
+class AppointmentIn(BaseModel):
+    patient_name: str = Field(min_length=1)
+    doctor_name: str = Field(min_length=1)
+    date: str
+    time: str
+    duration_minutes: int = Field(DEFAULT_DURATION_MINUTES, ge=5, le=480)
+
+class PrescriptionIn(BaseModel):
+    patient_name: str = Field(min_length=1)
+    medication: str = Field(min_length=1)
+    dosage: str
+    duration: str
+
+class InvoiceIn(BaseModel):
+    patient_name: str = Field(min_length=1)
+    service: str = Field(min_length=1)
+    amount: float = Field(gt=0)
+    insurance: str
+
+def commit_chunk(collection, created, token_data, endpoint, rollback):
+    """Audit a chunk, then persist it in one transaction, or undo it on failure"""
+    try:
+        audit_log.record_many([
+            {"user": token_data["username"], "role": token_data["role"],
+             "endpoint": endpoint, "patient": record["patient_name"]}
+            for _, record in created
+        ])
+    except AuditUnavailable:
+        rollback([record for _, record in created])
+        return [{"index": i, "status": "failed", "error": "Audit log unavailable"} for i, _ in created]
+    try:
+        persist(collection, *[record for _, record in created])
+    except Exception:
+        rollback([record for _, record in created])
+        return [{"index": i, "status": "failed", "error": "Storage write failed"} for i, _ in created]
+    return [{"index": i, "status": "created", "id": record["id"]} for i, record in created]
+
+def remove_records(records_db, records):
+    doomed = {id(r) for r in records}
+    with ingest_lock:
+        records_db[:] = [r for r in records_db if id(r) not in doomed]
+
+@app.post("/appointments/batch", dependencies=[Depends(admit_write)])
+async def create_appointments_batch(request: Request, token_data: dict = Depends(verify_token)):
+    if token_data["role"] not in ["doctor", "nurse", "admin"]:
+        raise HTTPException(403, "Requires doctor/nurse/admin role")
+
+    def apply_chunk(pending):
+        results, created = [], []
+        for index, item in pending:
+            appointment = {**jsonable_encoder(item), "created_by": token_data["username"]}
+            try:
+                appointments_db.create(appointment)
+            except ValueError:
+                results.append({"index": index, "status": "invalid", "error": "time must look like 14:30 or 02:30 PM"})
+            except AppointmentConflict as conflict:
+                results.append({"index": index, "status": "conflict",
+                                "error": f"Conflicts with appointment {conflict.existing['id']}"})
+            else:
+                created.append((index, appointment))
+        rollback = lambda records: [appointments_db.cancel(r["id"]) for r in records]
+        return results + commit_chunk("clinic_appointments", created, token_data, "/appointments/batch POST", rollback)
+
+    return await ingest(request, AppointmentIn, apply_chunk)
+
+@app.post("/prescriptions/batch", dependencies=[Depends(require_role("doctor")), Depends(admit_write)])
+async def write_prescriptions_batch(request: Request, token_data: dict = Depends(verify_token)):
+    def apply_chunk(pending):
+        created = []
+        with ingest_lock:
+            for index, item in pending:
+                prescription = {
+                    "id": prescription_ids.take(),
+                    **jsonable_encoder(item),
+                    "prescribed_by": token_data["username"],
+                    "date": "2025-11-08"
+                }
+                prescriptions_db.append(prescription)
+                created.append((index, prescription))
+        rollback = lambda records: remove_records(prescriptions_db, records)
+        return commit_chunk("prescriptions", created, token_data, "/prescriptions/batch POST", rollback)
+
+    return await ingest(request, PrescriptionIn, apply_chunk)
+
+@app.post("/billing/batch", dependencies=[Depends(require_role("admin")), Depends(admit_write)])
+async def create_invoices_batch(request: Request, token_data: dict = Depends(verify_token)):
+    def apply_chunk(pending):
+        created = []
+        with ingest_lock:
+            for index, item in pending:
+                invoice = {
+                    "id": invoice_ids.take(),
+                    **jsonable_encoder(item),
+                    "created_by": token_data["username"],
+                    "date": "2025-11-08",
+                    "status": "pending"
+                }
+                billing_db.append(invoice)
+                created.append((index, invoice))
+        rollback = lambda records: remove_records(billing_db, records)
+        return commit_chunk("billing", created, token_data, "/billing/batch POST", rollback)
+
+    return await ingest(request, InvoiceIn, apply_chunk)
+
+@app.on_event("startup")
+async def start_account_event_sync():
+    if account_events.store is not None:
+        app.state.account_events_task = asyncio.create_task(account_events.run_sync())
+
+@app.on_event("shutdown")
+async def stop_account_event_sync():
+    task = getattr(app.state, "account_events_task", None)
+    if task is not None:
+        task.cancel()
+
+@app.on_event("shutdown")
+def flush_audit_log():
+    audit_log.close()
+    if database is not None:
+        database.close()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics endpoint"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/health")
+def health():
+    """Health check; 503 while the audit writer is down or failing to write"""
+    if not audit_log.healthy():
+        return JSONResponse({"status": "degraded", "audit_writer": audit_log.last_error or "stopped"},
+                            status_code=503)
+    return {"status": "healthy", "audit_writer": "ok"}
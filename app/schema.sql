@@ -0,0 +1,36 @@
+-- Scheduling/prescription/billing API storage schema (PostgreSQL 12+)
+-- Records are JSONB documents keyed by their integer id. The API loads every
+-- table at startup and reads from memory, so the primary key is the only
+-- index and writes pay for nothing else.
+-- version goes up on every update; db.py refuses a write carrying an older one,
+-- so workers with stale copies cannot overwrite each other.
+
+CREATE TABLE IF NOT EXISTS clinic_appointments (
+    id            BIGINT PRIMARY KEY,
+    data          JSONB NOT NULL,
+    version       BIGINT NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS prescriptions (
+    id            BIGINT PRIMARY KEY,
+    data          JSONB NOT NULL,
+    version       BIGINT NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS billing (
+    id            BIGINT PRIMARY KEY,
+    data          JSONB NOT NULL,
+    version       BIGINT NOT NULL DEFAULT 1
+);
+
+-- Token revocations, account locks and password changes, appended by one
+-- worker and replayed by every other (account_events.py). Workers read rows
+-- past the last id they saw; rows are pruned once expires has passed.
+CREATE TABLE IF NOT EXISTS account_events (
+    id            BIGSERIAL PRIMARY KEY,
+    kind          TEXT NOT NULL,
+    subject       TEXT NOT NULL,
+    at            DOUBLE PRECISION NOT NULL,
+    expires       DOUBLE PRECISION,
+    value         TEXT
+);
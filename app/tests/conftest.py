@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# The API uses flat imports from its own directory
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+# main.py starts the module-level audit pipeline at import; keep it out of the real log
+os.environ.setdefault("AUDIT_LOG_PATH", os.path.join(tempfile.mkdtemp(prefix="audit-test-"), "audit.log"))
@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from audit import AuditPipeline, AuditUnavailable
+
+
+def read_log(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def make_pipeline(tmp_path):
+    pipelines = []
+
+    def make(**kwargs):
+        kwargs.setdefault("flush_interval", 0.01)
+        kwargs.setdefault("retry_max", 0.05)
+        pipeline = AuditPipeline(str(tmp_path / "audit.log"), **kwargs)
+        pipelines.append(pipeline)
+        return pipeline
+
+    yield make
+    for pipeline in pipelines:
+        pipeline.close(timeout=5)
+
+
+def kill_writer(pipeline, monkeypatch):
+    """End the writer thread the way an unexpected bug would"""
+    def die():
+        raise SystemExit  # not caught by the retry loop
+
+    monkeypatch.setattr(pipeline, "_step", die)
+    assert wait_for(lambda: not pipeline._writer.is_alive())
+
+
+def test_unwritable_path_does_not_fail_construction(tmp_path):
+    pipeline = AuditPipeline(str(tmp_path / "missing" / "audit.log"), flush_interval=0.01, retry_max=0.05)
+    assert pipeline.healthy()
+    pipeline.close(timeout=1)
+
+
+def test_writer_survives_log_and_spill_failures(make_pipeline, monkeypatch):
+    pipeline = make_pipeline()
+    failing = threading.Event()
+    failing.set()
+    real_write, real_spill = pipeline._write, pipeline._spill
+
+    def write(lines):
+        if failing.is_set():
+            raise OSError(28, "No space left on device")
+        real_write(lines)
+
+    def spill(entries):
+        if failing.is_set():
+            raise OSError(28, "No space left on device")
+        real_spill(entries)
+
+    monkeypatch.setattr(pipeline, "_write", write)
+    monkeypatch.setattr(pipeline, "_spill", spill)
+    pipeline.record(user="dr.smith", endpoint="/patients/P003", patient="P003")
+    assert wait_for(lambda: pipeline.last_error is not None)
+    assert not pipeline.healthy()
+    assert pipeline._writer.is_alive()
+
+    failing.clear()
+    assert wait_for(lambda: len(read_log(pipeline.path)) == 1)
+    assert wait_for(pipeline.healthy)
+    assert read_log(pipeline.path)[0]["patient"] == "P003"
+
+
+def test_spilled_records_reach_the_log(make_pipeline, monkeypatch):
+    pipeline = make_pipeline()
+    real_write = pipeline._write
+    calls = []
+
+    def write(lines):
+        calls.append(lines)
+        if len(calls) == 1:
+            raise OSError(5, "I/O error")
+        real_write(lines)
+
+    monkeypatch.setattr(pipeline, "_write", write)
+    pipeline.record(user="nurse", endpoint="/vitals")
+    assert wait_for(lambda: len(read_log(pipeline.path)) == 1)
+    assert os.path.getsize(pipeline.spill_path) == 0
+
+
+def test_block_policy_does_not_hang_on_a_stuck_writer(make_pipeline, monkeypatch):
+    pipeline = make_pipeline(queue_size=1, put_timeout=0.05)
+    release = threading.Event()
+    monkeypatch.setattr(pipeline, "_write", lambda lines: release.wait())
+    start = time.monotonic()
+    for i in range(5):
+        pipeline.record(user="doctor", endpoint=f"/patients/P{i}")
+    assert time.monotonic() - start < 2
+    assert len(read_log(pipeline.spill_path)) >= 3
+    release.set()
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_dead_writer_sends_records_to_spill(make_pipeline, monkeypatch):
+    pipeline = make_pipeline(queue_size=1)
+    kill_writer(pipeline, monkeypatch)
+    assert not pipeline.healthy()
+    start = time.monotonic()
+    for i in range(3):
+        pipeline.record(user="admin", endpoint="/admin/audit")
+    assert time.monotonic() - start < 1
+    assert len(read_log(pipeline.spill_path)) == 3
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_record_raises_when_nothing_is_writable(make_pipeline, monkeypatch):
+    pipeline = make_pipeline()
+    kill_writer(pipeline, monkeypatch)
+    monkeypatch.setattr(pipeline, "spill_path", os.path.join(pipeline.path, "no-such-dir", "x.spill"))
+    with pytest.raises(AuditUnavailable):
+        pipeline.record(user="doctor", endpoint="/patients/P001")
+    assert not pipeline.accepting()
+    monkeypatch.setattr(pipeline, "spill_path", pipeline.path + ".spill")
+    assert pipeline.accepting()  # the probe sees the disk is back
+
+
+def test_close_drains_queue(make_pipeline):
+    pipeline = make_pipeline()
+    for i in range(100):
+        pipeline.record(user="doctor", endpoint=f"/patients/P{i}")
+    pipeline.close()
+    assert len(read_log(pipeline.path)) == 100
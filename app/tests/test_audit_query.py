@@ -0,0 +1,135 @@
+import gzip
+import json
+import threading
+from datetime import datetime, timedelta
+
+from audit import AuditPipeline
+from audit_query import AuditLogIndex, AuditSegment
+
+START = datetime(2026, 3, 1, 9, 0)
+
+
+def ts(minutes):
+    return (START + timedelta(minutes=minutes)).isoformat(timespec="microseconds")
+
+
+def line(minutes, user="dr.smith", patient="P003"):
+    return json.dumps({"ts": ts(minutes), "user": user, "role": "doctor",
+                       "endpoint": f"/patients/{patient}", "patient": patient},
+                      separators=(",", ":")) + "\n"
+
+
+def write(path, text, mode="w"):
+    with open(path, mode) as f:
+        f.write(text)
+
+
+def test_time_range_and_postings(tmp_path):
+    log = tmp_path / "audit.log"
+    write(log, "".join(line(m, user=f"u{m % 3}", patient=f"P{m % 5}") for m in range(600)))
+    index = AuditLogIndex(str(log))
+    assert len(index.query(ts(100), ts(200))) == 100
+    found = index.query(ts(100), ts(200), user="u1", patient="P2", limit=10000)
+    assert [r["ts"] for r in found] == [ts(m) for m in range(100, 200) if m % 3 == 1 and m % 5 == 2]
+
+
+def test_merged_spill_far_behind_is_still_found(tmp_path):
+    # a backlog spilled at minute 10 and merged back after minute 599 was written
+    log = tmp_path / "audit.log"
+    write(log, "".join(line(m) for m in range(600)))
+    write(log, line(10.5, user="nurse.jones", patient="P009") + line(11.5, user="nurse.jones"), "a")
+    write(log, "".join(line(m) for m in range(600, 610)), "a")
+    index = AuditLogIndex(str(log))
+    window = index.query(ts(10), ts(12), limit=10000)
+    assert sorted(r["ts"] for r in window) == [ts(10), ts(10.5), ts(11), ts(11.5)]
+    assert len(index.query(ts(10), ts(12), user="nurse.jones")) == 2
+    assert len(index.query(ts(10), ts(12), patient="P009")) == 1
+    assert len(index.query(ts(600), ts(605))) == 5  # bisection is not thrown off by the late lines
+
+
+def test_pipeline_spill_merge_is_queryable(tmp_path):
+    log = tmp_path / "audit.log"
+    write(log, "".join(line(m) for m in range(600)))
+    write(str(log) + ".spill", line(30, user="spilled"))
+    pipeline = AuditPipeline(str(log), flush_interval=0.01)
+    pipeline.close()
+    assert AuditLogIndex(str(log)).query(ts(29), ts(31), user="spilled")[0]["ts"] == ts(30)
+
+
+def test_torn_lines_are_skipped_and_counted(tmp_path):
+    log = tmp_path / "audit.log"
+    torn = line(2)[:40]
+    write(log, line(0) + line(1) + torn + line(3) + "not a record\n" + line(4) + torn)
+    index = AuditLogIndex(str(log))
+    assert [r["ts"] for r in index.query(ts(0), ts(5))] == [ts(0), ts(1), ts(3), ts(4)]
+    segment = AuditSegment(str(log))
+    assert segment.index()["malformed"] == 2  # the torn tail is still "being written"
+
+    # the writer restarts after the crash and starts its records on a new line
+    pipeline = AuditPipeline(str(log), flush_interval=0.01)
+    pipeline.record(user="after.crash", endpoint="/patients/P001", patient="P001")
+    pipeline.close()
+    assert index.query(user="after.crash")[0]["patient"] == "P001"
+
+
+def test_legacy_and_compressed_segments(tmp_path):
+    log = tmp_path / "audit.log"
+    with gzip.open(str(log) + ".1.gz", "wt") as f:
+        f.write("2026-02-28 17:00:00,250 - USER=doctor ROLE=doctor ENDPOINT=/appointments POST PATIENT=Jane Doe\n")
+        f.write("2026-02-28 17:05:00,000 - USER=nurse ROLE=nurse ENDPOINT=/appointments GET PATIENT=None\n")
+    write(log, line(0))
+    records = AuditLogIndex(str(log)).query("2026-02-28", "2026-03-02")
+    assert [r["user"] for r in records] == ["doctor", "nurse", "dr.smith"]
+    assert records[0] == {"ts": "2026-02-28T17:00:00.250000", "user": "doctor", "role": "doctor",
+                          "endpoint": "/appointments POST", "patient": "Jane Doe"}
+    assert records[1]["patient"] is None
+
+
+def test_concurrent_queries_share_the_sidecar_safely(tmp_path):
+    log = tmp_path / "audit.log"
+    write(log, "".join(line(m) for m in range(2000)))
+    index = AuditLogIndex(str(log))
+    errors, counts = [], []
+
+    def query():
+        try:
+            counts.append(len(index.query(ts(100), ts(200))))
+        except Exception as e:  # noqa: BLE001 - any failure fails the test
+            errors.append(e)
+
+    threads = [threading.Thread(target=query) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert counts == [100] * 8
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["audit.log", "audit.log.idx"]
+
+
+def test_sidecar_rewritten_only_when_the_index_grows(tmp_path):
+    log = tmp_path / "audit.log"
+    write(log, "".join(line(m) for m in range(10)))
+    index = AuditLogIndex(str(log))
+    index.query()
+    sidecar = tmp_path / "audit.log.idx"
+    written = sidecar.stat().st_mtime_ns
+    write(log, '{"ts":"2026-03-01T09:1', "a")  # partial line: nothing new to index
+    assert len(index.query()) == 10
+    assert sidecar.stat().st_mtime_ns == written
+    write(log, '0:30.000000","user":"x"}\n', "a")
+    assert len(index.query()) == 11
+    assert sidecar.stat().st_mtime_ns != written
+
+
+def test_compressed_segment_is_inflated_once(tmp_path, monkeypatch):
+    with gzip.open(tmp_path / "audit.log.1.gz", "wt") as f:
+        f.write("".join(line(m) for m in range(50)))
+    write(tmp_path / "audit.log", line(60))
+    opened = []
+    real_open = gzip.open
+    monkeypatch.setattr(gzip, "open", lambda *a, **k: opened.append(a[0]) or real_open(*a, **k))
+    index = AuditLogIndex(str(tmp_path / "audit.log"))
+    for _ in range(3):
+        assert len(index.query(ts(0), ts(30))) == 30
+    assert len(opened) == 1
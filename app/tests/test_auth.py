@@ -0,0 +1,20 @@
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_logout_revokes_the_token():
+    client = TestClient(main.app)
+    headers = {"Authorization": f"Bearer {main.create_token('doctor', 'doctor')}"}
+    assert client.get("/patients", headers=headers).status_code == 200
+    assert client.post("/logout", headers=headers).status_code == 200
+    assert client.get("/patients", headers=headers).status_code == 401
+
+
+def test_token_issued_right_after_revoking_the_user_is_accepted():
+    client = TestClient(main.app)
+    old = {"Authorization": f"Bearer {main.create_token('nurse', 'nurse')}"}
+    main.revoke_user_tokens("nurse")
+    new = {"Authorization": f"Bearer {main.create_token('nurse', 'nurse')}"}
+    assert client.get("/vitals", headers=old).status_code == 401
+    assert client.get("/vitals", headers=new).status_code == 200
@@ -0,0 +1,134 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "prescriptions_db", [])
+    monkeypatch.setattr(main, "prescription_ids", main.IdSequence())
+    return TestClient(main.app)
+
+
+def auth(role):
+    return {"Authorization": f"Bearer {main.create_token(role, role)}"}
+
+
+def prescriptions(n, patient):
+    return [{"patient_name": patient, "medication": "Lisinopril", "dosage": "10mg", "duration": "30d"}] * n
+
+
+def test_ids_are_not_reused_after_a_rollback(client, monkeypatch):
+    """A chunk that fails after a later chunk was stored must not free ids for reuse"""
+    stored = {}
+    first_chunk_started = threading.Event()
+    second_chunk_stored = threading.Event()
+
+    def persist(collection, *records):
+        if any(r["patient_name"] == "doomed" for r in records):
+            first_chunk_started.set()
+            second_chunk_stored.wait(5)
+            raise RuntimeError("connection lost")
+        for record in records:
+            assert record["id"] not in stored, "id handed out twice"
+            stored[record["id"]] = record
+
+    monkeypatch.setattr(main, "persist", persist)
+    doctor = auth("doctor")
+    failed = {}
+
+    def doomed_batch():
+        failed["response"] = client.post("/prescriptions/batch", json=prescriptions(3, "doomed"), headers=doctor)
+
+    thread = threading.Thread(target=doomed_batch)
+    thread.start()
+    assert first_chunk_started.wait(5)
+    ok = client.post("/prescriptions/batch", json=prescriptions(3, "kept"), headers=doctor)
+    second_chunk_stored.set()
+    thread.join(5)
+
+    assert [r["status"] for r in failed["response"].json()["results"]] == ["failed"] * 3
+    assert [r["status"] for r in ok.json()["results"]] == ["created"] * 3
+    # the old len(db) + 1 would hand out an id the kept chunk already stored
+    taken = set(stored)
+    single = client.post("/prescriptions", params=prescriptions(1, "next")[0], headers=doctor)
+    assert single.status_code == 200
+    assert single.json()["prescription"]["id"] not in taken
+    assert len(stored) == 4
+    assert [p["id"] for p in main.prescriptions_db] == sorted(stored)
+
+
+def test_single_write_rolls_back_when_storage_fails(client, monkeypatch):
+    def persist(collection, *records):
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(main, "persist", persist)
+    with pytest.raises(RuntimeError):
+        client.post("/prescriptions", params=prescriptions(1, "x")[0], headers=auth("doctor"))
+    assert main.prescriptions_db == []
+
+
+def test_appointment_is_unbooked_when_storage_fails(monkeypatch):
+    from appointments import AppointmentStore
+
+    def persist(collection, *records):
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(main, "appointments_db", AppointmentStore())
+    monkeypatch.setattr(main, "persist", persist)
+    slot = {"patient_name": "x", "doctor_name": "dr.smith", "date": "2025-11-08", "time": "09:00"}
+    with pytest.raises(RuntimeError):
+        TestClient(main.app).post("/appointments", params=slot, headers=auth("doctor"))
+    assert main.appointments_db.all() == []
+    assert main.appointments_db.free_slots("dr.smith", "2025-11-08") == AppointmentStore().free_slots("dr.smith", "2025-11-08")
+
+
+class TakenStore:
+    """Stands in for a DocumentStore where another worker already stored ids up to 41"""
+
+    def insert_many(self, records):
+        from db import IdTaken
+        raise IdTaken([r["id"] for r in records])
+
+    def max_id(self):
+        return 41
+
+
+def test_id_taken_by_another_worker_is_409_and_skipped(client, monkeypatch):
+    from db import IdTaken
+    monkeypatch.setattr(main, "IdTaken", IdTaken, raising=False)
+    monkeypatch.setattr(main, "storage", {"prescriptions": TakenStore()})
+    monkeypatch.setitem(main.id_sequences, "prescriptions", main.prescription_ids)
+    response = client.post("/prescriptions", params=prescriptions(1, "x")[0], headers=auth("doctor"))
+    assert response.status_code == 409
+    assert main.prescriptions_db == []
+    assert main.prescription_ids.take() == 42
+
+
+def test_writes_are_shed_before_anything_is_stored(client, monkeypatch):
+    stored = []
+    monkeypatch.setattr(main, "persist", lambda collection, *records: stored.extend(records))
+    monkeypatch.setattr(main.audit_log, "accepting", lambda: False)
+    doctor = auth("doctor")
+    assert client.post("/prescriptions", params=prescriptions(1, "shed")[0], headers=doctor).status_code == 503
+    assert client.post("/prescriptions/batch", json=prescriptions(2, "shed"), headers=doctor).status_code == 503
+    assert stored == [] and main.prescriptions_db == []
+
+
+def test_audit_failure_mid_write_leaves_nothing_stored(client, monkeypatch):
+    stored = []
+    monkeypatch.setattr(main, "persist", lambda collection, *records: stored.extend(records))
+
+    def unavailable(*args, **kwargs):
+        raise main.AuditUnavailable("spill file unwritable")
+
+    monkeypatch.setattr(main.audit_log, "record", unavailable)
+    monkeypatch.setattr(main.audit_log, "record_many", unavailable)
+    doctor = auth("doctor")
+    assert client.post("/prescriptions", params=prescriptions(1, "lost")[0], headers=doctor).status_code == 503
+    batch = client.post("/prescriptions/batch", json=prescriptions(2, "lost"), headers=doctor)
+    assert [r["status"] for r in batch.json()["results"]] == ["failed"] * 2
+    assert stored == [] and main.prescriptions_db == []
@@ -0,0 +1,93 @@
+"""
+Token revocations, account locks and password changes, shared across workers
+Each uvicorn worker has its own TokenCache denylist, lock table and USERS. A
+change is applied at once in the worker that makes it and appended to the
+account_events table (db.py AccountEventStore); every worker replays the rows
+it has not seen each ACCOUNT_EVENTS_SYNC_SECONDS, so the others follow within
+that interval. Without a store (no DATABASE_URL) changes stay in the process
+that made them, which is only right for a single worker.
+"""
+import asyncio
+import os
+import time
+
+ACCOUNT_EVENTS_SYNC_SECONDS = float(os.getenv("ACCOUNT_EVENTS_SYNC_SECONDS", "2"))
+
+
+class AccountEvents:
+    def __init__(self, token_cache, token_lifetime: float, store=None, on_password=None):
+        """token_lifetime: seconds a token lives, so a user revocation can be forgotten after it.
+        on_password(username, password_hash) applies another worker's password change."""
+        self.token_cache = token_cache
+        self.token_lifetime = token_lifetime
+        self.store = store
+        self.on_password = on_password
+        self.locks = {}  # username -> locked until (epoch seconds)
+        self._last_id = 0
+
+    def _share(self, kind: str, subject: str, at: float, expires=None, value=None):
+        if self.store is not None:
+            self.store.add(kind, subject, at, expires, value)
+
+    def revoke_token(self, token: str, exp: float):
+        """Deny one token until its exp (logout)"""
+        self.token_cache.revoke(token, exp)
+        self._share("token", self.token_cache.digest(token).hex(), time.time(), exp)
+
+    def revoke_user(self, username: str):
+        """Deny every token issued to a user until now"""
+        at = time.time()
+        self.token_cache.revoke_user(username, at)
+        self._share("user", username, at, at + self.token_lifetime)
+
+    def lock(self, username: str, until: float, share: bool = True):
+        """Refuse the user's logins until `until` and revoke the tokens they hold.
+
+        share=False for locks every worker reads itself (the responder's journal).
+        """
+        self.locks[username] = until
+        at = time.time()
+        self.token_cache.revoke_user(username, at)
+        if share:
+            self._share("user", username, at, at + self.token_lifetime)
+            self._share("lock", username, at, until)
+
+    def unlock(self, username: str):
+        at = time.time()
+        self.locks.pop(username, None)
+        self._share("lock", username, at, at)
+
+    def is_locked(self, username: str, now: float = None) -> bool:
+        until = self.locks.get(username)
+        return until is not None and until > (time.time() if now is None else now)
+
+    def change_password(self, username: str, password_hash: str):
+        """Share a password change (the caller has set it here) and revoke the old sessions"""
+        self.revoke_user(username)
+        self._share("password", username, time.time(), None, password_hash)
+
+    def apply(self, kind: str, subject: str, at: float, expires, value):
+        if kind == "token":
+            self.token_cache.revoke_digest(bytes.fromhex(subject), expires)
+        elif kind == "user":
+            self.token_cache.revoke_user(subject, at)
+        elif kind == "lock":
+            self.locks[subject] = expires
+        elif kind == "password" and self.on_password is not None:
+            self.on_password(subject, value)
+
+    def sync(self):
+        """Apply the events appended since the last sync, this worker's own included (they are idempotent)"""
+        if self.store is None:
+            return
+        for event_id, *event in self.store.since(self._last_id):
+            self.apply(*event)
+            self._last_id = event_id
+
+    async def run_sync(self, interval: float = ACCOUNT_EVENTS_SYNC_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.sync)
+            except Exception as e:
+                print(f"Account event sync failed: {e}")
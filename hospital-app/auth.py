@@ -0,0 +1,63 @@
+"""
+Credential verification helpers
+Password hashing (bcrypt via passlib) and a bounded thread pool that keeps
+CPU-bound auth work off the event loop
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=int(os.getenv("BCRYPT_ROUNDS", "12"))
+)
+
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", "4"))
+AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", "256"))
+
+# Compared against when the username is unknown so both paths cost one bcrypt verify
+_DUMMY_HASH = pwd_context.hash("not-a-real-password")
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def check_password(password: str, password_hash) -> bool:
+    """Constant-cost password check, safe to call with password_hash=None"""
+    if password_hash is None:
+        pwd_context.verify(password, _DUMMY_HASH)
+        return False
+    return pwd_context.verify(password, password_hash)
+
+
+class AuthExecutor:
+    """Fixed-size worker pool with a cap on queued jobs.
+
+    A login burst fills at most AUTH_MAX_PENDING slots; beyond that callers get
+    a 503 immediately instead of growing an unbounded queue in front of bcrypt.
+    """
+
+    def __init__(self, workers=AUTH_WORKERS, max_pending=AUTH_MAX_PENDING, name="auth"):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self.max_pending = max_pending
+        self.pending = 0
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(503, "Authentication service busy, retry shortly")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+auth_executor = AuthExecutor()
@@ -0,0 +1,98 @@
+"""
+Auth event publisher for the incident responder
+Each login/MFA outcome is written as one JSON line to the responder's Unix
+socket (incident-response/detector.py). Writes never block: unsent bytes wait
+in a bounded buffer, and if the responder is down or that buffer is full the
+event is dropped and counted. A stream socket is used because Linux caps
+queued datagrams at net.unix.max_dgram_qlen (10 by default).
+"""
+import hmac
+import json
+import os
+import socket
+import time
+
+AUTH_EVENTS_SOCKET = os.getenv("AUTH_EVENTS_SOCKET", "/tmp/hospital-auth-events.sock")
+AUTH_EVENTS_ENABLED = os.getenv("AUTH_EVENTS_ENABLED", "1") != "0"
+AUTH_EVENTS_MAX_PENDING = int(os.getenv("AUTH_EVENTS_MAX_PENDING", str(1024 * 1024)))
+RECONNECT_SECONDS = 5
+# Client region header set by the CDN / load balancer (CloudFront sends this one)
+GEO_HEADER = os.getenv("GEO_HEADER", "cloudfront-viewer-country-region")
+# Secret CloudFront adds to every origin request (main.tf custom_header). Anyone
+# can reach the ALB directly and set GEO_HEADER themselves, so the region is only
+# read from requests carrying it; unset, no region is reported at all.
+EDGE_AUTH_HEADER = os.getenv("EDGE_AUTH_HEADER", "x-origin-verify")
+EDGE_AUTH_SECRET = os.getenv("EDGE_AUTH_SECRET", "")
+
+
+def from_edge(request, secret: str = EDGE_AUTH_SECRET) -> bool:
+    """True if the request came through the CDN, proven by the origin secret"""
+    sent = request.headers.get(EDGE_AUTH_HEADER)
+    return bool(secret) and sent is not None and hmac.compare_digest(sent.encode(), secret.encode())
+
+
+def client_region(request, secret: str = EDGE_AUTH_SECRET):
+    """Two-letter state of the client if the edge told us, else None"""
+    if not from_edge(request, secret):
+        return None
+    return request.headers.get(GEO_HEADER)
+
+
+class AuthEventPublisher:
+    def __init__(self, path: str = AUTH_EVENTS_SOCKET, enabled: bool = AUTH_EVENTS_ENABLED,
+                 dropped_counter=None):
+        self.path = path
+        self.enabled = enabled
+        self.dropped_counter = dropped_counter
+        self.sock = None
+        self._pending = b""
+        self._retry_at = 0.0
+
+    def _connect(self) -> bool:
+        now = time.monotonic()
+        if now < self._retry_at:
+            return False
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            # responder not running (ENOENT / ECONNREFUSED), try again later
+            sock.close()
+            self._retry_at = now + RECONNECT_SECONDS
+            return False
+        self.sock = sock
+        return True
+
+    def _drop(self):
+        if self.dropped_counter is not None:
+            self.dropped_counter.inc()
+
+    def publish(self, event_type: str, username: str, ip: str, **fields):
+        if not self.enabled:
+            return
+        if self.sock is None and not self._connect():
+            self._drop()
+            return
+        line = json.dumps({"type": event_type, "username": username, "ip": ip,
+                           "ts": time.time(), **fields}).encode() + b"\n"
+        if len(self._pending) + len(line) > AUTH_EVENTS_MAX_PENDING:
+            self._drop()
+            return
+        self._pending += line
+        try:
+            sent = self.sock.send(self._pending)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            # responder restarted: reconnect on the next event, resending what is pending
+            self.sock.close()
+            self.sock = None
+            return
+        # keep any partial line so the stream stays newline-framed
+        self._pending = self._pending[sent:]
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Block expiry and journal recovery with a million active blocks
+A credential-stuffing wave blocks BLOCKS distinct IPs with staggered expiries,
+then the responder's per-loop work is timed: releasing what is due from the
+heap versus the old full scan of a set of (ip, unblock_time) tuples. Journal
+growth, compaction and restart recovery are timed on the same data.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "incident-response"))
+
+from blocklist import BlockStore
+
+BLOCKS = 1_000_000
+RELEASE_STEPS = 1_000  # expiry passes over the first minute of releases
+
+
+def ips(n):
+    return [f"{11 + (i >> 24)}.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(n)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    rng = random.Random(1)
+    keys = ips(BLOCKS)
+    now = time.time()
+    expiries = [now + 60 + rng.random() * 3600 for _ in keys]
+    path = os.path.join(tempfile.mkdtemp(), "blocklist.journal")
+
+    store = BlockStore(path, now=now)
+
+    def wave():
+        for key, until in zip(keys, expiries):
+            store.add("ip", key, until)
+        store.flush()
+    add_seconds, _ = timed(wave)
+
+    # re-blocking repeat offenders rewrites their expiry and leaves stale heap entries
+    repeat = keys[: BLOCKS // 10]
+    reblock_seconds, _ = timed(lambda: [store.add("ip", k, now + 7200) for k in repeat])
+    store.flush()
+    journal_mb = os.path.getsize(path) / 1e6
+
+    # one release pass per simulated loop wakeup over the first minute of expiries
+    released = 0
+    start = time.perf_counter()
+    for step in range(1, RELEASE_STEPS + 1):
+        released += len(store.expire(now + 60 + 60 * step / RELEASE_STEPS))
+    heap_pass_us = (time.perf_counter() - start) / RELEASE_STEPS * 1e6
+    start = time.perf_counter()
+    for _ in range(10_000):
+        store.expire(now + 60)
+    idle_us = (time.perf_counter() - start) / 10_000 * 1e6
+
+    # the old cleanup_expired_blocks: scan every (ip, unblock_time) each cycle
+    dt_now = datetime.now()
+    legacy = {(k, dt_now + timedelta(seconds=until - now)) for k, until in zip(keys, expiries)}
+    scan_seconds, _ = timed(lambda: [ip for ip, t in legacy if dt_now >= t])
+    del legacy
+
+    # expire most of the wave so the journal is mostly dead records
+    store.expire(now + 3000)
+    live = len(store)
+    records = store.records
+    compact_seconds, _ = timed(store.compact)
+    compact_mb = os.path.getsize(path) / 1e6
+    store.close()
+
+    recover_seconds, recovered = timed(lambda: BlockStore(path, now=now + 3000))
+    assert len(recovered) == live
+    recovered.close()
+
+    print("=" * 60)
+    print(f"blocks added:            {BLOCKS:>10,}  {add_seconds / BLOCKS * 1e6:6.2f} us/block")
+    print(f"re-blocks (extend):      {len(repeat):>10,}  {reblock_seconds / len(repeat) * 1e6:6.2f} us/block")
+    print(f"journal after wave:      {journal_mb:>10.1f} MB")
+    print(f"release pass (heap):     {heap_pass_us:>10.1f} us  ({released / RELEASE_STEPS:.0f} released/pass)")
+    print(f"idle pass (heap):        {idle_us:>10.2f} us")
+    print(f"full scan (old set):     {scan_seconds * 1e3:>10.1f} ms per cycle")
+    print(f"compaction:              {compact_seconds:>10.2f} s  {records:,} -> {live:,} records, {compact_mb:.1f} MB")
+    print(f"recovery on restart:     {recover_seconds:>10.2f} s  ({live:,} live blocks)")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Incident store write and query cost
+Appends INCIDENTS incidents as a sustained attack would (batched, rotating
+every 16 MB) against the old open-append-close per incident, then times the
+admin API's queries - latest page, by type, by severity, since a time and the
+summary - and a cold IncidentReader loading the sealed indexes.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from incident_store import IncidentStore, IncidentReader
+
+INCIDENTS = 1_000_000
+OLD_WAY = 50_000
+QUERIES = 200
+TYPES = ["EXCESSIVE_FAILED_LOGINS", "MFA_BRUTE_FORCE", "GEO_VIOLATION", "RATE_LIMIT_SURGE", "MFA_REPLAY"]
+
+
+def incident(i, start):
+    return {
+        "timestamp": (start + timedelta(milliseconds=10 * i)).isoformat(),
+        "type": TYPES[0] if i % 100 else TYPES[1 + i // 100 % 4],  # a few rare types
+        "severity": "CRITICAL" if i % 7 == 0 else "HIGH",
+        "failed_attempts": 5, "threshold": 5, "window_minutes": 5,
+        "ip": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+        "detection_delay_ms": 1.2,
+        "action_taken": ["IP blocked for 60 minutes", "Admin notified"],
+    }
+
+
+def per_query(fn):
+    start = time.perf_counter()
+    for _ in range(QUERIES):
+        result = fn()
+    return (time.perf_counter() - start) / QUERIES * 1e3, len(result)
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    start_time = datetime(2026, 1, 1)
+    records = [incident(i, start_time) for i in range(INCIDENTS)]
+
+    old_log = os.path.join(directory, "old-incidents.log")
+    start = time.perf_counter()
+    for record in records[:OLD_WAY]:
+        with open(old_log, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    old_us = (time.perf_counter() - start) / OLD_WAY * 1e6
+
+    store = IncidentStore(os.path.join(directory, "incidents"), keep=1000)
+    start = time.perf_counter()
+    for record in records:
+        store.append(record)
+    store.flush()
+    store_us = (time.perf_counter() - start) / INCIDENTS * 1e6
+    segments = len(store.segments)
+
+    start = time.perf_counter()
+    reader = IncidentReader(store.directory)
+    reader.summary()
+    cold_seconds = time.perf_counter() - start
+
+    since = (start_time + timedelta(milliseconds=10 * (INCIDENTS - 500))).isoformat()
+    print("=" * 60)
+    print(f"append, open per incident:   {old_us:8.2f} us/incident")
+    print(f"append, batched store:       {store_us:8.2f} us/incident ({segments} segments)")
+    print(f"reader cold start:           {cold_seconds:8.2f} s  ({INCIDENTS:,} incidents indexed)")
+    for name, fn in [
+        ("latest 10", lambda: reader.read(limit=10)),
+        ("latest 100", lambda: reader.read(limit=100)),
+        ("latest 10 rare type", lambda: reader.read(limit=10, type=TYPES[4])),
+        ("latest 10 CRITICAL", lambda: reader.read(limit=10, severity="CRITICAL")),
+        ("since (500 newer)", lambda: reader.read(since=since, limit=1000)),
+        ("nothing new (push poll)", lambda: reader.read(since=records[-1]["timestamp"], limit=1000)),
+        ("summary", lambda: [reader.summary()]),
+    ]:
+        ms, count = per_query(fn)
+        print(f"{name + ':':<28} {ms:8.3f} ms  ({count} returned)")
+    print("=" * 60)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Per-request cost of the IP blocklist
+Builds a journal of HOSTS blocked addresses plus RANGES IPv4 and IPv6 CIDR
+ranges, then times the full load, a lookup for allowed and blocked clients,
+and an incremental reload that picks up a burst of new blocks.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ip_blocklist import BlocklistFile
+
+HOSTS = 1_000_000
+RANGES = 10_000
+LOOKUPS = 200_000
+BURST = 10_000
+
+
+def line(key, until):
+    return json.dumps(["ip", key, until]) + "\n"
+
+
+def main():
+    rng = random.Random(1)
+    until = time.time() + 3600
+    path = os.path.join(tempfile.mkdtemp(), "blocklist.journal")
+    with open(path, "w") as f:
+        for i in range(HOSTS):
+            f.write(line(f"{10 + (i >> 24)}.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", until))
+        for i in range(RANGES // 2):
+            f.write(line(f"172.{16 + i % 16}.{i % 256}.0/{rng.choice([20, 22, 24])}", until))
+            f.write(line(f"2001:db8:{i:x}::/{rng.choice([48, 56, 64])}", until))
+
+    blocklist = BlocklistFile(path)
+    start = time.perf_counter()
+    blocklist.refresh()
+    load_seconds = time.perf_counter() - start
+    current = blocklist.current
+
+    clients = {
+        "allowed IPv4": [f"192.0.{rng.randrange(256)}.{rng.randrange(256)}" for _ in range(1000)],
+        "blocked host": [f"10.{rng.randrange(16)}.{rng.randrange(256)}.{rng.randrange(256)}" for _ in range(1000)],
+        "blocked range": [f"172.{16 + rng.randrange(16)}.{rng.randrange(256)}.9" for _ in range(1000)],
+        "IPv6 in range": [f"2001:db8:{rng.randrange(RANGES // 2):x}::{rng.randrange(65536):x}" for _ in range(1000)],
+    }
+
+    print("=" * 60)
+    print(f"journal: {HOSTS:,} hosts + {RANGES:,} ranges, {os.path.getsize(path) / 1e6:.1f} MB")
+    print(f"full load:                {load_seconds:8.2f} s")
+    for name, ips in clients.items():
+        start = time.perf_counter()
+        hits = 0
+        for i in range(LOOKUPS):
+            hits += current.is_blocked(ips[i % 1000])
+        elapsed = (time.perf_counter() - start) / LOOKUPS * 1e6
+        print(f"{name + ':':<25} {elapsed:8.2f} us/lookup  ({hits / LOOKUPS:.0%} blocked)")
+
+    with open(path, "a") as f:
+        for i in range(BURST):
+            f.write(line(f"100.64.{i >> 8 & 255}.{i & 255}", until))
+    start = time.perf_counter()
+    blocklist.refresh()
+    reload_ms = (time.perf_counter() - start) * 1e3
+    start = time.perf_counter()
+    blocklist.refresh()
+    idle_us = (time.perf_counter() - start) * 1e6
+    print(f"reload {BURST:,} new blocks:  {reload_ms:8.1f} ms (appended lines only)")
+    print(f"reload, nothing new:      {idle_us:8.1f} us (one stat)")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Per-request overhead of MetricsMiddleware
+Drives a trivial ASGI app directly (no HTTP server) with and without the
+middleware and reports the difference in microseconds per request
+"""
+import asyncio
+import os
+import sys
+import time
+
+from prometheus_client import CollectorRegistry, Counter, Histogram
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from metrics_middleware import MetricsMiddleware
+
+REQUESTS = 200_000
+
+
+class FakeRoute:
+    path = "/api/doctor/patient/{patient_id}"
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = FakeRoute
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def drive(app):
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await app({"type": "http", "method": "GET", "path": "/api/doctor/patient/P001"}, receive, send)
+    return (time.perf_counter() - start) / REQUESTS * 1e6
+
+
+registry = CollectorRegistry()
+wrapped = MetricsMiddleware(
+    endpoint,
+    request_count=Counter('bench_requests_total', 'x', ['method', 'endpoint', 'status'], registry=registry),
+    response_time=Histogram('bench_response_seconds', 'x', ['endpoint'], registry=registry)
+)
+
+bare_us = asyncio.run(drive(endpoint))
+wrapped_us = asyncio.run(drive(wrapped))
+print("=" * 60)
+print(f"bare app:        {bare_us:6.2f} us/request")
+print(f"with middleware: {wrapped_us:6.2f} us/request")
+print(f"overhead:        {wrapped_us - bare_us:6.2f} us/request")
+print("=" * 60)
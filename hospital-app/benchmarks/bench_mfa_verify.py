@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+MFA verifications per second on one core
+Compares a fresh pyotp.TOTP per request against precomputed TotpVerifier
+objects plus the replay cache
+"""
+import os
+import sys
+import time
+
+import pyotp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mfa import TotpVerifier, ReplayCache
+
+SECRET = "JBSWY3DPEHPK3PXP"
+USERS = 1000
+VERIFICATIONS = 200_000
+
+
+def rate(fn):
+    start = time.perf_counter()
+    for i in range(VERIFICATIONS):
+        fn(i)
+    return VERIFICATIONS / (time.perf_counter() - start)
+
+
+code = pyotp.TOTP(SECRET).now()
+verifiers = {f"user{i}": TotpVerifier(SECRET) for i in range(USERS)}
+replay_cache = ReplayCache()
+
+
+def baseline(i):
+    pyotp.TOTP(SECRET).verify(code, valid_window=1)
+
+
+def precomputed(i):
+    username = f"user{i % USERS}"
+    step = verifiers[username].match(code)
+    replay_cache.claim(username, step)
+
+
+print("=" * 60)
+print(f"pyotp.TOTP per request:        {rate(baseline):>12,.0f} verifications/s")
+print(f"TotpVerifier + replay cache:   {rate(precomputed):>12,.0f} verifications/s")
+print("=" * 60)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Patient lookup latency benchmark
+Compares PatientRepository lookups against the old linear scan over PATIENTS
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from patient_repository import PatientRepository
+
+SIZES = [5, 100, 10_000, 100_000, 1_000_000]
+LOOKUPS = 10_000
+SCAN_LOOKUPS = 100
+
+
+def make_patients(n):
+    return [
+        {
+            "id": f"P{i:07d}",
+            "name": f"Patient {i}",
+            "doctor": f"Dr. {i % 500}",
+            "room": f"{i % 2000}A",
+            "condition": f"Condition {i % 50}",
+            "vitals": {"bp": "120/80", "heart_rate": 70, "temp": 98.6, "oxygen": 98},
+        }
+        for i in range(n)
+    ]
+
+
+def per_call_us(fn, ids):
+    start = time.perf_counter()
+    for pid in ids:
+        fn(pid)
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+
+print("=" * 60)
+print(f"{'patients':>10} | {'repo get (us)':>14} | {'by_doctor (us)':>14} | {'scan (us)':>12}")
+print("=" * 60)
+
+for n in SIZES:
+    records = make_patients(n)
+    repo = PatientRepository(records)
+    ids = [random.choice(records)["id"] for _ in range(LOOKUPS)]
+    doctors = [f"Dr. {random.randrange(500)}" for _ in range(LOOKUPS)]
+
+    repo_us = per_call_us(repo.get, ids)
+    doctor_us = per_call_us(repo.by_doctor, doctors)
+    scan_us = per_call_us(lambda pid: next((p for p in records if p["id"] == pid), None), ids[:SCAN_LOOKUPS])
+
+    print(f"{n:>10} | {repo_us:>14.3f} | {doctor_us:>14.3f} | {scan_us:>12.1f}")
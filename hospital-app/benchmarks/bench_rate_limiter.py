@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Overhead of the auth rate limiter
+Times RateLimiter.acquire for a single hot key, for a spray of distinct keys
+(the eviction path an IP-rotating attacker exercises), and the full per-request
+AuthRateLimits.check, then reports memory per tracked key.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from rate_limit import AuthRateLimits, RateLimiter, DEFAULT_LIMITS
+
+CALLS = 500_000
+DISTINCT_KEYS = 200_000
+
+
+class FakeClient:
+    host = "10.0.0.1"
+
+
+class FakeRequest:
+    client = FakeClient
+    headers = {}
+
+
+def per_call(fn, n=CALLS):
+    start = time.perf_counter()
+    fn(n)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def hot_key(n):
+    limiter = RateLimiter(10**9, 60)
+    for _ in range(n):
+        limiter.acquire("10.0.0.1")
+
+
+def key_spray(n):
+    limiter = RateLimiter(10, 300, max_keys=DISTINCT_KEYS // 2)
+    keys = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(DISTINCT_KEYS)]
+    for i in range(n):
+        limiter.acquire(keys[i % DISTINCT_KEYS])
+
+
+def full_check(n):
+    limits = AuthRateLimits({"login": {"per_ip": {"attempts": 10**9, "window_minutes": 1},
+                                       "per_username": {"attempts": 10**9, "window_minutes": 1}}})
+    request = FakeRequest()
+    for _ in range(n):
+        limits.check("login", request, "dr.smith")
+
+
+tracemalloc.start()
+limiter = RateLimiter(10, 300, max_keys=DISTINCT_KEYS)
+before = tracemalloc.get_traced_memory()[0]
+for i in range(DISTINCT_KEYS):
+    limiter.acquire(f"user-{i}")
+bytes_per_key = (tracemalloc.get_traced_memory()[0] - before) / DISTINCT_KEYS
+tracemalloc.stop()
+
+print("=" * 60)
+print(f"hot key acquire:          {per_call(hot_key):6.2f} us/call")
+print(f"distinct-key spray:       {per_call(key_spray):6.2f} us/call  (cap {DISTINCT_KEYS // 2:,} keys)")
+print(f"AuthRateLimits.check:     {per_call(full_check):6.2f} us/request (IP + username)")
+print(f"memory per tracked key:   {bytes_per_key:6.0f} bytes")
+print(f"default login limits:     {DEFAULT_LIMITS['login']}")
+print("=" * 60)
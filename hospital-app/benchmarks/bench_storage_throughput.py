@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Storage throughput: PostgreSQL DocumentStore vs the in-memory baseline
+Requires DATABASE_URL (see db.py for a local container). Uses a scratch
+table so it never touches real data.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from db import Database, DocumentStore
+
+RECORDS = 20_000
+TABLE = "bench_patients"
+
+
+def make_patient(i):
+    return {
+        "id": f"P{i:07d}",
+        "name": f"Patient {i}",
+        "doctor": f"Dr. {i % 500}",
+        "room": f"{i % 2000}A",
+        "condition": "Hypertension",
+        "vitals": {"bp": "120/80", "heart_rate": 70, "temp": 98.6, "oxygen": 98},
+        "medications": ["Lisinopril 10mg"],
+        "balance": 100.0
+    }
+
+
+def rate(label, n, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36} {n / elapsed:>12,.0f} ops/s")
+
+
+if not os.getenv("DATABASE_URL"):
+    sys.exit("Set DATABASE_URL to a PostgreSQL instance")
+
+records = [make_patient(i) for i in range(RECORDS)]
+
+db = Database(os.environ["DATABASE_URL"])
+with db.transaction() as cur:
+    cur.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cur.execute(f"CREATE TABLE {TABLE} (id TEXT PRIMARY KEY, data JSONB NOT NULL, version BIGINT NOT NULL DEFAULT 1)")
+store = DocumentStore(db, TABLE)
+memory = {}
+
+print("=" * 60)
+rate("memory: insert", RECORDS, lambda: [memory.__setitem__(r["id"], r) for r in records])
+rate("postgres: batched insert", RECORDS, lambda: store.insert_many(records))
+rate("postgres: single-row updates", 2000, lambda: [store.update_many([r]) for r in records[:2000]])
+rate("postgres: batched update", RECORDS, lambda: store.update_many(records))
+rate("postgres: startup load (all)", RECORDS, store.all)
+print("=" * 60)
+
+with db.transaction() as cur:
+    cur.execute(f"DROP TABLE {TABLE}")
+db.close()
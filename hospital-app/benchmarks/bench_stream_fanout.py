@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Fan-out capacity of the push-feed Broadcaster
+Opens N in-process subscribers (each a task draining its frames like the SSE
+endpoint does, minus the socket write), publishes stats-sized events and
+reports fan-out latency, memory per subscriber and how many clients one worker
+could hold at a given event rate using half of one core.
+"""
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from broadcaster import Broadcaster
+
+CLIENTS = [1_000, 5_000, 20_000]
+EVENTS = 50
+EVENT_RATE = 10  # events/sec the dashboards see at peak
+EVENT = {"total_patients": 1234, "pending_lab_orders": 17,
+         "by_status": {"lab_orders": {"Pending": 17, "Completed": 880}}}
+
+
+async def consume(sub, counter):
+    async for chunk in sub.frames():
+        counter[0] += chunk.count(b"\n\n")
+
+
+async def run(n):
+    broadcaster = Broadcaster(max_subscribers=n)
+    delivered = [0]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subs = [broadcaster.subscribe({"stats"}) for _ in range(n)]
+    tasks = [asyncio.create_task(consume(sub, delivered)) for sub in subs]
+    await asyncio.sleep(0)
+    per_sub = (tracemalloc.get_traced_memory()[0] - before) / n
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for i in range(EVENTS):
+        broadcaster.publish("stats", EVENT)
+        # let every subscriber drain before the next event, as at a real event rate
+        while delivered[0] < n * (i + 1):
+            await asyncio.sleep(0)
+    per_event = (time.perf_counter() - start) / EVENTS
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return per_event, per_sub
+
+
+print("=" * 60)
+print(f"{'clients':>8} {'ms/event':>10} {'us/client':>10} {'bytes/client':>13}")
+worst_us = 0.0
+for n in CLIENTS:
+    per_event, per_sub = asyncio.run(run(n))
+    us_per_client = per_event / n * 1e6
+    worst_us = max(worst_us, us_per_client)
+    print(f"{n:>8} {per_event * 1000:>10.2f} {us_per_client:>10.2f} {per_sub:>13.0f}")
+print("=" * 60)
+capacity = int(0.5 / (EVENT_RATE * worst_us / 1e6))
+print(f"~{capacity:,} clients per worker at {EVENT_RATE} events/s within 50% CPU")
+print("(in-process only: socket writes to real clients come on top)")
+print("=" * 60)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Auth overhead per request with the validated-token cache on and off
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import jwt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from token_cache import TokenCache
+
+SECRET_KEY = "your-secret-key-change-in-production"
+REQUESTS = 200_000
+ACTIVE_TOKENS = 500
+
+
+def make_token(i):
+    payload = {
+        "username": f"user{i}",
+        "role": "doctor",
+        "name": f"User {i}",
+        "department": "Cardiology",
+        "exp": datetime.utcnow() + timedelta(hours=8)
+    }
+    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+
+
+def verify(cache, token):
+    payload = cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        cache.put(token, payload)
+    return payload
+
+
+tokens = [make_token(i) for i in range(ACTIVE_TOKENS)]
+
+print("=" * 60)
+for enabled in (False, True):
+    cache = TokenCache(maxsize=10000, enabled=enabled)
+    start = time.perf_counter()
+    for n in range(REQUESTS):
+        verify(cache, tokens[n % ACTIVE_TOKENS])
+    elapsed = time.perf_counter() - start
+    print(f"cache {'on ' if enabled else 'off'}: {elapsed / REQUESTS * 1e6:7.2f} us/request "
+          f"(hits={cache.hits}, misses={cache.misses})")
+print("=" * 60)
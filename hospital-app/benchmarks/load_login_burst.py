@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Login burst load test
+Fires 500 logins/second at /api/auth/login while probing /health and
+/api/doctor/patients, then reports p50/p99 latency of the non-auth probes.
+
+Usage: python load_login_burst.py [base_url] [duration_seconds]
+"""
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:5000"
+DURATION = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+LOGINS_PER_SECOND = 500
+PROBE_INTERVAL = 0.01
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000
+
+
+def login(session):
+    session.post(f"{BASE_URL}/api/auth/login",
+                 params={"username": "dr.smith", "password": "wrong-password"})
+
+
+def login_burst(stop):
+    session = requests.Session()
+    with ThreadPoolExecutor(max_workers=200) as pool:
+        next_tick = time.perf_counter()
+        while not stop.is_set():
+            for _ in range(LOGINS_PER_SECOND // 10):
+                pool.submit(login, session)
+            next_tick += 0.1
+            time.sleep(max(0, next_tick - time.perf_counter()))
+
+
+def probe(path, headers, stop, samples):
+    session = requests.Session()
+    while not stop.is_set():
+        start = time.perf_counter()
+        session.get(f"{BASE_URL}{path}", headers=headers)
+        samples.append(time.perf_counter() - start)
+        time.sleep(PROBE_INTERVAL)
+
+
+def run(with_burst, headers):
+    stop = threading.Event()
+    samples = {"/health": [], "/api/doctor/patients": []}
+    threads = [threading.Thread(target=probe, args=(path, headers, stop, s)) for path, s in samples.items()]
+    if with_burst:
+        threads.append(threading.Thread(target=login_burst, args=(stop,)))
+    for t in threads:
+        t.start()
+    time.sleep(DURATION)
+    stop.set()
+    for t in threads:
+        t.join()
+    return samples
+
+
+if __name__ == "__main__":
+    import pyotp
+    requests.post(f"{BASE_URL}/api/auth/login", params={"username": "dr.smith", "password": "doctor123"})
+    token = requests.post(f"{BASE_URL}/api/auth/mfa", params={
+        "username": "dr.smith", "mfa_code": pyotp.TOTP("JBSWY3DPEHPK3PXP").now()
+    }).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    print("=" * 60)
+    for label, burst in (("idle", False), (f"{LOGINS_PER_SECOND} logins/s", True)):
+        for path, samples in run(burst, headers).items():
+            print(f"{label:>16} {path:<24} p50={percentile(samples, 50):7.2f}ms "
+                  f"p99={percentile(samples, 99):7.2f}ms n={len(samples)}")
+    print("=" * 60)
@@ -0,0 +1,128 @@
+"""
+In-process broadcaster for dashboard push feeds
+Each published event is encoded once as a Server-Sent Events frame and the same
+bytes are queued to every subscriber of its topic. A subscriber that falls
+STREAM_QUEUE_SIZE frames behind is dropped; its browser reconnects with
+Last-Event-ID and catches up from the ring of recent events.
+"""
+import asyncio
+import os
+from collections import deque
+
+import orjson
+from fastapi import HTTPException
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "256"))
+STREAM_REPLAY_SIZE = int(os.getenv("STREAM_REPLAY_SIZE", "1000"))
+STREAM_MAX_SUBSCRIBERS = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "10000"))
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+
+def encode_event(event_id: int, topic: str, data) -> bytes:
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, topic.encode(), orjson.dumps(data))
+
+
+class Subscription:
+    def __init__(self, topics, queue_size: int):
+        self.topics = frozenset(topics)
+        self.queue_size = queue_size
+        self.dropped = False
+        self.active = True
+        self._frames = deque()
+        self._wake = asyncio.Event()
+
+    def push(self, frame: bytes):
+        if len(self._frames) >= self.queue_size:
+            self.dropped = True
+        else:
+            self._frames.append(frame)
+        self._wake.set()
+
+    async def frames(self):
+        """Yield pending frames joined into one chunk until dropped"""
+        while not self.dropped:
+            if not self._frames:
+                self._wake.clear()
+                await self._wake.wait()
+                if self.dropped:
+                    return
+            chunk = b"".join(self._frames)
+            self._frames.clear()
+            yield chunk
+
+
+class Broadcaster:
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE, replay_size: int = STREAM_REPLAY_SIZE,
+                 max_subscribers: int = STREAM_MAX_SUBSCRIBERS, subscriber_gauge=None):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.subscriber_gauge = subscriber_gauge
+        self._by_topic = {}
+        self._count = 0
+        self._recent = deque(maxlen=replay_size)
+        self._last_id = 0
+
+    def __len__(self):
+        return self._count
+
+    def has_subscribers(self, topic: str) -> bool:
+        return bool(self._by_topic.get(topic))
+
+    def subscribe(self, topics, last_event_id=None) -> Subscription:
+        """Register a subscriber; with last_event_id, queue what it missed first"""
+        if self._count >= self.max_subscribers:
+            raise HTTPException(503, "Too many open streams, retry later")
+        sub = Subscription(topics, self.queue_size)
+        if last_event_id is not None and last_event_id != self._last_id:
+            oldest = self._recent[0][0] if self._recent else self._last_id + 1
+            if last_event_id < oldest - 1 or last_event_id > self._last_id:
+                # gap no longer in the ring, or ids from another worker or
+                # before a restart: the client must refetch
+                sub.push(encode_event(self._last_id, "reset", {}))
+            else:
+                for event_id, topic, frame in self._recent:
+                    if event_id > last_event_id and topic in sub.topics:
+                        sub.push(frame)
+        for topic in sub.topics:
+            self._by_topic.setdefault(topic, set()).add(sub)
+        self._count += 1
+        if self.subscriber_gauge is not None:
+            self.subscriber_gauge.inc()
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        if not sub.active:
+            return
+        sub.active = False
+        for topic in sub.topics:
+            subscribers = self._by_topic.get(topic)
+            if subscribers is not None:
+                subscribers.discard(sub)
+        self._count -= 1
+        if self.subscriber_gauge is not None:
+            self.subscriber_gauge.dec()
+
+    def keepalive(self):
+        """Send a comment frame to every subscriber so proxies keep idle streams open"""
+        subscribers = set()
+        for subs in self._by_topic.values():
+            subscribers.update(subs)
+        for sub in subscribers:
+            if not sub._frames:
+                sub.push(KEEPALIVE_FRAME)
+
+    async def run_keepalive(self, interval: float = STREAM_KEEPALIVE_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            self.keepalive()
+
+    def publish(self, topic: str, data) -> int:
+        """Fan an event out to every subscriber of topic; must run on the event loop"""
+        self._last_id += 1
+        frame = encode_event(self._last_id, topic, data)
+        self._recent.append((self._last_id, topic, frame))
+        for sub in self._by_topic.get(topic, ()):
+            sub.push(frame)
+        return self._last_id
@@ -0,0 +1,166 @@
+"""
+Incident deduplication and notification dispatch
+A rule that keeps firing for the same username, IP or series is one ongoing
+incident, not a new one per firing. Each detection is fingerprinted as
+rule:group:key; while a fingerprint is open (seen within suppress_minutes of
+its last firing) repeats only bump its occurrence count, and when it goes
+quiet the incident is closed with the final count.
+
+Notifications leave the responder's loop through a queue. A worker thread
+coalesces whatever arrives within batch_seconds into one digest and sends at
+most per_minute digests, folding anything over the limit into the next one,
+so a burst of incidents costs a handful of messages.
+
+Both are configured in the notifications section of alert_rules.yml, and a
+rule can set its own suppress_minutes.
+"""
+import heapq
+import queue
+import threading
+import time
+
+from prometheus_client import Counter
+
+DEFAULT_NOTIFICATIONS = {
+    "suppress_minutes": 15,
+    "batch_seconds": 10,
+    "max_batch": 50,
+    "per_minute": 6,
+    "max_queued": 10000,
+}
+
+incidents_suppressed = Counter('incident_suppressed', 'Repeat detections folded into an open incident', ['rule'])
+notifications_sent = Counter('incident_notifications_sent', 'Notification digests sent')
+notifications_dropped = Counter('incident_notifications_dropped', 'Notifications dropped: queue full or send failed')
+
+
+def notification_settings(config: dict) -> dict:
+    return {**DEFAULT_NOTIFICATIONS, **(config.get("notifications") or {})}
+
+
+class OpenIncident:
+    def __init__(self, incident: dict, now: float, window: float):
+        self.incident = incident
+        self.occurrences = 1
+        self.last_seen = now
+        self.window = window
+        self.expires_at = now + window
+
+
+class Deduplicator:
+    """Open incidents by fingerprint, closed once quiet for their suppression window"""
+
+    def __init__(self, suppress_seconds: float):
+        self.suppress_seconds = suppress_seconds
+        self._open = {}  # fingerprint -> OpenIncident
+        self._heap = []  # (expires_at, fingerprint), one entry per open incident
+
+    def __len__(self):
+        return len(self._open)
+
+    def seen(self, fingerprint: str, rule: str, now: float):
+        """The open incident for `fingerprint` with its count bumped, or None if there is none"""
+        entry = self._open.get(fingerprint)
+        if entry is None or now >= entry.expires_at:
+            return None
+        entry.occurrences += 1
+        entry.last_seen = now
+        entry.expires_at = now + entry.window  # the heap entry is rescheduled when it surfaces
+        incidents_suppressed.labels(rule=rule).inc()
+        return entry
+
+    def open(self, fingerprint: str, incident: dict, now: float, suppress_seconds: float = None):
+        """Start suppressing repeats of `fingerprint`; expire() must have closed any previous one"""
+        window = self.suppress_seconds if suppress_seconds is None else suppress_seconds
+        entry = self._open[fingerprint] = OpenIncident(incident, now, window)
+        heapq.heappush(self._heap, (entry.expires_at, fingerprint))
+        return entry
+
+    def expire(self, now: float):
+        """Close and return the OpenIncidents that have been quiet for their whole window"""
+        closed = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, fingerprint = heapq.heappop(heap)
+            entry = self._open[fingerprint]
+            if entry.expires_at > now:
+                heapq.heappush(heap, (entry.expires_at, fingerprint))  # fired again since it was scheduled
+                continue
+            del self._open[fingerprint]
+            closed.append(entry)
+        return closed
+
+
+class NotificationDispatcher:
+    def __init__(self, send_digest, batch_seconds: float = 10, max_batch: int = 50,
+                 per_minute: float = 6, max_queued: int = 10000):
+        """send_digest(incidents) runs on the dispatcher thread"""
+        self.send_digest = send_digest
+        self.batch_seconds = batch_seconds
+        self.max_batch = max_batch
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.capacity = float(per_minute)
+        self._updated = time.monotonic()
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+        self._thread.start()
+
+    def submit(self, incident: dict):
+        """Queue a notification without blocking the caller"""
+        try:
+            self._queue.put_nowait(incident)
+        except queue.Full:
+            notifications_dropped.inc()
+
+    def _take_token(self) -> float:
+        """0 if a digest may be sent now, else seconds until one may"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def _collect(self, batch: list, seconds: float, limit: float) -> bool:
+        """Add queued incidents to batch for up to `seconds`; True if close() was called"""
+        deadline = time.monotonic() + seconds
+        while len(batch) < limit:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return False
+            if item is None:
+                return True
+            batch.append(item)
+        return False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = self._collect(batch, self.batch_seconds, self.max_batch)
+            # over the rate limit: keep folding new incidents into this digest until it may go
+            while not stopping:
+                wait = self._take_token()
+                if wait == 0:
+                    break
+                stopping = self._collect(batch, wait, float("inf"))
+            try:
+                self.send_digest(batch)
+                notifications_sent.inc()
+            except Exception as e:
+                notifications_dropped.inc(len(batch))
+                print(f"Notification failed ({len(batch)} incidents): {e}")
+
+    def close(self, timeout: float = 5):
+        """Send what is queued and stop the worker"""
+        self._queue.put(None)
+        self._thread.join(timeout)
@@ -0,0 +1,184 @@
+"""
+IP blocks and account locks with heap-scheduled expiry
+Active blocks live in a dict keyed by (kind, key) with a min-heap of expiry
+times beside it, so releasing what is due costs O(log n) per block instead of
+a scan of every block. Re-blocking an active key only ever extends it; the
+superseded heap entry is skipped when it surfaces.
+
+Every block is appended to a journal as one JSON line, ["ip", "1.2.3.4", until],
+and replayed on start so blocks survive a restart. Expiries are not written:
+replay drops anything already past `until`. Once the journal holds more than
+twice as many records as there are live blocks it is rewritten to just the
+live set, so recovery time stays proportional to what is actually blocked.
+
+Addresses in the allowlist are never blocked: private, loopback and
+link-local ranges (the ALB and health checks reach the app from the VPC) and
+BLOCK_ALLOWLIST, which should hold the proxies in front of the app. Blocking
+one of those would lock out every user at once.
+"""
+import heapq
+import ipaddress
+import json
+import os
+import socket
+import time
+
+BLOCKLIST_JOURNAL = os.getenv("BLOCKLIST_JOURNAL", "blocklist.journal")
+# Never compact below this many records, a small journal is cheap to replay
+COMPACT_MIN_RECORDS = int(os.getenv("BLOCKLIST_COMPACT_MIN_RECORDS", "10000"))
+PRIVATE_RANGES = ("10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16", "100.64.0.0/10", "127.0.0.0/8",
+                  "169.254.0.0/16", "::1/128", "fc00::/7", "fe80::/10")
+# Comma-separated CIDRs of proxies in front of the app, e.g. CloudFront's origin-facing ranges
+BLOCK_ALLOWLIST = [n.strip() for n in os.getenv("BLOCK_ALLOWLIST", "").split(",") if n.strip()]
+
+
+def allowlist_networks(extra=BLOCK_ALLOWLIST):
+    return [ipaddress.ip_network(n, strict=False) for n in (*PRIVATE_RANGES, *extra)]
+
+
+def address_span(key: str):
+    """(version, first, last) of an address or CIDR range as ints, or None"""
+    if "/" not in key:
+        # inet_pton is several times faster than ipaddress, and addresses are the common case
+        for version, family in ((4, socket.AF_INET), (6, socket.AF_INET6)):
+            try:
+                value = int.from_bytes(socket.inet_pton(family, key), "big")
+            except OSError:
+                continue
+            return version, value, value
+        return None
+    try:
+        network = ipaddress.ip_network(key, strict=False)
+    except ValueError:
+        return None
+    return network.version, int(network.network_address), int(network.broadcast_address)
+
+
+class BlockStore:
+    def __init__(self, path: str = BLOCKLIST_JOURNAL, now: float = None, allowlist=None):
+        self.path = path
+        # (version, first, last) per allowlisted range; ipaddress.overlaps is too slow for every block
+        self.allowlist = [(n.version, int(n.network_address), int(n.broadcast_address))
+                          for n in (allowlist_networks() if allowlist is None else allowlist)]
+        self._until = {}  # (kind, key) -> expiry, epoch seconds
+        self._heap = []  # (expiry, kind, key), may hold superseded entries
+        self._counts = {}
+        self.records = 0  # lines in the journal
+        self._load(time.time() if now is None else now)
+        self._journal = open(path, "a")
+        if self._bloated():
+            self.compact()
+
+    def __len__(self):
+        return len(self._until)
+
+    def __contains__(self, item):
+        return item in self._until
+
+    def count(self, kind: str) -> int:
+        return self._counts.get(kind, 0)
+
+    def allowlisted(self, ip: str) -> bool:
+        """True if `ip` (an address or CIDR range) touches a range that must never be blocked"""
+        span = address_span(ip)
+        if span is None:
+            return False
+        version, first, last = span
+        return any(v == version and first <= hi and lo <= last for v, lo, hi in self.allowlist)
+
+    def until(self, kind: str, key: str):
+        """Expiry of an active block, or None"""
+        return self._until.get((kind, key))
+
+    def _load(self, now: float):
+        try:
+            f = open(self.path)
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    kind, key, until = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash mid-write
+                self.records += 1
+                if until > self._until.get((kind, key), 0):
+                    self._until[(kind, key)] = until
+        for (kind, key), until in list(self._until.items()):
+            if until <= now or (kind == "ip" and self.allowlisted(key)):
+                del self._until[(kind, key)]
+            else:
+                self._counts[kind] = self._counts.get(kind, 0) + 1
+        self._heap = [(until, kind, key) for (kind, key), until in self._until.items()]
+        heapq.heapify(self._heap)
+
+    def add(self, kind: str, key: str, until: float) -> bool:
+        """Block `key` until `until`; False if it is allowlisted or already blocked at least that long"""
+        if kind == "ip" and self.allowlisted(key):
+            return False
+        current = self._until.get((kind, key))
+        if current is not None and current >= until:
+            return False
+        if current is None:
+            self._counts[kind] = self._counts.get(kind, 0) + 1
+        self._until[(kind, key)] = until
+        heapq.heappush(self._heap, (until, kind, key))
+        # json keeps a username with a newline in it from forging extra records
+        self._journal.write(json.dumps([kind, key, until]) + "\n")
+        self.records += 1
+        return True
+
+    def next_expiry(self):
+        """Epoch seconds of the next release, or None if nothing is blocked"""
+        heap = self._heap
+        while heap and self._until.get((heap[0][1], heap[0][2])) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def expire(self, now: float = None):
+        """Release every block that is due, returning [(kind, key), ...]"""
+        if now is None:
+            now = time.time()
+        heap, active = self._heap, self._until
+        released = []
+        while heap and heap[0][0] <= now:
+            until, kind, key = heapq.heappop(heap)
+            if active.get((kind, key)) != until:
+                continue  # superseded by a longer block
+            del active[(kind, key)]
+            self._counts[kind] -= 1
+            released.append((kind, key))
+        return released
+
+    def flush(self):
+        """Push journal writes to the OS; called once per responder loop, not per block"""
+        self._journal.flush()
+
+    def _bloated(self) -> bool:
+        return self.records > COMPACT_MIN_RECORDS and self.records > 2 * len(self._until)
+
+    def maybe_compact(self) -> bool:
+        if not self._bloated():
+            return False
+        self.compact()
+        return True
+
+    def compact(self):
+        """Rewrite the journal as the live blocks, atomically replacing the old one"""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.writelines(json.dumps([kind, key, until]) + "\n"
+                         for (kind, key), until in self._until.items())
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal.close()
+        os.replace(tmp, self.path)
+        self._journal = open(self.path, "a")
+        self.records = len(self._until)
+        # superseded entries would otherwise pile up under repeated re-blocks
+        if len(self._heap) > 2 * len(self._until):
+            self._heap = [(until, kind, key) for (kind, key), until in self._until.items()]
+            heapq.heapify(self._heap)
+
+    def close(self):
+        self._journal.close()
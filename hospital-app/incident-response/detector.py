@@ -0,0 +1,147 @@
+"""
+Event-driven brute-force detection
+The hospital app writes one JSON line per auth event to AUTH_EVENTS_SOCKET (see
+hospital-app/auth_events.py). Every alert rule with an `event` keeps a sliding
+window per username and per IP, and an incident is raised on the event that
+crosses the threshold instead of on the next Prometheus poll.
+"""
+import json
+import os
+import selectors
+import socket
+from collections import OrderedDict, deque
+
+AUTH_EVENTS_SOCKET = os.getenv("AUTH_EVENTS_SOCKET", "/tmp/hospital-auth-events.sock")
+RECV_SIZE = 256 * 1024
+
+
+class SlidingWindow:
+    """Per-key count of events in the last `window` seconds, O(threshold) memory per key"""
+
+    def __init__(self, threshold: int, window_seconds: float):
+        self.threshold = threshold
+        self.window = window_seconds
+        # key -> timestamps of its last `threshold` events; least recently seen first
+        self._keys = OrderedDict()
+        self.crossed_from = None  # first timestamp of the run behind the last crossing
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key, ts: float) -> bool:
+        """Record an event; True if it brings the key to `threshold` within the window"""
+        times = self._keys.get(key)
+        if times is None:
+            times = self._keys[key] = deque(maxlen=self.threshold)
+        else:
+            self._keys.move_to_end(key)
+        times.append(ts)
+        self._evict(ts)
+        if len(times) == self.threshold and ts - times[0] <= self.window:
+            # the next incident for this key needs a fresh run of events
+            self.crossed_from = times[0]
+            times.clear()
+            return True
+        return False
+
+    def _evict(self, now: float):
+        keys = self._keys
+        for _ in range(2):
+            if not keys:
+                return
+            key, times = next(iter(keys.items()))
+            if times and now - times[-1] <= self.window:
+                return
+            del keys[key]
+
+
+class Rule:
+    def __init__(self, name: str, config: dict):
+        self.name = name
+        self.title = config.get("name", name)
+        self.type = config.get("type", name.upper())
+        self.event = config["event"]
+        self.threshold = config["threshold"]
+        self.window_minutes = config["window_minutes"]
+        self.severity = config.get("severity", "high").upper()
+        self.suppress_minutes = config.get("suppress_minutes")
+        self.action = config.get("action", "notify")
+        self.windows = {
+            group: SlidingWindow(self.threshold, self.window_minutes * 60)
+            for group in config.get("group_by", ["username", "ip"])
+        }
+
+
+class BruteForceDetector:
+    def __init__(self, alerts: dict, on_incident):
+        """on_incident(rule, group, key, event) runs for every threshold crossing;
+        the event carries first_ts, the time of the first event in the window"""
+        self.on_incident = on_incident
+        self.rules_by_event = {}
+        for name, config in alerts.items():
+            if "event" not in config:
+                continue
+            rule = Rule(name, config)
+            self.rules_by_event.setdefault(rule.event, []).append(rule)
+
+    def observe(self, event: dict):
+        for rule in self.rules_by_event.get(event.get("type"), ()):
+            for group, window in rule.windows.items():
+                key = event.get(group)
+                if key and window.add(key, event["ts"]):
+                    self.on_incident(rule, group, key, dict(event, first_ts=window.crossed_from))
+
+
+class AuthEventListener:
+    """Unix stream socket that every app worker's AuthEventPublisher connects to"""
+
+    def __init__(self, path: str = AUTH_EVENTS_SOCKET):
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)  # left over from a previous run
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(64)
+        self.server.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ)
+        self._buffers = {}
+
+    def poll(self, timeout: float):
+        """Events received within `timeout` seconds, returning as soon as any arrive"""
+        events = []
+        for key, _ in self.selector.select(timeout):
+            sock = key.fileobj
+            if sock is self.server:
+                conn, _ = self.server.accept()
+                conn.setblocking(False)
+                self.selector.register(conn, selectors.EVENT_READ)
+                self._buffers[conn] = b""
+                continue
+            try:
+                data = sock.recv(RECV_SIZE)
+            except BlockingIOError:
+                continue
+            except OSError:
+                data = b""
+            if not data:
+                # worker exited or restarted
+                self.selector.unregister(sock)
+                del self._buffers[sock]
+                sock.close()
+                continue
+            *lines, self._buffers[sock] = (self._buffers[sock] + data).split(b"\n")
+            for line in lines:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+        return events
+
+    def close(self):
+        for sock in list(self._buffers):
+            sock.close()
+        self.selector.close()
+        self.server.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
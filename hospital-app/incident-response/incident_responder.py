@@ -1,10 +1,17 @@
 #!/usr/bin/env python3
 """
 Automated Incident Response System
-Monitors Prometheus metrics and takes automated actions
+Evaluates every rule in alert_rules.yml (auth events as they arrive, Prometheus
+queries in concurrent batches) and takes automated actions. IP blocks and
+account locks are journaled (blocklist.py) and restored on restart; incidents
+go to the rotating, indexed store shared with the app (../incident_store.py).
+Repeat firings for the same key are folded into one open incident, and
+notifications go out in rate-limited digests (alerting.py). replay.py runs
+the same logic over recorded events at virtual time to backtest thresholds.
 """
 
-import requests
+import os
+import sys
 import time
 import json
 import yaml
@@ -12,147 +19,162 @@ from datetime import datetime, timedelta
 from collections import defaultdict
 import smtplib
 from email.mime.text import MIMEText
+from prometheus_client import start_http_server
+from detector import AuthEventListener, AUTH_EVENTS_SOCKET
+from rule_engine import ACTION_SUBJECT, RuleEngine
+from blocklist import BlockStore, BLOCKLIST_JOURNAL
+from alerting import Deduplicator, NotificationDispatcher, notification_settings
+
+# The incident store lives with the app, which reads it for the admin API
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from incident_store import IncidentStore, INCIDENTS_DIR
+
+# Per-rule timing and error metrics are served here for Prometheus to scrape
+RESPONDER_METRICS_PORT = int(os.getenv("RESPONDER_METRICS_PORT", "9102"))
+# Every auth event received is also appended here when set, for replay.py
+AUTH_EVENTS_RECORD = os.getenv("AUTH_EVENTS_RECORD")
+# Releases beyond this many per pass are summarised instead of printed one by one
+MAX_RELEASES_PRINTED = 20
 
 class IncidentResponder:
-    def __init__(self, prometheus_url="http://localhost:9090", config_file="alert_rules.yml"):
+    def __init__(self, prometheus_url="http://localhost:9090", config_file="alert_rules.yml",
+                 clock=time.time, blocklist_journal=BLOCKLIST_JOURNAL, incidents_dir=INCIDENTS_DIR):
         self.prometheus_url = prometheus_url
-        self.blocked_ips = set()
-        self.locked_accounts = {}
-        self.incident_log = []
+        # epoch seconds; replay.py substitutes the virtual time of the event being replayed
+        self.clock = clock
+        # IP blocks and account locks, restored from the journal on start
+        self.blocks = BlockStore(blocklist_journal, now=clock())
+        self.incidents = IncidentStore(incidents_dir)
         
         # Load configuration
         with open(config_file, 'r') as f:
             self.config = yaml.safe_load(f)
         
-        print(f"[{datetime.now()}] Incident Responder Started")
-        print(f"Monitoring: {prometheus_url}")
-    
-    def query_prometheus(self, query):
-        """Query Prometheus metrics"""
-        try:
-            response = requests.get(
-                f"{self.prometheus_url}/api/v1/query",
-                params={'query': query}
-            )
-            return response.json()
-        except Exception as e:
-            print(f"Error querying Prometheus: {e}")
-            return None
-    
-    def check_failed_logins(self):
-        """Check for excessive failed login attempts"""
-        threshold = self.config['alerts']['failed_login_threshold']['threshold']
-        window = self.config['alerts']['failed_login_threshold']['window_minutes']
+        self.engine = RuleEngine(self.config, prometheus_url, self.handle_detection)
         
-        # Query failed logins in last N minutes
-        query = f'increase(hospital_login_attempts_total{{status="failed"}}[{window}m])'
-        result = self.query_prometheus(query)
+        notifications = notification_settings(self.config)
+        self.dedupe = Deduplicator(notifications['suppress_minutes'] * 60)
+        self.notifier = NotificationDispatcher(
+            self.send_digest,
+            batch_seconds=notifications['batch_seconds'],
+            max_batch=notifications['max_batch'],
+            per_minute=notifications['per_minute'],
+            max_queued=notifications['max_queued']
+        )
         
-        if result and result['status'] == 'success':
-            data = result['data']['result']
-            if data and len(data) > 0:
-                failed_count = float(data[0]['value'][1])
-                
-                if failed_count >= threshold:
-                    self.handle_failed_login_incident(failed_count, threshold)
-                    return True
-        return False
+        print(f"[{datetime.now()}] Incident Responder Started")
+        print(f"Monitoring: {prometheus_url}")
+        print(f"Restored: {self.blocks.count('ip')} IP blocks, "
+              f"{self.blocks.count('account')} account locks from {BLOCKLIST_JOURNAL}")
     
-    def check_mfa_brute_force(self):
-        """Check for MFA brute force attempts"""
-        threshold = self.config['alerts']['mfa_brute_force']['threshold']
-        window = self.config['alerts']['mfa_brute_force']['window_minutes']
+    def handle_detection(self, rule, group, key, details):
+        """Handle a rule firing for one username, IP or Prometheus series"""
+        action = self.response(rule, group)
+        label = {'username': 'Username', 'ip': 'IP'}.get(group, 'Series')
         
-        query = f'increase(hospital_mfa_attempts_total{{status="failed"}}[{window}m])'
-        result = self.query_prometheus(query)
+        now = self.clock()
+        fingerprint = f"{rule.name}:{group}:{key}"
+        self.close_quiet_incidents(now)
+        if self.dedupe.seen(fingerprint, rule.name, now) is not None:
+            # same attack still going: no new incident or alert, just keep it blocked
+            self.extend_action(action, key)
+            return
         
-        if result and result['status'] == 'success':
-            data = result['data']['result']
-            if data and len(data) > 0:
-                failed_count = float(data[0]['value'][1])
-                
-                if failed_count >= threshold:
-                    self.handle_mfa_brute_force(failed_count, threshold)
-                    return True
-        return False
-    
-    def handle_failed_login_incident(self, failed_count, threshold):
-        """Handle excessive failed login attempts"""
         incident = {
-            'timestamp': datetime.now().isoformat(),
-            'type': 'EXCESSIVE_FAILED_LOGINS',
-            'severity': 'CRITICAL',
-            'failed_attempts': int(failed_count),
-            'threshold': threshold,
+            'timestamp': datetime.fromtimestamp(now).isoformat(),
+            'type': rule.type,
+            'severity': rule.severity,
+            'failed_attempts': details.get('value', rule.threshold),
+            'threshold': rule.threshold,
+            'window_minutes': rule.window_minutes,
+            group: key,
+            'fingerprint': fingerprint,
             'action_taken': []
         }
+        if 'ts' in details:
+            incident['detection_delay_ms'] = round((now - details['ts']) * 1000, 1)
+        if 'first_ts' in details:
+            # how long the attack ran before it crossed the threshold
+            incident['time_to_detect_s'] = round(now - details['first_ts'], 1)
+        if details.get('state'):
+            incident['state'] = details['state']
         
         print(f"\n{'='*60}")
         print(f"🚨 SECURITY INCIDENT DETECTED 🚨")
-        print(f"Type: Excessive Failed Login Attempts")
-        print(f"Count: {int(failed_count)} (Threshold: {threshold})")
+        print(f"Type: {rule.title}")
+        print(f"{label}: {key}")
+        print(f"Count: {incident['failed_attempts']} (Threshold: {rule.threshold})")
         print(f"Time: {incident['timestamp']}")
         print(f"{'='*60}")
         
-        # Action 1: Lock the account (simulated)
-        if self.config['actions']['lock_account']['enabled']:
-            duration = self.config['actions']['lock_account']['duration_minutes']
-            self.lock_account("suspicious_user", duration)
-            incident['action_taken'].append(f"Account locked for {duration} minutes")
-            print(f"✅ Action: Account locked for {duration} minutes")
-        
-        # Action 2: Log to incident file
-        self.log_incident(incident)
+        if action != 'notify' and self.config['actions'][action]['enabled']:
+            duration = self.config['actions'][action]['duration_minutes']
+            if action == 'lock_account':
+                self.lock_account(key, duration)
+                incident['action_taken'].append(f"Account {key} locked for {duration} minutes")
+            else:
+                if self.block_ip(key, duration):
+                    incident['action_taken'].append(f"IP {key} blocked for {duration} minutes")
+                else:
+                    incident['action_taken'].append(f"IP {key} not blocked (allowlisted)")
+            print(f"✅ Action: {incident['action_taken'][-1]}")
         
-        # Action 3: Send alert (simulated)
-        if self.config['actions']['lock_account']['notify_admin']:
+        if action == 'notify' or self.config['actions'][action]['notify_admin']:
             self.send_alert(incident)
             incident['action_taken'].append("Admin notified")
-            print(f"✅ Action: Admin notification sent")
-        
-        print(f"{'='*60}\n")
-        self.incident_log.append(incident)
-    
-    def handle_mfa_brute_force(self, failed_count, threshold):
-        """Handle MFA brute force attempts"""
-        incident = {
-            'timestamp': datetime.now().isoformat(),
-            'type': 'MFA_BRUTE_FORCE',
-            'severity': 'CRITICAL',
-            'failed_attempts': int(failed_count),
-            'threshold': threshold,
-            'action_taken': []
-        }
-        
-        print(f"\n{'='*60}")
-        print(f"🚨 SECURITY INCIDENT DETECTED 🚨")
-        print(f"Type: MFA Brute Force Attack")
-        print(f"Count: {int(failed_count)} (Threshold: {threshold})")
-        print(f"Time: {incident['timestamp']}")
-        print(f"{'='*60}")
-        
-        # Action: Block source IP (simulated)
-        if self.config['actions']['block_ip']['enabled']:
-            duration = self.config['actions']['block_ip']['duration_minutes']
-            fake_ip = "203.0.113.42"  # Simulated attacker IP
-            self.block_ip(fake_ip, duration)
-            incident['action_taken'].append(f"IP {fake_ip} blocked for {duration} minutes")
-            print(f"✅ Action: IP {fake_ip} blocked for {duration} minutes")
+            print(f"✅ Action: Admin notification queued")
         
         self.log_incident(incident)
-        
-        if self.config['actions']['block_ip']['notify_admin']:
-            self.send_alert(incident)
-            incident['action_taken'].append("Admin notified")
-            print(f"✅ Action: Admin notification sent")
-        
+        suppress = rule.suppress_minutes * 60 if rule.suppress_minutes is not None else None
+        self.dedupe.open(fingerprint, incident, now, suppress)
         print(f"{'='*60}\n")
-        self.incident_log.append(incident)
+    
+    def response(self, rule, group):
+        """The rule's own action when this group is what it acts on, else just notify"""
+        # lock_account needs a username and block_ip an address: a failed-login
+        # rule crossing on an IP window (one address, many accounts) only notifies
+        if ACTION_SUBJECT.get(rule.action) == group:
+            return rule.action
+        return 'notify'
+    
+    def extend_action(self, action, key):
+        """Re-apply a lock/block for an ongoing attack once half of it has run out"""
+        if action == 'notify' or not self.config['actions'][action]['enabled']:
+            return
+        duration = self.config['actions'][action]['duration_minutes']
+        kind = 'account' if action == 'lock_account' else 'ip'
+        until = self.blocks.until(kind, key)
+        if until is not None and until - self.clock() > duration * 60 / 2:
+            return
+        if kind == 'account':
+            self.lock_account(key, duration)
+        else:
+            self.block_ip(key, duration)
+    
+    def close_quiet_incidents(self, now, all_open=False):
+        """Record the final count of incidents whose repeats have stopped (or all, on shutdown)"""
+        for entry in self.dedupe.expire(float('inf') if all_open else now):
+            if entry.occurrences == 1:
+                continue
+            first = entry.incident
+            incident = dict(
+                first,
+                timestamp=datetime.fromtimestamp(now).isoformat(),
+                status='closed',
+                occurrences=entry.occurrences,
+                first_seen=first['timestamp'],
+                last_seen=datetime.fromtimestamp(entry.last_seen).isoformat(),
+                action_taken=[f"{entry.occurrences - 1} repeat detections folded into this incident"]
+            )
+            print(f"✅ Incident {entry.incident['fingerprint']} closed after {entry.occurrences} detections")
+            self.log_incident(incident)
+            if "Admin notified" in first['action_taken']:
+                self.send_alert(incident)
     
     def lock_account(self, username, duration_minutes):
         """Lock a user account (simulated - in production, update database)"""
-        unlock_time = datetime.now() + timedelta(minutes=duration_minutes)
-        self.locked_accounts[username] = unlock_time
+        unlock_time = datetime.fromtimestamp(self.clock()) + timedelta(minutes=duration_minutes)
+        self.blocks.add('account', username, unlock_time.timestamp())
         
         # In production, this would:
         # - Update database: UPDATE users SET locked=true WHERE username=?
@@ -160,39 +182,34 @@ class IncidentResponder:
         print(f"   → Account '{username}' locked until {unlock_time.strftime('%Y-%m-%d %H:%M:%S')}")
     
     def block_ip(self, ip_address, duration_minutes):
-        """Block an IP address (simulated - in production, update WAF)"""
-        unblock_time = datetime.now() + timedelta(minutes=duration_minutes)
-        self.blocked_ips.add((ip_address, unblock_time))
+        """Block an IP address (simulated - in production, update WAF); False if it is allowlisted"""
+        if self.blocks.allowlisted(ip_address):
+            print(f"   → IP {ip_address} not blocked: private or proxy address (allowlisted)")
+            return False
+        unblock_time = datetime.fromtimestamp(self.clock()) + timedelta(minutes=duration_minutes)
+        self.blocks.add('ip', ip_address, unblock_time.timestamp())
         
         # In production, this would:
         # - Add IP to WAF IP set: boto3.client('wafv2').update_ip_set()
         # - Add iptables rule: subprocess.run(['iptables', '-A', 'INPUT', '-s', ip, '-j', 'DROP'])
         print(f"   → IP {ip_address} blocked until {unblock_time.strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        # Simulated WAF update
-        with open('blocked_ips.log', 'a') as f:
-            f.write(f"{datetime.now().isoformat()}|{ip_address}|{unblock_time.isoformat()}\n")
+        return True
     
     def log_incident(self, incident):
-        """Log incident to file"""
-        with open('incidents.log', 'a') as f:
-            f.write(json.dumps(incident) + '\n')
+        """Record incident in the store (written out in batches by the run loop)"""
+        self.incidents.append(incident)
     
     def send_alert(self, incident):
-        """Send alert notification (simulated)"""
-        alert_file = f"alert_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-        
-        with open(alert_file, 'w') as f:
-            f.write(f"SECURITY ALERT - {incident['type']}\n")
-            f.write(f"="*60 + "\n")
-            f.write(f"Timestamp: {incident['timestamp']}\n")
-            f.write(f"Severity: {incident['severity']}\n")
-            f.write(f"Details: {json.dumps(incident, indent=2)}\n")
-            f.write(f"\nActions Taken:\n")
-            for action in incident['action_taken']:
-                f.write(f"  - {action}\n")
-        
-        print(f"   → Alert written to {alert_file}")
+        """Queue an alert for the next notification digest"""
+        self.notifier.submit(incident)
+    
+    def send_digest(self, incidents):
+        """Send one notification for a batch of incidents (simulated; runs on the notifier thread)"""
+        critical = sum(1 for i in incidents if i['severity'] == 'CRITICAL')
+        print(f"   → SECURITY ALERT digest: {len(incidents)} incident(s), {critical} critical")
+        for incident in incidents[:10]:
+            repeats = f" x{incident['occurrences']}" if incident.get('occurrences', 1) > 1 else ""
+            print(f"     - {incident['type']} ({incident['severity']}) at {incident['timestamp']}{repeats}")
         
         # In production, this would:
         # - Send SNS notification: sns.publish(TopicArn=..., Message=...)
@@ -200,42 +217,66 @@ class IncidentResponder:
         # - Post to Slack webhook
     
     def cleanup_expired_blocks(self):
-        """Remove expired IP blocks and account locks"""
-        now = datetime.now()
-        
-        # Cleanup expired IP blocks
-        expired_ips = [ip for ip, unblock_time in self.blocked_ips if now >= unblock_time]
-        for ip_data in expired_ips:
-            self.blocked_ips.remove(ip_data)
-            print(f"✅ IP {ip_data[0]} unblocked (timer expired)")
-        
-        # Cleanup expired account locks
-        expired_accounts = [user for user, unlock_time in self.locked_accounts.items() if now >= unlock_time]
-        for user in expired_accounts:
-            del self.locked_accounts[user]
-            print(f"✅ Account '{user}' unlocked (timer expired)")
+        """Release IP blocks and account locks whose timer has expired"""
+        released = self.blocks.expire(self.clock())
+        for kind, key in released[:MAX_RELEASES_PRINTED]:
+            if kind == 'ip':
+                print(f"✅ IP {key} unblocked (timer expired)")
+            else:
+                print(f"✅ Account '{key}' unlocked (timer expired)")
+        if len(released) > MAX_RELEASES_PRINTED:
+            print(f"✅ {len(released) - MAX_RELEASES_PRINTED} more blocks released (timer expired)")
     
     def get_status(self):
         """Get current incident response status"""
+        incidents = self.incidents.summary()
         return {
-            'blocked_ips': len(self.blocked_ips),
-            'locked_accounts': len(self.locked_accounts),
-            'total_incidents': len(self.incident_log),
+            'blocked_ips': self.blocks.count('ip'),
+            'locked_accounts': self.blocks.count('account'),
+            'total_incidents': incidents['total'],
+            'incidents_by_severity': incidents['by_severity'],
             'last_check': datetime.now().isoformat()
         }
     
     def run(self, interval_seconds=30):
-        """Main monitoring loop"""
-        print(f"\n🛡️  Starting Incident Response Monitor (checking every {interval_seconds}s)\n")
+        """Main monitoring loop: auth events are handled on arrival, housekeeping every interval"""
+        print(f"\n🛡️  Starting Incident Response Monitor (events on {AUTH_EVENTS_SOCKET}, "
+              f"housekeeping every {interval_seconds}s)\n")
         
+        start_http_server(RESPONDER_METRICS_PORT)
+        listener = AuthEventListener(AUTH_EVENTS_SOCKET)
+        record = open(AUTH_EVENTS_RECORD, 'a') if AUTH_EVENTS_RECORD else None
+        next_housekeeping = time.monotonic() + interval_seconds
         while True:
             try:
-                # Check for incidents
-                self.check_failed_logins()
-                self.check_mfa_brute_force()
+                # Check for incidents as soon as events arrive, waking for the next release
+                timeout = min(next_housekeeping - time.monotonic(), self.engine.next_wakeup())
+                next_expiry = self.blocks.next_expiry()
+                if next_expiry is not None:
+                    timeout = min(timeout, next_expiry - self.clock())
+                events = listener.poll(max(0, timeout))
+                for event in events:
+                    self.engine.observe(event)
+                if record is not None:
+                    record.writelines(json.dumps(event) + '\n' for event in events)
+                
+                # Start due Prometheus batches, collect finished ones
+                self.engine.tick()
                 
-                # Cleanup expired blocks
+                # Release expired blocks as they fall due and persist new ones
                 self.cleanup_expired_blocks()
+                self.close_quiet_incidents(self.clock())
+                self.blocks.flush()
+                self.incidents.flush()
+                if record is not None:
+                    record.flush()
+                
+                if time.monotonic() < next_housekeeping:
+                    continue
+                next_housekeeping = time.monotonic() + interval_seconds
+                
+                # Drop expired records from the journal once it has grown
+                self.blocks.maybe_compact()
                 
                 # Status update
                 status = self.get_status()
@@ -244,15 +285,21 @@ class IncidentResponder:
                       f"{status['blocked_ips']} IPs blocked | "
                       f"{status['locked_accounts']} accounts locked")
                 
-                time.sleep(interval_seconds)
-                
             except KeyboardInterrupt:
                 print("\n\n🛑 Incident Responder Stopped")
-                print(f"Total incidents handled: {len(self.incident_log)}")
+                print(f"Total incidents recorded: {self.incidents.summary()['total']}")
+                listener.close()
+                self.engine.close()
+                self.close_quiet_incidents(self.clock(), all_open=True)
+                self.notifier.close()
+                self.blocks.close()
+                self.incidents.close()
+                if record is not None:
+                    record.close()
                 break
             except Exception as e:
                 print(f"Error in monitoring loop: {e}")
-                time.sleep(interval_seconds)
+                time.sleep(1)
 
 if __name__ == "__main__":
     # Install required package if needed
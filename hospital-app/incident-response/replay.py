@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Replay and backtesting for alert_rules.yml
+Runs recorded traffic through IncidentResponder's detection, dedupe and block
+logic at virtual time: the responder's clock is set to each event's timestamp,
+so hours of traffic replay in seconds, and nothing is notified, blocked or
+written outside a scratch directory, removed on exit. Inputs (any combination):
+  --events FILE      auth events as the app publishes them; record live ones
+                     by running the responder with AUTH_EVENTS_RECORD=FILE
+  --audit FILE       the app's JSON-lines audit log, replayed as phi_access
+                     events. No shipped rule reads those (they are PHI reads,
+                     not logins, and carry no IP), so the rules file must
+                     have an `event: phi_access` rule grouped by username, or
+                     --audit is refused
+  --prometheus FILE  /api/v1/query_range output of the batched rule query
+                     (--print-query prints it), evaluated every interval_seconds
+  --synthetic N      a generated credential-stuffing wave of N auth events
+
+Reports every incident that would have fired and how long each attack ran
+before detection, plus replay throughput, so it doubles as a detector
+benchmark:
+    python3 replay.py --synthetic 1000000
+    python3 replay.py --events events.jsonl --rules candidate_rules.yml --json
+"""
+import argparse
+import contextlib
+import io
+import ipaddress
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from incident_responder import IncidentResponder
+from rule_engine import series_key
+
+# A sample older than this is not part of the instant vector (Prometheus' lookback)
+STALENESS_SECONDS = 300
+# Release expired blocks and close quiet incidents every this many events
+HOUSEKEEPING_EVENTS = 1024
+
+
+class VirtualClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ReplayResponder(IncidentResponder):
+    """IncidentResponder that collects incidents instead of storing and sending them"""
+
+    def __init__(self, config_file: str, clock: VirtualClock, scratch: str):
+        super().__init__(config_file=config_file, clock=clock,
+                         blocklist_journal=os.path.join(scratch, "blocklist.journal"),
+                         incidents_dir=os.path.join(scratch, "incidents"))
+        self.fired = []
+        self.alerts = 0
+        self.series_started = {}  # (rule, series key) -> first sample of the current crossing
+
+    def handle_detection(self, rule, group, key, details):
+        if group == "series":
+            details = dict(details, first_ts=self.series_started.get((rule.name, key), self.clock()))
+        super().handle_detection(rule, group, key, details)
+
+    def log_incident(self, incident):
+        self.fired.append(incident)
+
+    def send_alert(self, incident):
+        self.alerts += 1
+
+
+def read_events(path: str):
+    with open(path) as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict) and "type" in event and "ts" in event:
+                yield event
+
+
+def read_audit(path: str):
+    """app/audit.py records ({"ts": UTC ISO time, "user", "role", "endpoint", "patient"}) as events"""
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                ts = datetime.fromisoformat(record["ts"]).replace(tzinfo=timezone.utc).timestamp()
+            except (ValueError, KeyError, TypeError):
+                continue
+            yield {"type": "phi_access", "username": record.get("user"), "ip": record.get("ip"), "ts": ts,
+                   "role": record.get("role"), "endpoint": record.get("endpoint"),
+                   "patient": record.get("patient")}
+
+
+def synthetic_events(count: int, rate: float = 200.0, seed: int = 1):
+    """Normal logins plus a credential-stuffing wave from rotating proxy IPs, `rate` events/s"""
+    rng = random.Random(seed)
+    start = time.time() - count / rate
+    for i in range(count):
+        ts = start + i / rate
+        if rng.random() < 0.2:
+            user = rng.randrange(500)
+            yield {"type": "login_success", "username": f"user{user}", "ts": ts,
+                   "ip": f"10.0.{user >> 8}.{user & 255}", "state": "NY"}
+        else:
+            yield {"type": "login_failed", "username": f"victim{rng.randrange(20000)}", "ts": ts,
+                   "ip": f"198.51.{rng.randrange(200)}.{rng.randrange(256)}", "state": "NY"}
+
+
+def read_series(path: str):
+    """(metric labels, [(t, value), ...]) for each series of a query_range export"""
+    with open(path) as f:
+        body = json.load(f)
+    result = body.get("data", body).get("result", [])
+    return [(item["metric"], [(float(t), float(v)) for t, v in item["values"]]) for item in result]
+
+
+class SeriesReplay:
+    """Instant vectors of exported series at each evaluation time"""
+
+    def __init__(self, responder: ReplayResponder, series):
+        self.responder = responder
+        self.thresholds = {r.name: r.threshold for r in responder.engine.prometheus_rules}
+        self.series = [(labels, samples, 0) for labels, samples in series
+                       if labels.get("alert_rule") in self.thresholds]
+        self.evaluations = 0
+
+    def span(self):
+        times = [samples[i][0] for _, samples, _ in self.series for i in (0, -1) if samples]
+        return (min(times), max(times)) if times else None
+
+    def evaluate(self, at: float):
+        vector = []
+        for i, (labels, samples, pos) in enumerate(self.series):
+            rule = labels["alert_rule"]
+            key = (rule, series_key(labels))
+            # advance past samples up to `at`, tracking when the current crossing began
+            while pos < len(samples) and samples[pos][0] <= at:
+                t, value = samples[pos]
+                if value >= self.thresholds[rule]:
+                    self.responder.series_started.setdefault(key, t)
+                else:
+                    self.responder.series_started.pop(key, None)
+                pos += 1
+            self.series[i] = (labels, samples, pos)
+            if pos and at - samples[pos - 1][0] <= STALENESS_SECONDS:
+                vector.append({"metric": labels, "value": [at, str(samples[pos - 1][1])]})
+        self.evaluations += 1
+        self.responder.engine.evaluate_series(self.responder.engine.prometheus_rules, vector)
+
+
+def is_address(ip: str) -> bool:
+    """Whether the app's blocklist can match this client, as it can only match real addresses"""
+    try:
+        ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return True
+
+
+def replay(responder: ReplayResponder, clock: VirtualClock, events, series=None, enforce=True):
+    stats = Counter()
+    ticks = []
+    span = series.span() if series else None
+    if span:
+        interval = responder.engine.interval
+        ticks = [span[0] + i * interval for i in range(int((span[1] - span[0]) // interval) + 1)]
+    tick = 0
+    engine, blocks = responder.engine, responder.blocks
+    for event in events:
+        ts = event["ts"]
+        while tick < len(ticks) and ticks[tick] <= ts:
+            clock.now = ticks[tick]
+            series.evaluate(clock.now)
+            tick += 1
+        clock.now = ts
+        stats["events"] += 1
+        if stats["events"] % HOUSEKEEPING_EVENTS == 0:
+            responder.cleanup_expired_blocks()
+            responder.close_quiet_incidents(ts)
+        ip = event.get("ip")
+        if enforce and ip and (blocks.until("ip", ip) or 0) > ts and is_address(ip):
+            # the app would have answered 403 (BlocklistMiddleware); nothing reaches the detector
+            stats["blocked"] += 1
+            continue
+        engine.observe(event)
+    for at in ticks[tick:]:
+        clock.now = at
+        series.evaluate(at)
+    responder.close_quiet_incidents(clock.now, all_open=True)
+    return stats
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def report(responder: ReplayResponder, stats: Counter, wall: float, virtual: float, series):
+    new = [i for i in responder.fired if i.get("status") != "closed"]
+    closed = [i for i in responder.fired if i.get("status") == "closed"]
+    by_type = defaultdict(list)
+    for incident in new:
+        by_type[incident["type"]].append(incident.get("time_to_detect_s", 0.0))
+    repeats = sum(i["occurrences"] - 1 for i in closed)
+
+    print("=" * 60)
+    print(f"Replayed {stats['events']:,} events ({virtual / 3600:.1f} h of virtual time) in {wall:.2f} s: "
+          f"{stats['events'] / wall if wall else 0:,.0f} events/s")
+    if stats["blocked"]:
+        print(f"{stats['blocked']:,} events came from IPs blocked at the time and were skipped")
+    if series is not None:
+        print(f"{series.evaluations:,} Prometheus evaluations of {len(series.thresholds)} rules")
+    print(f"Incidents that would have fired: {len(new)}  "
+          f"(repeats folded: {repeats}, admin notifications: {responder.alerts})")
+    if by_type:
+        print(f"  {'type':<28}{'count':>7}   time to detect p50 / p95 / max (s)")
+        for incident_type, delays in sorted(by_type.items()):
+            print(f"  {incident_type:<28}{len(delays):>7}   {percentile(delays, 0.5):.1f} / "
+                  f"{percentile(delays, 0.95):.1f} / {max(delays):.1f}")
+    for incident in new[:20]:
+        key = next((f"{k}={incident[k]}" for k in ("username", "ip", "series") if k in incident), "")
+        print(f"  {incident['timestamp']}  {incident['type']:<26} {key}  "
+              f"after {incident.get('time_to_detect_s', 0.0)} s")
+    if len(new) > 20:
+        print(f"  ... {len(new) - 20} more (--json for all)")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rules", default="alert_rules.yml", help="rules file to backtest")
+    parser.add_argument("--events", action="append", default=[], help="recorded auth events (JSON lines)")
+    parser.add_argument("--audit", action="append", default=[],
+                        help="audit log to replay as phi_access events (needs a rule on them)")
+    parser.add_argument("--prometheus", help="query_range export of the batched rule query")
+    parser.add_argument("--synthetic", type=int, default=0, help="generate N credential-stuffing events")
+    parser.add_argument("--no-enforce", action="store_true",
+                        help="keep events from IPs the replay has blocked")
+    parser.add_argument("--print-query", action="store_true", help="print the query to export and exit")
+    parser.add_argument("--json", action="store_true", help="print every incident as JSON instead")
+    parser.add_argument("--verbose", action="store_true", help="show the responder's own output")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="replay-") as scratch:
+        run(parser, args, scratch)
+
+
+def run(parser, args, scratch: str):
+    clock = VirtualClock()
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        responder = ReplayResponder(args.rules, clock, scratch)
+    try:
+        backtest(parser, args, responder, clock, quiet)
+    finally:
+        responder.blocks.close()
+        responder.incidents.close()
+
+
+def backtest(parser, args, responder: ReplayResponder, clock: VirtualClock, quiet):
+    if args.print_query:
+        print(" or ".join(r.tagged_query() for r in responder.engine.prometheus_rules))
+        print("export with: curl -G <prometheus>/api/v1/query_range --data-urlencode query=... "
+              "-d start=... -d end=... -d step=15s > series.json")
+        return
+    if args.audit and "phi_access" not in responder.engine.detector.rules_by_event:
+        parser.error(f"--audit replays phi_access events and no rule in {args.rules} reads them; "
+                     f"add one with event: phi_access and group_by: [username]")
+
+    events = []
+    for path in args.events:
+        events.extend(read_events(path))
+    for path in args.audit:
+        events.extend(read_audit(path))
+    events.extend(synthetic_events(args.synthetic))
+    # several app workers publish to the responder, so a recording is only roughly ordered
+    events.sort(key=lambda e: e["ts"])
+    series = SeriesReplay(responder, read_series(args.prometheus)) if args.prometheus else None
+    if not events and series is None:
+        parser.error("nothing to replay: give --events, --audit, --prometheus or --synthetic")
+
+    times = [events[0]["ts"], events[-1]["ts"]] if events else []
+    if series is not None and series.span():
+        times.extend(series.span())
+    clock.now = min(times)
+    start = time.perf_counter()
+    with quiet:
+        stats = replay(responder, clock, events, series, enforce=not args.no_enforce)
+    wall = time.perf_counter() - start
+    responder.notifier.close()
+
+    if args.json:
+        json.dump({"events": stats["events"], "blocked": stats["blocked"], "seconds": wall,
+                   "incidents": responder.fired}, sys.stdout, indent=2)
+        print()
+    else:
+        report(responder, stats, wall, max(times) - min(times), series)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Rule engine for alert_rules.yml
+Every rule under `alerts` is compiled by its shape:
+  event + threshold   -> sliding-window rule fed by app auth events (detector.py)
+  allowed_states      -> geo rule checked on every auth event that carries a state;
+                         ALLOWED_STATES (the deployment's allowed_states tfvar)
+                         overrides the list, and an empty list disables the rule
+  query + threshold   -> Prometheus rule, evaluated every interval_seconds
+
+Prometheus rules (whose query must return an instant vector) are merged into
+one query per cycle, each tagged with an alert_rule label so the result can be
+split back out. Queries run concurrently on a keep-alive session. A batch that
+errors or misses its deadline is split so its rules are timed individually,
+and a rule stays isolated until it has been fast for a few cycles, so one slow
+query cannot hold up the rest.
+"""
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from prometheus_client import Counter, Gauge, Histogram
+
+from detector import BruteForceDetector
+
+DEFAULT_INTERVAL_SECONDS = 30
+DEFAULT_DEADLINE_SECONDS = 5
+REJOIN_CYCLES = 3
+# The group each action applies to; notify has none and applies to every group
+ACTION_SUBJECT = {"lock_account": "username", "block_ip": "ip"}
+# Comma-separated states this deployment serves, e.g. "CA"; set from allowed_states in <region>.tfvars
+ALLOWED_STATES = os.getenv("ALLOWED_STATES")
+
+rule_eval_seconds = Histogram('incident_rule_eval_seconds', 'Time to evaluate a Prometheus rule', ['rule'])
+rule_errors = Counter('incident_rule_errors', 'Failed or timed-out rule evaluations', ['rule'])
+rule_isolated = Gauge('incident_rule_isolated', 'Rule evaluated outside the shared batch', ['rule'])
+rule_incidents = Counter('incident_rule_incidents', 'Incidents raised per rule', ['rule'])
+prometheus_queries = Counter('incident_prometheus_queries', 'Queries sent to Prometheus')
+
+
+def check_action(rule, groups):
+    """A rule's action must be known and have a group to act on, or it would silently do nothing"""
+    if rule.action == "notify":
+        return
+    subject = ACTION_SUBJECT.get(rule.action)
+    if subject is None:
+        raise ValueError(f"Rule {rule.name}: unknown action {rule.action!r}")
+    if subject not in groups:
+        raise ValueError(f"Rule {rule.name}: action {rule.action} needs a {subject} group, has {sorted(groups)}")
+
+
+def series_key(labels: dict) -> str:
+    """Incident key of a series: its labels other than alert_rule"""
+    return ",".join(f"{k}={v}" for k, v in sorted(labels.items()) if k != "alert_rule") or "all"
+
+
+def allowed_states(config: dict, override=None) -> set:
+    """States a geo rule accepts: the deployment's ALLOWED_STATES if set, else the rule's list"""
+    states = override.split(",") if override is not None else config["allowed_states"]
+    return {s.strip().upper() for s in states if s.strip()}
+
+
+class GeoRule:
+    """Auth events from a state outside allowed_states, once per IP per window"""
+
+    def __init__(self, name: str, config: dict, allowed: set):
+        self.name = name
+        self.title = config.get("name", name)
+        self.type = config.get("type", name.upper())
+        self.severity = config.get("severity", "high").upper()
+        self.allowed = allowed
+        self.action = config.get("action", "notify")
+        self.events = set(config.get("events", ["login_success", "login_failed", "mfa_success", "mfa_failed"]))
+        self.threshold = 1
+        self.suppress_minutes = config.get("suppress_minutes")
+        self.window_minutes = config.get("window_minutes", 60)
+        self._reported = OrderedDict()  # ip -> time of last incident
+
+    def check(self, event: dict) -> bool:
+        state = event.get("state")
+        ip = event.get("ip")
+        if event.get("type") not in self.events or not state or not ip or state.upper() in self.allowed:
+            return False
+        now = event["ts"]
+        last = self._reported.get(ip)
+        if last is not None and now - last < self.window_minutes * 60:
+            return False
+        self._reported[ip] = now
+        self._reported.move_to_end(ip)
+        while self._reported and now - next(iter(self._reported.values())) >= self.window_minutes * 60:
+            self._reported.popitem(last=False)
+        return True
+
+
+class PrometheusRule:
+    def __init__(self, name: str, config: dict):
+        self.name = name
+        self.title = config.get("name", name)
+        self.type = config.get("type", name.upper())
+        self.severity = config.get("severity", "high").upper()
+        self.query = config["query"]
+        self.threshold = config["threshold"]
+        self.window_minutes = config.get("window_minutes")
+        self.action = "notify"  # a series has no username or IP to act on
+        self.fast_cycles = 0
+        self.suppress_minutes = config.get("suppress_minutes")
+
+    def tagged_query(self) -> str:
+        return f'label_replace(({self.query}), "alert_rule", "{self.name}", "", "")'
+
+
+class Evaluation:
+    """One in-flight Prometheus query covering one or more rules"""
+
+    def __init__(self, rules, future, deadline):
+        self.rules = rules
+        self.future = future
+        self.started = time.monotonic()
+        self.deadline = self.started + deadline
+
+
+class RuleEngine:
+    def __init__(self, config: dict, prometheus_url: str, on_incident, workers: int = 4):
+        """on_incident(rule, group, key, details) runs on the caller's thread"""
+        self.prometheus_url = prometheus_url
+        self.on_incident = on_incident
+        engine = config.get("engine", {})
+        self.interval = engine.get("interval_seconds", DEFAULT_INTERVAL_SECONDS)
+        self.deadline = engine.get("deadline_seconds", DEFAULT_DEADLINE_SECONDS)
+
+        alerts = config.get("alerts", {})
+        self.detector = BruteForceDetector(alerts, on_incident)
+        self.geo_rules = []
+        for n, c in alerts.items():
+            if "allowed_states" not in c:
+                continue
+            allowed = allowed_states(c, ALLOWED_STATES)
+            if allowed:
+                self.geo_rules.append(GeoRule(n, c, allowed))
+            else:
+                # a list that does not match the deployment would block its own staff
+                print(f"Geo rule {n} disabled: no allowed states (set ALLOWED_STATES)")
+        self.prometheus_rules = [PrometheusRule(n, c) for n, c in alerts.items() if "query" in c]
+        for rules in self.detector.rules_by_event.values():
+            for rule in rules:
+                check_action(rule, rule.windows)
+        for rule in self.geo_rules:
+            check_action(rule, ("ip",))
+        self.isolated = set()
+
+        # one pooled keep-alive session shared by every query
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rule")
+        self.inflight = []
+        self.next_cycle = time.monotonic()
+
+    def observe(self, event: dict):
+        """Feed one auth event to the event and geo rules"""
+        self.detector.observe(event)
+        for rule in self.geo_rules:
+            if rule.check(event):
+                self.on_incident(rule, "ip", event["ip"], event)
+
+    def next_wakeup(self) -> float:
+        """Seconds until tick() has work: the next cycle or an in-flight deadline"""
+        if not self.prometheus_rules:
+            return float("inf")
+        times = [self.next_cycle] + [e.deadline for e in self.inflight]
+        return max(0.0, min(times) - time.monotonic())
+
+    def tick(self):
+        """Start a cycle if one is due and handle any finished or overdue queries"""
+        now = time.monotonic()
+        if self.prometheus_rules and now >= self.next_cycle and not self.inflight:
+            self.next_cycle = now + self.interval
+            self._start_cycle()
+        still_running = []
+        for evaluation in self.inflight:
+            if evaluation.future.done():
+                self._finish(evaluation)
+            elif time.monotonic() >= evaluation.deadline:
+                self._fail(evaluation, "deadline exceeded")
+            else:
+                still_running.append(evaluation)
+        self.inflight = still_running
+
+    def _start_cycle(self):
+        batched = [r for r in self.prometheus_rules if r.name not in self.isolated]
+        groups = [[r] for r in self.prometheus_rules if r.name in self.isolated]
+        if batched:
+            groups.append(batched)
+        for rules in groups:
+            query = " or ".join(r.tagged_query() for r in rules)
+            future = self.pool.submit(self._query, query)
+            self.inflight.append(Evaluation(rules, future, self.deadline))
+
+    def _query(self, query: str):
+        prometheus_queries.inc()
+        response = self.session.get(f"{self.prometheus_url}/api/v1/query",
+                                    params={"query": query}, timeout=self.deadline)
+        response.raise_for_status()
+        body = response.json()
+        if body.get("status") != "success":
+            raise ValueError(body.get("error", "query failed"))
+        return body["data"]["result"]
+
+    def _finish(self, evaluation: Evaluation):
+        try:
+            series = evaluation.future.result()
+        except Exception as e:
+            self._fail(evaluation, str(e))
+            return
+        elapsed = time.monotonic() - evaluation.started
+        for rule in evaluation.rules:
+            rule_eval_seconds.labels(rule=rule.name).observe(elapsed)
+            if rule.name in self.isolated:
+                rule.fast_cycles = rule.fast_cycles + 1 if elapsed < self.deadline / 2 else 0
+                if rule.fast_cycles >= REJOIN_CYCLES:
+                    self.isolated.discard(rule.name)
+                    rule_isolated.labels(rule=rule.name).set(0)
+        self.evaluate_series(evaluation.rules, series)
+
+    def evaluate_series(self, rules, series):
+        """Raise an incident for every series of `rules` at or above its threshold"""
+        by_rule = {r.name: r for r in rules}
+        for item in series:
+            labels = dict(item["metric"])
+            rule = by_rule.get(labels.pop("alert_rule", None))
+            if rule is None:
+                continue
+            value = float(item["value"][1])
+            if value >= rule.threshold:
+                rule_incidents.labels(rule=rule.name).inc()
+                key = series_key(labels)
+                self.on_incident(rule, "series", key, {"value": value, "labels": labels})
+
+    def _fail(self, evaluation: Evaluation, reason: str):
+        for rule in evaluation.rules:
+            rule_errors.labels(rule=rule.name).inc()
+            rule_eval_seconds.labels(rule=rule.name).observe(time.monotonic() - evaluation.started)
+            # time each rule on its own next cycle to find the slow one
+            self.isolated.add(rule.name)
+            rule_isolated.labels(rule=rule.name).set(1)
+            rule.fast_cycles = 0
+        print(f"Rule evaluation failed ({', '.join(r.name for r in evaluation.rules)}): {reason}")
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,361 @@
+"""
+Rotating, indexed incident store
+The incident responder appends incidents in batches to numbered segment
+files in INCIDENTS_DIR (incidents-00000001.jsonl, ...). A segment is sealed
+once it reaches INCIDENT_SEGMENT_MAX_BYTES or INCIDENT_SEGMENT_MAX_AGE_SECONDS,
+its index is written beside it (.idx). Every segment is kept by default; with
+INCIDENT_SEGMENTS_KEPT set, older segments are moved to INCIDENTS_ARCHIVE_DIR
+(out of the query path, never deleted). On first start an existing
+incidents.log from the old responder is imported as the first segment.
+
+Each segment's index holds the time, type, severity and byte offset of every
+record, with postings per type and severity, so queries for the latest
+incidents, incidents since a time, or by type/severity read only the records
+they return, and counts come from per-segment totals. The responder
+(IncidentStore) and the app (IncidentReader) both query through
+IncidentIndex; the app loads sealed indexes once and tails the open segment.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from array import array
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+INCIDENTS_DIR = os.getenv("INCIDENTS_DIR", "incidents")
+INCIDENT_SEGMENT_MAX_BYTES = int(os.getenv("INCIDENT_SEGMENT_MAX_BYTES", str(16 * 1024 * 1024)))
+INCIDENT_SEGMENT_MAX_AGE_SECONDS = float(os.getenv("INCIDENT_SEGMENT_MAX_AGE_SECONDS", "86400"))
+# Segments left in INCIDENTS_DIR for queries; 0 keeps them all there. Older
+# ones are archived, not deleted: incidents are security records
+INCIDENT_SEGMENTS_KEPT = int(os.getenv("INCIDENT_SEGMENTS_KEPT", "0"))
+INCIDENTS_ARCHIVE_DIR = os.getenv("INCIDENTS_ARCHIVE_DIR")  # default: INCIDENTS_DIR/archive
+# The old responder's single log (beside INCIDENTS_DIR unless set), imported once
+LEGACY_INCIDENTS_LOG = os.getenv("LEGACY_INCIDENTS_LOG")
+# Appends are written out when this many are buffered, or on the next flush()
+INCIDENT_BATCH_SIZE = int(os.getenv("INCIDENT_BATCH_SIZE", "64"))
+
+SEGMENT_NAME = re.compile(r"^incidents-(\d{8})\.jsonl$")
+
+
+def segment_path(directory: str, seq: int) -> str:
+    return os.path.join(directory, f"incidents-{seq:08d}.jsonl")
+
+
+def incident_time(incident: dict) -> float:
+    try:
+        return datetime.fromisoformat(incident["timestamp"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
+
+class Segment:
+    """Index of one segment file: per-record time, type, severity and offset"""
+
+    def __init__(self, path: str, seq: int):
+        self.path = path
+        self.seq = seq
+        self.ts = array("d")
+        self.offsets = array("Q")
+        self.end = 0  # bytes of the file covered by the index
+        self.first_ts = self.last_ts = 0.0
+        self.by_type = {}  # type -> array of record positions
+        self.by_severity = {}
+
+    def __len__(self):
+        return len(self.ts)
+
+    def add(self, incident: dict, offset: int, length: int):
+        ts = incident_time(incident)
+        pos = len(self.ts)
+        if not pos:
+            self.first_ts = ts
+        self.last_ts = max(self.last_ts, ts)
+        self.ts.append(ts)
+        self.offsets.append(offset)
+        self.by_type.setdefault(str(incident.get("type")), array("I")).append(pos)
+        self.by_severity.setdefault(str(incident.get("severity")), array("I")).append(pos)
+        self.end = offset + length
+
+    def scan(self, f):
+        """Index complete lines from self.end onward; a trailing partial line is left for later"""
+        f.seek(self.end)
+        chunk = f.read()
+        offset = self.end
+        for line in chunk.split(b"\n")[:-1]:
+            length = len(line) + 1
+            try:
+                self.add(json.loads(line), offset, length)
+            except ValueError:
+                self.end = offset + length  # torn line from a crash, skip it
+            offset += length
+
+    def record_length(self, pos: int) -> int:
+        following = self.offsets[pos + 1] if pos + 1 < len(self.offsets) else self.end
+        return following - self.offsets[pos]
+
+    def index_path(self) -> str:
+        return self.path[:-len(".jsonl")] + ".idx"
+
+    def write_index(self):
+        """Persist the index beside the segment, written atomically once it is sealed"""
+        types = list(self.by_type)
+        severities = list(self.by_severity)
+        type_ids = array("H", bytes(2 * len(self)))
+        severity_ids = array("H", bytes(2 * len(self)))
+        for ids, names, postings in ((type_ids, types, self.by_type),
+                                     (severity_ids, severities, self.by_severity)):
+            for i, name in enumerate(names):
+                for pos in postings[name]:
+                    ids[pos] = i
+        tmp = self.index_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"end": self.end, "ts": self.ts.tolist(), "offsets": self.offsets.tolist(),
+                       "types": types, "type_ids": type_ids.tolist(),
+                       "severities": severities, "severity_ids": severity_ids.tolist()}, f)
+        os.replace(tmp, self.index_path())
+
+    @classmethod
+    def load(cls, path: str, seq: int):
+        """Segment from its .idx if it has one, else by scanning the file"""
+        segment = cls(path, seq)
+        try:
+            with open(segment.index_path()) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            with open(path, "rb") as f:
+                segment.scan(f)
+            return segment
+        segment.ts = array("d", saved["ts"])
+        segment.offsets = array("Q", saved["offsets"])
+        segment.end = saved["end"]
+        if saved["ts"]:
+            segment.first_ts, segment.last_ts = saved["ts"][0], max(saved["ts"])
+        for postings, names, ids in ((segment.by_type, saved["types"], saved["type_ids"]),
+                                     (segment.by_severity, saved["severities"], saved["severity_ids"])):
+            for name in names:
+                postings[name] = array("I")
+            for pos, i in enumerate(ids):
+                postings[names[i]].append(pos)
+        return segment
+
+
+class IncidentIndex:
+    """Queries over a run of segments, oldest first"""
+
+    def __init__(self):
+        self.segments = []
+
+    def query(self, since: Optional[float] = None, limit: int = 10,
+              type: Optional[str] = None, severity: Optional[str] = None):
+        """Most recent `limit` incidents, oldest first, newer than `since` (epoch seconds)"""
+        found = []
+        for segment in reversed(self.segments):
+            if since is not None and segment.last_ts <= since:
+                break
+            if type is not None and severity is not None:
+                by_type = segment.by_type.get(type, ())
+                wanted = set(segment.by_severity.get(severity, ()))
+                positions = [p for p in by_type if p in wanted]
+            elif type is not None:
+                positions = segment.by_type.get(type, ())
+            elif severity is not None:
+                positions = segment.by_severity.get(severity, ())
+            else:
+                positions = range(len(segment))
+            for pos in reversed(positions):
+                if since is not None and segment.ts[pos] <= since:
+                    break
+                found.append((segment, pos))
+                if len(found) == limit:
+                    break
+            if len(found) == limit:
+                break
+        return self._fetch(found[::-1])
+
+    def _fetch(self, found):
+        incidents = []
+        handles = {}
+        try:
+            for segment, pos in found:
+                f = handles.get(segment.path)
+                if f is None:
+                    try:
+                        f = handles[segment.path] = open(segment.path, "rb")
+                    except FileNotFoundError:
+                        continue  # dropped by retention since it was indexed
+                f.seek(segment.offsets[pos])
+                # up to the newline only: a torn line skipped after the record is in its length
+                record = f.read(segment.record_length(pos)).split(b"\n", 1)[0]
+                incidents.append(json.loads(record))
+        finally:
+            for f in handles.values():
+                f.close()
+        return incidents
+
+    def summary(self):
+        """Totals by type and severity over every retained segment"""
+        by_type, by_severity = Counter(), Counter()
+        for segment in self.segments:
+            for name, positions in segment.by_type.items():
+                by_type[name] += len(positions)
+            for name, positions in segment.by_severity.items():
+                by_severity[name] += len(positions)
+        return {
+            "total": sum(len(s) for s in self.segments),
+            "by_type": dict(by_type),
+            "by_severity": dict(by_severity),
+            "first": self.segments[0].first_ts if self.segments else None,
+            "last": max((s.last_ts for s in self.segments), default=None),
+        }
+
+
+def list_segments(directory: str):
+    """[(seq, path)] of the segment files in directory, oldest first"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    found = []
+    for name in names:
+        match = SEGMENT_NAME.match(name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(found)
+
+
+class IncidentStore(IncidentIndex):
+    """The responder's writer: batched appends to the newest segment, with rotation"""
+
+    def __init__(self, directory: str = INCIDENTS_DIR, max_bytes: int = INCIDENT_SEGMENT_MAX_BYTES,
+                 max_age: float = INCIDENT_SEGMENT_MAX_AGE_SECONDS, keep: int = INCIDENT_SEGMENTS_KEPT,
+                 batch_size: int = INCIDENT_BATCH_SIZE, archive_dir: Optional[str] = INCIDENTS_ARCHIVE_DIR,
+                 legacy_log: Optional[str] = LEGACY_INCIDENTS_LOG):
+        super().__init__()
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.keep = keep
+        self.batch_size = batch_size
+        self.archive_dir = archive_dir or os.path.join(directory, "archive")
+        os.makedirs(directory, exist_ok=True)
+        if not list_segments(directory):
+            self._import_legacy(legacy_log or os.path.join(os.path.dirname(os.path.abspath(directory)),
+                                                           "incidents.log"))
+        for seq, path in list_segments(directory):
+            segment = Segment.load(path, seq)
+            if not os.path.exists(segment.index_path()):
+                segment.write_index()  # open segment from the previous run, seal it
+            self.segments.append(segment)
+        self._pending = []
+        self._open(self.segments[-1].seq + 1 if self.segments else 1)
+
+    def _import_legacy(self, log_path: str):
+        """Copy the old single incidents.log in as segment 1 (the original is left in place)"""
+        if not os.path.exists(log_path):
+            return
+        tmp = segment_path(self.directory, 1) + ".tmp"
+        shutil.copyfile(log_path, tmp)
+        with open(tmp, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")  # the last incident had no newline; keep it
+        os.replace(tmp, segment_path(self.directory, 1))
+
+    def _open(self, seq: int):
+        self.active = Segment(segment_path(self.directory, seq), seq)
+        self.segments.append(self.active)
+        self._file = open(self.active.path, "ab")
+        self._opened = time.monotonic()
+        self._drop_old()
+
+    def _drop_old(self):
+        """Move all but the newest `keep` segments to the archive"""
+        while self.keep and len(self.segments) > self.keep:
+            old = self.segments.pop(0)
+            os.makedirs(self.archive_dir, exist_ok=True)
+            for path in (old.index_path(), old.path):
+                try:
+                    shutil.move(path, os.path.join(self.archive_dir, os.path.basename(path)))
+                except FileNotFoundError:
+                    pass
+
+    def append(self, incident: dict):
+        self._pending.append(incident)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered incidents in one call, then rotate if the segment is full or old"""
+        if self._pending:
+            lines = [json.dumps(incident).encode() + b"\n" for incident in self._pending]
+            offset = self.active.end
+            self._file.write(b"".join(lines))
+            self._file.flush()
+            for incident, line in zip(self._pending, lines):
+                self.active.add(incident, offset, len(line))
+                offset += len(line)
+            self._pending = []
+        if len(self.active) and (self.active.end >= self.max_bytes
+                                 or time.monotonic() - self._opened >= self.max_age):
+            self.rotate()
+
+    def rotate(self):
+        self._file.close()
+        self.active.write_index()
+        self._open(self.active.seq + 1)
+
+    def query(self, *args, **kwargs):
+        self.flush()
+        return super().query(*args, **kwargs)
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+class IncidentReader:
+    """The app's view of the responder's store, refreshed incrementally on each call"""
+
+    def __init__(self, directory: str = INCIDENTS_DIR):
+        self.directory = directory
+        self.index = IncidentIndex()
+        self._sealed = set()  # seqs whose .idx has been loaded
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        on_disk = list_segments(self.directory)
+        present = {seq for seq, _ in on_disk}
+        known = {s.seq: s for s in self.index.segments if s.seq in present}
+        segments = []
+        for seq, path in on_disk:
+            segment = known.get(seq)
+            if segment is None or (seq not in self._sealed and os.path.exists(path[:-len(".jsonl")] + ".idx")):
+                # new to us, or sealed since we last tailed it
+                segment = Segment.load(path, seq)
+            elif seq not in self._sealed and os.path.getsize(path) > segment.end:
+                with open(path, "rb") as f:
+                    segment.scan(f)
+            if os.path.exists(segment.index_path()):
+                self._sealed.add(seq)
+            segments.append(segment)
+        self._sealed &= present
+        self.index.segments = segments
+
+    def read(self, since: Optional[str] = None, limit: int = 10,
+             type: Optional[str] = None, severity: Optional[str] = None):
+        """Most recent `limit` incidents, oldest first, newer than `since` (ISO time) if given"""
+        since_ts = incident_time({"timestamp": since}) if since else None
+        with self._lock:
+            self._refresh()
+            return self.index.query(since_ts, limit, type, severity)
+
+    def summary(self):
+        with self._lock:
+            self._refresh()
+            return self.index.summary()
@@ -0,0 +1,115 @@
+"""
+Bulk and streaming ingestion for clinical writes
+Batch endpoints accept either a JSON array (application/json) or a stream of
+newline-delimited JSON records (application/x-ndjson). Records are validated
+one by one and applied in chunks: each chunk is written to storage in a single
+transaction and its audit entries are enqueued together. The response carries
+one result per input record, in input order.
+
+At most INGEST_MAX_RECORDS records are taken per request. A JSON array over
+the limit is refused with 413 before anything is applied. An NDJSON stream is
+applied as it arrives, so one over the limit is cut off instead: the records
+before the cut-off are applied and reported, and truncated_at is the index of
+the first record that was not read, for the client to resend from.
+"""
+import json
+import os
+from contextlib import aclosing
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "500"))
+INGEST_MAX_RECORDS = int(os.getenv("INGEST_MAX_RECORDS", "100000"))
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class InvalidRecord:
+    def __init__(self, reason):
+        self.reason = reason
+
+
+async def iter_records(request: Request, max_records: int = INGEST_MAX_RECORDS):
+    """Yield (index, raw record) pairs from a JSON array or an NDJSON stream"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_TYPES:
+        index = 0
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, _parse_line(line)
+                    index += 1
+        if buffer.strip():
+            yield index, _parse_line(buffer)
+        return
+
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(400, "Body must be a JSON array or application/x-ndjson")
+    if not isinstance(body, list):
+        raise HTTPException(400, "Body must be a JSON array of records")
+    if len(body) > max_records:
+        raise HTTPException(413, f"At most {max_records} records per request")
+    for index, raw in enumerate(body):
+        yield index, raw
+
+
+def _parse_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return InvalidRecord(f"Malformed JSON: {e}")
+
+
+def _validate(model, raw):
+    if isinstance(raw, InvalidRecord):
+        return None, raw.reason
+    if not isinstance(raw, dict):
+        return None, "Record must be a JSON object"
+    try:
+        return model(**raw), None
+    except ValidationError as e:
+        return None, jsonable_encoder(e.errors())
+
+
+async def ingest(request: Request, model, apply_chunk, chunk_size: int = INGEST_CHUNK_SIZE,
+                 max_records: int = INGEST_MAX_RECORDS):
+    """Validate every record and hand valid ones to apply_chunk in groups.
+
+    apply_chunk(list of (index, validated record)) runs in the thread pool and
+    returns one result dict per record it was given.
+    """
+    results = []
+    pending = []
+    truncated_at = None
+    async with aclosing(iter_records(request, max_records)) as records:
+        async for index, raw in records:
+            if index >= max_records:
+                # earlier chunks are already committed: report them rather than fail the request
+                truncated_at = index
+                break
+            item, error = _validate(model, raw)
+            if error is not None:
+                results.append({"index": index, "status": "invalid", "error": error})
+                continue
+            pending.append((index, item))
+            if len(pending) >= chunk_size:
+                results.extend(await run_in_threadpool(apply_chunk, pending))
+                pending = []
+    if pending:
+        results.extend(await run_in_threadpool(apply_chunk, pending))
+
+    results.sort(key=lambda r: r["index"])
+    summary = {}
+    for r in results:
+        summary[r["status"]] = summary.get(r["status"], 0) + 1
+    response = {"total": len(results), "summary": summary, "results": results}
+    if truncated_at is not None:
+        response["truncated_at"] = truncated_at
+    return response
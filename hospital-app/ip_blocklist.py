@@ -0,0 +1,230 @@
+"""
+IP blocklist enforcement for the incident responder's blocks
+Requests from an address the responder has blocked are rejected with 403
+before routing. Single addresses sit in a dict; CIDR ranges (any journal key
+with a prefix length, e.g. 203.0.113.0/24 or 2001:db8::/32) sit in a
+byte-stride prefix trie, so a lookup is at most 4 (IPv4) or 16 (IPv6) dict
+probes however many ranges are blocked. Every entry carries its expiry, so a
+block lapses on time without a reload.
+
+The responder's journal (incident-response/blocklist.py) is tailed from the
+last offset every BLOCKLIST_RELOAD_SECONDS in a worker thread; only appended
+lines are parsed. When the responder compacts it (new inode or a shorter
+file) the list is rebuilt off to the side and swapped in, which is also what
+clears expired entries. Account locks in the journal are handed to on_account,
+which the app uses to refuse the user's logins and revoke their tokens.
+
+Until BLOCKLIST_ENFORCE=1 the middleware only counts the requests it would
+reject (hospital_blocked_requests{mode="report"}). Turn it on once the
+deployment resolves viewer addresses (TRUSTED_PROXY_HOPS in rate_limit.py)
+and the report shows only attackers, not the proxies every user comes through.
+"""
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import time
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from rate_limit import client_ip
+
+BLOCKLIST_JOURNAL = os.getenv(
+    "BLOCKLIST_JOURNAL", "/home/ec2-user/hospital-app/incident-response/blocklist.journal")
+BLOCKLIST_RELOAD_SECONDS = float(os.getenv("BLOCKLIST_RELOAD_SECONDS", "1"))
+BLOCKLIST_ENFORCE = os.getenv("BLOCKLIST_ENFORCE", "0") == "1"
+V4_MAPPED = b"\x00" * 10 + b"\xff\xff"
+
+
+def pack_ip(ip: str):
+    """(version, packed address) with IPv4-mapped IPv6 unwrapped, or None"""
+    # inet_pton is several times faster than ipaddress and this runs per request
+    try:
+        return 4, socket.inet_pton(socket.AF_INET, ip)
+    except OSError:
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, ip)
+    except OSError:
+        return None
+    if packed[:12] == V4_MAPPED:
+        return 4, packed[12:]
+    return 6, packed
+
+
+class PrefixTrie:
+    """Ranges of one address family, one level per address byte.
+
+    A node maps a byte to [child node or None, expiry]. A prefix that ends
+    mid-byte is expanded to every byte value it covers at that level, and
+    each slot keeps the latest expiry of the prefixes ending there, so a
+    lookup just walks the address bytes taking the max.
+    """
+
+    def __init__(self):
+        self.root = {}
+        self.everything = 0.0  # expiry of a /0
+        self.size = 0
+
+    def add(self, packed: bytes, prefixlen: int, until: float):
+        self.size += 1
+        if prefixlen == 0:
+            self.everything = max(self.everything, until)
+            return
+        full, rem = divmod(prefixlen, 8)
+        if rem == 0:
+            full, rem = full - 1, 8
+        node = self.root
+        for b in packed[:full]:
+            slot = node.get(b)
+            if slot is None:
+                slot = node[b] = [None, 0.0]
+            if slot[0] is None:
+                slot[0] = {}
+            node = slot[0]
+        first = packed[full] & (0xFF << (8 - rem)) & 0xFF
+        for b in range(first, first + (1 << (8 - rem))):
+            slot = node.get(b)
+            if slot is None:
+                node[b] = [None, until]
+            elif until > slot[1]:
+                slot[1] = until
+
+    def lookup(self, packed: bytes) -> float:
+        """Latest expiry of any range containing the address, 0 if none"""
+        best = self.everything
+        node = self.root
+        for b in packed:
+            slot = node.get(b)
+            if slot is None:
+                break
+            if slot[1] > best:
+                best = slot[1]
+            node = slot[0]
+            if node is None:
+                break
+        return best
+
+
+class IpBlocklist:
+    def __init__(self):
+        self.hosts = {}  # packed address -> expiry
+        self.ranges = {4: PrefixTrie(), 6: PrefixTrie()}
+
+    def __len__(self):
+        return len(self.hosts) + self.ranges[4].size + self.ranges[6].size
+
+    def add(self, key: str, until: float) -> bool:
+        """Block an address or CIDR range; False if the key does not parse"""
+        if "/" not in key:
+            address = pack_ip(key)
+            if address is None:
+                return False
+            packed = address[1]
+            if until > self.hosts.get(packed, 0.0):
+                self.hosts[packed] = until
+            return True
+        try:
+            network = ipaddress.ip_network(key, strict=False)
+        except ValueError:
+            return False
+        if network.prefixlen == network.max_prefixlen:
+            return self.add(str(network.network_address), until)
+        self.ranges[network.version].add(network.network_address.packed, network.prefixlen, until)
+        return True
+
+    def blocked_until(self, ip: str) -> float:
+        """Expiry of the block covering `ip`, 0 if it is not blocked"""
+        address = pack_ip(ip)
+        if address is None:
+            return 0.0
+        version, packed = address
+        until = self.hosts.get(packed, 0.0)
+        trie = self.ranges[version]
+        if trie.size:
+            until = max(until, trie.lookup(packed))
+        return until
+
+    def is_blocked(self, ip: str, now: float = None) -> bool:
+        if not self.hosts and not self.ranges[4].size and not self.ranges[6].size:
+            return False
+        return self.blocked_until(ip) > (time.time() if now is None else now)
+
+
+class BlocklistFile:
+    """IpBlocklist kept in step with the responder's journal"""
+
+    def __init__(self, path: str = BLOCKLIST_JOURNAL, on_account=None):
+        """on_account(username, until) is called for each account lock still in force"""
+        self.path = path
+        self.on_account = on_account
+        self.current = IpBlocklist()
+        self._offset = 0
+        self._inode = None
+
+    def refresh(self):
+        """Apply lines appended since the last call, or rebuild after a compaction"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._inode is not None:
+                self.current, self._offset, self._inode = IpBlocklist(), 0, None
+            return
+        rotated = stat.st_ino != self._inode or stat.st_size < self._offset
+        if not rotated and stat.st_size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            if rotated:
+                # build off to the side so requests never see a half-loaded list
+                target, offset = IpBlocklist(), 0
+            else:
+                target, offset = self.current, self._offset
+            f.seek(offset)
+            chunk = f.read(stat.st_size - offset)
+        last_newline = chunk.rfind(b"\n")
+        if last_newline >= 0:
+            for line in chunk[:last_newline].split(b"\n"):
+                try:
+                    kind, key, until = json.loads(line)
+                except ValueError:
+                    continue
+                if kind == "ip":
+                    target.add(key, until)
+                elif kind == "account" and self.on_account is not None and until > time.time():
+                    self.on_account(key, until)
+            offset += last_newline + 1
+        # a trailing partial line is picked up once the responder finishes it
+        self.current, self._offset, self._inode = target, offset, stat.st_ino
+
+    async def run_reload(self, interval: float = BLOCKLIST_RELOAD_SECONDS):
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except OSError as e:
+                print(f"Blocklist reload failed: {e}")
+            await asyncio.sleep(interval)
+
+
+class BlocklistMiddleware:
+    """403 for blocked client addresses, ahead of routing and every other middleware"""
+
+    def __init__(self, app, blocklist: BlocklistFile, blocked_counter=None, enforce: bool = BLOCKLIST_ENFORCE):
+        """blocked_counter is labelled by mode: "enforced" or "report" (counted, let through)"""
+        self.app = app
+        self.blocklist = blocklist
+        self.blocked_counter = blocked_counter
+        self.enforce = enforce
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.blocklist.current.is_blocked(client_ip(Request(scope))):
+            await self.app(scope, receive, send)
+            return
+        if self.blocked_counter is not None:
+            self.blocked_counter.labels(mode="enforced" if self.enforce else "report").inc()
+        if not self.enforce:
+            await self.app(scope, receive, send)
+            return
+        response = JSONResponse({"detail": "Access denied"}, status_code=403)
+        await response(scope, receive, send)
@@ -1,22 +1,44 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse
 import pyotp
 import jwt
 from datetime import datetime, timedelta
 from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
 import time
 from typing import Optional
 import json
+import os
+import asyncio
+import secrets
+from patient_repository import PatientRepository
+from pagination import keyset_page, page_response, record_key, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from token_cache import TokenCache
+from account_events import AccountEvents
+from auth import auth_executor, hash_password, check_password, AuthExecutor
+from mfa import TotpVerifier, ReplayCache
+from rate_limit import AuthRateLimits, client_ip
+from auth_events import AuthEventPublisher, client_region
+from qr_codes import QrCodeCache, QR_FORMATS, QR_WORKERS, QR_MAX_PENDING
+from incident_store import IncidentReader
+from stats import HospitalStats
+from metrics_middleware import MetricsMiddleware, metrics_registry, mark_worker_dead
+from ingest import ingest
+from response_cache import CollectionCache
+from broadcaster import Broadcaster
+from static_assets import PrecompressedStaticFiles, PageCache, HtmlCompressionMiddleware
+from ip_blocklist import BlocklistFile, BlocklistMiddleware
+from pydantic import BaseModel
 
-app = FastAPI(title="Mount Sinai Hospital Management System")
+app = FastAPI(title="Mount Sinai Hospital Management System", default_response_class=ORJSONResponse)
 security = HTTPBearer()
 
-# Mount static files and templates
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Mount static files and templates (run `python3 static_assets.py static` at build time for .gz/.br variants)
+static_files = PrecompressedStaticFiles(directory="static", prefix="/static")
+app.mount("/static", static_files, name="static")
 templates = Jinja2Templates(directory="templates")
 
 SECRET_KEY = "your-secret-key-change-in-production"
@@ -26,7 +48,38 @@ request_count = Counter('hospital_requests_total', 'Total API requests', ['metho
 login_attempts = Counter('hospital_login_attempts', 'Login attempts', ['status'])
 mfa_attempts = Counter('hospital_mfa_attempts', 'MFA verification attempts', ['status'])
 response_time = Histogram('hospital_response_seconds', 'Response time', ['endpoint'])
-active_sessions = Gauge('hospital_active_sessions', 'Active user sessions')
+active_sessions = Gauge('hospital_active_sessions', 'Active user sessions', multiprocess_mode='sum')
+token_cache_lookups = Counter('hospital_token_cache_lookups', 'Validated-token cache lookups', ['result'])
+rate_limited = Counter('hospital_rate_limited', 'Auth attempts rejected by the rate limiter', ['endpoint', 'scope'])
+auth_events_dropped = Counter('hospital_auth_events_dropped', 'Auth events not delivered to the incident responder')
+blocked_requests = Counter('hospital_blocked_requests', 'Requests from IPs blocked by the incident responder', ['mode'])
+stream_subscribers = Gauge('hospital_stream_subscribers', 'Open dashboard push streams', multiprocess_mode='livesum')
+
+# Validated-token cache (set TOKEN_CACHE_ENABLED=0 to verify every request)
+token_cache = TokenCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+    enabled=os.getenv("TOKEN_CACHE_ENABLED", "1") != "0",
+    hit_counter=token_cache_lookups.labels(result='hit'),
+    miss_counter=token_cache_lookups.labels(result='miss')
+)
+
+# Per-IP and per-username token buckets on login and MFA (rate_limits in alert_rules.yml)
+auth_rate_limits = AuthRateLimits(rejected_counter=rate_limited)
+
+# Login/MFA outcomes go to the incident responder's detector as they happen
+auth_events = AuthEventPublisher(dropped_counter=auth_events_dropped)
+
+def publish_auth_event(event_type: str, request: Request, username: str, **fields):
+    auth_events.publish(event_type, username, client_ip(request), state=client_region(request), **fields)
+
+# Every request is counted and timed by route template
+app.add_middleware(MetricsMiddleware, request_count=request_count, response_time=response_time)
+# HTML not served from the page cache is gzipped on the fly above HTML_COMPRESS_MIN_SIZE
+app.add_middleware(HtmlCompressionMiddleware)
+# Added last so it runs first: blocked IPs/ranges from the responder's journal get 403.
+# Its account locks are read by every worker, so they are not shared again
+blocklist = BlocklistFile(on_account=lambda username, until: account_events.lock(username, until, share=False))
+app.add_middleware(BlocklistMiddleware, blocklist=blocklist, blocked_counter=blocked_requests)
 
 # User Database (in production, use PostgreSQL)
 USERS = {
@@ -74,6 +127,28 @@ USERS = {
     }
 }
 
+# Demo passwords are kept only for /api/test-credentials; USERS holds bcrypt hashes
+TEST_PASSWORDS = {username: data.pop("password") for username, data in USERS.items()}
+for _username, _password in TEST_PASSWORDS.items():
+    USERS[_username]["password_hash"] = hash_password(_password)
+
+# TOTP verifiers are built once per user; accepted codes are remembered to block replay
+mfa_verifiers = {}
+mfa_replay_cache = ReplayCache()
+
+# Setup QR codes are rendered off the event loop and cached per (user, secret)
+qr_executor = AuthExecutor(workers=QR_WORKERS, max_pending=QR_MAX_PENDING, name="qr")
+mfa_qr_cache = QrCodeCache(qr_executor)
+
+def load_mfa_verifier(username: str):
+    """(Re)build the TOTP verifier for a user, e.g. after their secret changes"""
+    mfa_verifiers[username] = TotpVerifier(USERS[username]["mfa_secret"], valid_window=1)
+    mfa_qr_cache.invalidate(username)
+    return mfa_verifiers[username]
+
+for _username in USERS:
+    load_mfa_verifier(_username)
+
 # Mock Patient Data
 PATIENTS = [
     {
@@ -312,35 +387,158 @@ INVOICES = [
     }
 ]
 
+# Optional PostgreSQL persistence: with DATABASE_URL set, collections are loaded
+# from (or seeded into) the database at startup and every write goes through it
+DATABASE_URL = os.getenv("DATABASE_URL")
+database = None
+storage = {}
+if DATABASE_URL:
+    from db import Database, DocumentStore, IdTaken, AccountEventStore
+    database = Database(DATABASE_URL)
+    database.apply_schema(os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql"))
+    for _name, _records in (("patients", PATIENTS), ("lab_orders", LAB_ORDERS),
+                            ("invoices", INVOICES), ("appointments", APPOINTMENTS)):
+        storage[_name] = DocumentStore(database, _name)
+        if storage[_name].count() == 0:
+            try:
+                storage[_name].insert_many(_records)
+            except IdTaken:
+                pass  # another worker seeded it first
+        # the database orders ids as text (L1000 < L999); pages walk them by record_key
+        _records[:] = sorted(storage[_name].all(), key=record_key)
+
+STALE_WRITE = "Record was changed by another request; reload it and retry"
+
+def changed_fields(record: dict, current: dict) -> dict:
+    return {k: v for k, v in current.items() if k != "id" and record.get(k) != v}
+
+async def write_through(collection: str, record: dict, apply, **changes):
+    """Store `record` with `changes`, then make them in memory with apply(**changes).
+
+    The database goes first, so a failed write leaves memory as it was. If
+    another worker changed the row since this one read it, memory is brought
+    up to date from the database and the request gets 409 to retry.
+    """
+    store = storage.get(collection)
+    if store is not None:
+        if await asyncio.to_thread(store.update_many, [{**record, **changes}]):
+            current = await asyncio.to_thread(store.get, record["id"])
+            if current is not None:
+                apply(**changed_fields(record, current))
+            raise HTTPException(409, STALE_WRITE)
+    apply(**changes)
+
+patients = PatientRepository(PATIENTS)
+
+# Id lookups for the non-patient collections
+LAB_ORDERS_BY_ID = {o["id"]: o for o in LAB_ORDERS}
+INVOICES_BY_ID = {inv["id"]: inv for inv in INVOICES}
+APPOINTMENTS_BY_ID = {a["id"]: a for a in APPOINTMENTS}
+
+# Admin stats are maintained on every write instead of recomputed per request
+DEPARTMENT_BY_STAFF = {u["name"]: u["department"] for u in USERS.values()}
+
+def stats_collections():
+    return {
+        "patient": patients,
+        "lab_order": LAB_ORDERS,
+        "invoice": INVOICES,
+        "appointment": APPOINTMENTS
+    }
+
+hospital_stats = HospitalStats.from_collections(stats_collections(), DEPARTMENT_BY_STAFF)
+patients.subscribe(hospital_stats.observer("patient"))
+
+# Encoded list pages with ETags, invalidated by writes
+patients_cache = CollectionCache("patients")
+lab_orders_cache = CollectionCache("lab_orders")
+invoices_cache = CollectionCache("invoices")
+patients.subscribe(lambda before, after: patients_cache.bump())
+
+TOKEN_LIFETIME = timedelta(hours=8)
+
 def create_token(username: str, role: str):
     payload = {
         "username": username,
         "role": role,
         "name": USERS[username]["name"],
         "department": USERS[username]["department"],
-        "exp": datetime.utcnow() + timedelta(hours=8)
+        # fractional, so a token issued just after revoke_user in the same second is not caught by it
+        "iat": time.time(),
+        "exp": datetime.utcnow() + TOKEN_LIFETIME
     }
     return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=["HS256"])
+    return decode_token(credentials.credentials)
+
+def decode_token(token: str):
+    payload = token_cache.get(token)
+    if payload is not None:
         return payload
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
     except:
         raise HTTPException(401, "Invalid token")
+    if payload.get("typ") == "stream":
+        raise HTTPException(401, "Invalid token")  # a stream ticket is not a session
+    if token_cache.is_revoked(token, payload):
+        raise HTTPException(401, "Token revoked")
+    token_cache.put(token, payload)
+    return payload
+
+def set_password_hash(username: str, password_hash: str):
+    if username in USERS:
+        USERS[username]["password_hash"] = password_hash
+
+# Revocations, account locks and password changes reach every worker through
+# the database when there is one (account_events.py)
+account_events = AccountEvents(
+    token_cache, TOKEN_LIFETIME.total_seconds(),
+    store=AccountEventStore(database) if database is not None else None,
+    on_password=set_password_hash
+)
+if database is not None:
+    account_events.store.prune(time.time())
+    account_events.sync()
+
+def revoke_token(token: str):
+    """Reject this token, in every worker, from now until it expires"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"], options={"verify_exp": False})
+    except jwt.InvalidTokenError:
+        return  # not one of ours, nothing to revoke
+    account_events.revoke_token(token, payload["exp"])
+
+def revoke_user_tokens(username: str):
+    """Reject every token issued to a user until now, in every worker"""
+    account_events.revoke_user(username)
+
+def check_not_locked(username: str, attempts: Counter):
+    """403 while an admin or the incident responder has the account locked"""
+    if account_events.is_locked(username):
+        attempts.labels(status='locked').inc()
+        raise HTTPException(403, "Account locked")
 
 # ============== HTML PAGES ==============
 
+# None of the pages use per-request data: render them once, with versioned asset URLs
+pages = PageCache(
+    templates,
+    ["index.html", "login.html", "mfa-setup.html", "doctor.html", "nurse.html",
+     "admin.html", "billing.html", "lab.html", "receptionist.html"],
+    static_url=static_files.url
+)
+
 @app.get("/", response_class=HTMLResponse)
 async def landing_page(request: Request):
     """Hospital landing page"""
-    request_count.labels(method='GET', endpoint='/', status='200').inc()
-    return templates.TemplateResponse("index.html", {"request": request})
+    return pages.response(request, "index.html")
 
 @app.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     """Login page"""
-    return templates.TemplateResponse("login.html", {"request": request})
+    return pages.response(request, "login.html")
 
 @app.get("/dashboard/{role}", response_class=HTMLResponse)
 async def dashboard_page(request: Request, role: str):
@@ -358,81 +556,146 @@ async def dashboard_page(request: Request, role: str):
         "receptionist": "receptionist.html"
     }
     
-    return templates.TemplateResponse(template_map[role], {"request": request})
+    return pages.response(request, template_map[role])
 
 # ============== AUTH API ==============
 
 @app.post("/api/auth/login")
-async def api_login(username: str, password: str):
+async def api_login(request: Request, username: str, password: str):
     """Step 1: Username/Password authentication"""
-    start_time = time.time()
-    try:
-        if username not in USERS or USERS[username]["password"] != password:
-            login_attempts.labels(status='failed').inc()
-            request_count.labels(method='POST', endpoint='/api/auth/login', status='401').inc()
-            response_time.labels(endpoint='/api/auth/login').observe(time.time() - start_time)
-            raise HTTPException(401, "Invalid credentials")
-        
-        login_attempts.labels(status='success').inc()
-        request_count.labels(method='POST', endpoint='/api/auth/login', status='200').inc()
-        response_time.labels(endpoint='/api/auth/login').observe(time.time() - start_time)
-        
-        return {
-            "success": True,
-            "message": "Credentials valid, MFA required",
-            "username": username,
-            "role": USERS[username]["role"],
-            "name": USERS[username]["name"],
-            "mfa_required": True
-        }
-    except HTTPException:
-        response_time.labels(endpoint='/api/auth/login').observe(time.time() - start_time)
-        raise
+    auth_rate_limits.check("login", request, username)
+    check_not_locked(username, login_attempts)
+    password_hash = USERS[username]["password_hash"] if username in USERS else None
+    valid = await auth_executor.run(check_password, password, password_hash)
+    if not valid:
+        login_attempts.labels(status='failed').inc()
+        publish_auth_event("login_failed", request, username)
+        raise HTTPException(401, "Invalid credentials")
+    
+    login_attempts.labels(status='success').inc()
+    publish_auth_event("login_success", request, username)
+    
+    return {
+        "success": True,
+        "message": "Credentials valid, MFA required",
+        "username": username,
+        "role": USERS[username]["role"],
+        "name": USERS[username]["name"],
+        "mfa_required": True
+    }
 
 @app.post("/api/auth/mfa")
-async def api_mfa_verify(username: str, mfa_code: str):
+async def api_mfa_verify(request: Request, username: str, mfa_code: str):
     """Step 2: MFA verification"""
-    start_time = time.time()
-    try:
-        if username not in USERS:
-            mfa_attempts.labels(status='invalid_user').inc()
-            request_count.labels(method='POST', endpoint='/api/auth/mfa', status='401').inc()
-            raise HTTPException(401, "Invalid user")
-        
-        totp = pyotp.TOTP(USERS[username]["mfa_secret"])
-        
-        if not totp.verify(mfa_code, valid_window=1):
-            mfa_attempts.labels(status='failed').inc()
-            request_count.labels(method='POST', endpoint='/api/auth/mfa', status='401').inc()
-            raise HTTPException(401, "Invalid MFA code")
-        
-        mfa_attempts.labels(status='success').inc()
-        active_sessions.inc()
-        token = create_token(username, USERS[username]["role"])
-        
-        request_count.labels(method='POST', endpoint='/api/auth/mfa', status='200').inc()
-        response_time.labels(endpoint='/api/auth/mfa').observe(time.time() - start_time)
-        
-        return {
-            "success": True,
-            "access_token": token,
-            "token_type": "bearer",
-            "role": USERS[username]["role"],
-            "name": USERS[username]["name"],
-            "department": USERS[username]["department"]
-        }
-    except HTTPException:
-        response_time.labels(endpoint='/api/auth/mfa').observe(time.time() - start_time)
-        raise
+    auth_rate_limits.check("mfa", request, username)
+    check_not_locked(username, mfa_attempts)
+    if username not in USERS:
+        mfa_attempts.labels(status='invalid_user').inc()
+        publish_auth_event("mfa_failed", request, username, reason="invalid_user")
+        raise HTTPException(401, "Invalid user")
+    
+    step = await auth_executor.run(mfa_verifiers[username].match, mfa_code)
+    
+    if step is None:
+        mfa_attempts.labels(status='failed').inc()
+        publish_auth_event("mfa_failed", request, username, reason="invalid_code")
+        raise HTTPException(401, "Invalid MFA code")
+    
+    if not mfa_replay_cache.claim(username, step):
+        mfa_attempts.labels(status='replayed').inc()
+        publish_auth_event("mfa_failed", request, username, reason="replayed")
+        raise HTTPException(401, "MFA code already used")
+    
+    mfa_attempts.labels(status='success').inc()
+    publish_auth_event("mfa_success", request, username)
+    active_sessions.inc()
+    token = create_token(username, USERS[username]["role"])
+    
+    return {
+        "success": True,
+        "access_token": token,
+        "token_type": "bearer",
+        "role": USERS[username]["role"],
+        "name": USERS[username]["name"],
+        "department": USERS[username]["department"]
+    }
+
+@app.post("/api/auth/logout")
+async def api_logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """End this session: the token is refused from now on"""
+    decode_token(credentials.credentials)
+    await asyncio.to_thread(revoke_token, credentials.credentials)
+    active_sessions.dec()
+    return {"success": True}
+
+@app.post("/api/auth/password")
+async def api_change_password(current_password: str, new_password: str, user=Depends(verify_token)):
+    """Change your own password; every session of yours, this one included, is ended"""
+    username = user['username']
+    if not await auth_executor.run(check_password, current_password, USERS[username]["password_hash"]):
+        raise HTTPException(401, "Invalid credentials")
+    password_hash = await auth_executor.run(hash_password, new_password)
+    set_password_hash(username, password_hash)
+    await asyncio.to_thread(account_events.change_password, username, password_hash)
+    return {"success": True, "message": "Password changed, sign in again"}
+
+@app.post("/api/admin/users/{username}/lock")
+async def lock_user(username: str, minutes: int = Query(60, ge=1, le=7 * 24 * 60), user=Depends(verify_token)):
+    """Refuse a user's logins for `minutes` and end their sessions"""
+    if user['role'] != 'admin':
+        raise HTTPException(403, "Admin access required")
+    if username not in USERS:
+        raise HTTPException(404, "User not found")
+    until = time.time() + minutes * 60
+    await asyncio.to_thread(account_events.lock, username, until)
+    return {"success": True, "username": username, "locked_until": datetime.fromtimestamp(until).isoformat()}
+
+@app.post("/api/admin/users/{username}/unlock")
+async def unlock_user(username: str, user=Depends(verify_token)):
+    if user['role'] != 'admin':
+        raise HTTPException(403, "Admin access required")
+    if username not in USERS:
+        raise HTTPException(404, "User not found")
+    await asyncio.to_thread(account_events.unlock, username)
+    return {"success": True, "username": username}
+
+@app.on_event("startup")
+async def start_account_event_sync():
+    if account_events.store is not None:
+        app.state.account_events_task = asyncio.create_task(account_events.run_sync())
+
+@app.on_event("shutdown")
+async def stop_account_event_sync():
+    task = getattr(app.state, "account_events_task", None)
+    if task is not None:
+        task.cancel()
+
+@app.on_event("shutdown")
+def shutdown_auth_executor():
+    auth_executor.shutdown()
+    qr_executor.shutdown()
+    auth_events.close()
+    mark_worker_dead()
+    if database is not None:
+        database.close()
 
 # ============== DOCTOR API ==============
 
 @app.get("/api/doctor/patients")
-async def get_patients(user=Depends(verify_token)):
+async def get_patients(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    user=Depends(verify_token)
+):
     """Get patient list for doctor"""
     if user['role'] not in ['doctor', 'nurse', 'admin']:
         raise HTTPException(403, "Access denied")
-    return {"patients": PATIENTS}
+    def build():
+        page, next_cursor = patients.page(cursor, limit)
+        return page_response("patients", page, next_cursor, fields)
+    return patients_cache.respond(request, (cursor, limit, fields), build)
 
 @app.get("/api/doctor/patient/{patient_id}")
 async def get_patient_details(patient_id: str, user=Depends(verify_token)):
@@ -440,7 +703,7 @@ async def get_patient_details(patient_id: str, user=Depends(verify_token)):
     if user['role'] not in ['doctor', 'nurse', 'admin']:
         raise HTTPException(403, "Access denied")
     
-    patient = next((p for p in PATIENTS if p['id'] == patient_id), None)
+    patient = patients.get(patient_id)
     if not patient:
         raise HTTPException(404, "Patient not found")
     return patient
@@ -450,6 +713,8 @@ async def prescribe_medication(patient_id: str, medication: str, user=Depends(ve
     """Prescribe medication to patient"""
     if user['role'] != 'doctor':
         raise HTTPException(403, "Only doctors can prescribe")
+    if patient_id not in patients:
+        raise HTTPException(404, "Patient not found")
     
     return {
         "success": True,
@@ -465,7 +730,7 @@ async def get_patient_vitals(patient_id: str, user=Depends(verify_token)):
     if user['role'] not in ['nurse', 'doctor', 'admin']:
         raise HTTPException(403, "Access denied")
     
-    patient = next((p for p in PATIENTS if p['id'] == patient_id), None)
+    patient = patients.get(patient_id)
     if not patient:
         raise HTTPException(404, "Patient not found")
     
@@ -482,20 +747,78 @@ async def update_vitals(patient_id: str, vitals: dict, user=Depends(verify_token
     if user['role'] not in ['nurse', 'doctor']:
         raise HTTPException(403, "Access denied")
     
+    patient = patients.get(patient_id)
+    if not patient:
+        raise HTTPException(404, "Patient not found")
+    await write_through("patients", patient, lambda **c: patients.update(patient_id, **c),
+                        vitals={**patient['vitals'], **vitals})
+    
     return {
         "success": True,
         "message": f"Vitals updated for patient {patient_id}",
         "updated_by": user['name']
     }
 
+class VitalsUpdateIn(BaseModel):
+    patient_id: str
+    vitals: dict
+
+@app.post("/api/nurse/vitals/update/batch")
+async def update_vitals_batch(request: Request, user=Depends(verify_token)):
+    """Bulk vitals updates from a JSON array or an application/x-ndjson stream"""
+    if user['role'] not in ['nurse', 'doctor']:
+        raise HTTPException(403, "Access denied")
+    
+    def apply_chunk(pending):
+        results, updated, vitals = [], [], {}  # vitals: patient id -> vitals after this chunk
+        for index, item in pending:
+            patient = patients.get(item.patient_id)
+            if not patient:
+                results.append({"index": index, "status": "not_found", "error": "Patient not found"})
+                continue
+            vitals[item.patient_id] = {**vitals.get(item.patient_id, patient['vitals']), **item.vitals}
+            updated.append((index, item.patient_id))
+        stale = set()
+        if "patients" in storage and vitals:
+            # one transaction for the whole chunk, before memory changes
+            store = storage["patients"]
+            try:
+                stale = set(store.update_many([{**patients.get(pid), "vitals": v} for pid, v in vitals.items()]))
+            except Exception:
+                return results + [{"index": i, "status": "failed", "error": "Storage write failed"}
+                                  for i, _ in updated]
+            for pid in stale:
+                current = store.get(pid)
+                if current is not None:
+                    patients.update(pid, **changed_fields(patients.get(pid), current))
+        for pid, v in vitals.items():
+            if pid not in stale:
+                patients.update(pid, vitals=v)
+        return results + [
+            {"index": i, "status": "conflict", "error": STALE_WRITE} if pid in stale
+            else {"index": i, "status": "updated", "patient_id": pid}
+            for i, pid in updated
+        ]
+    
+    return await ingest(request, VitalsUpdateIn, apply_chunk)
+
 # ============== LAB API ==============
 
 @app.get("/api/lab/orders")
-async def get_lab_orders(user=Depends(verify_token)):
+async def get_lab_orders(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    user=Depends(verify_token)
+):
     """Get pending lab test orders"""
     if user['role'] not in ['lab', 'doctor', 'admin']:
         raise HTTPException(403, "Access denied")
-    return {"orders": LAB_ORDERS}
+    def build():
+        page, next_cursor = keyset_page(LAB_ORDERS, cursor, limit)
+        return page_response("orders", page, next_cursor, fields)
+    return lab_orders_cache.respond(request, (cursor, limit, fields), build)
 
 @app.post("/api/lab/results")
 async def submit_lab_results(order_id: str, results: str, user=Depends(verify_token)):
@@ -503,6 +826,14 @@ async def submit_lab_results(order_id: str, results: str, user=Depends(verify_to
     if user['role'] != 'lab':
         raise HTTPException(403, "Only lab technicians can submit results")
     
+    order = LAB_ORDERS_BY_ID.get(order_id)
+    if not order:
+        raise HTTPException(404, "Lab order not found")
+    await write_through("lab_orders", order, lambda **c: hospital_stats.update("lab_order", order, **c),
+                        status="Completed", results=results)
+    lab_orders_cache.bump()
+    broadcaster.publish("lab_orders", order)
+    
     return {
         "success": True,
         "message": f"Results submitted for order {order_id}",
@@ -512,11 +843,20 @@ async def submit_lab_results(order_id: str, results: str, user=Depends(verify_to
 # ============== BILLING API ==============
 
 @app.get("/api/billing/invoices")
-async def get_invoices(user=Depends(verify_token)):
+async def get_invoices(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    user=Depends(verify_token)
+):
     """Get all billing invoices"""
     if user['role'] not in ['billing', 'admin']:
         raise HTTPException(403, "Access denied")
-    return {"invoices": INVOICES}
+    def build():
+        page, next_cursor = keyset_page(INVOICES, cursor, limit)
+        return page_response("invoices", page, next_cursor, fields)
+    return invoices_cache.respond(request, (cursor, limit, fields), build)
 
 @app.get("/api/billing/invoice/{invoice_id}")
 async def get_invoice_details(invoice_id: str, user=Depends(verify_token)):
@@ -524,7 +864,7 @@ async def get_invoice_details(invoice_id: str, user=Depends(verify_token)):
     if user['role'] not in ['billing', 'admin']:
         raise HTTPException(403, "Access denied")
     
-    invoice = next((inv for inv in INVOICES if inv['id'] == invoice_id), None)
+    invoice = INVOICES_BY_ID.get(invoice_id)
     if not invoice:
         raise HTTPException(404, "Invoice not found")
     return invoice
@@ -534,6 +874,19 @@ async def process_payment(invoice_id: str, amount: float, user=Depends(verify_to
     """Process patient payment"""
     if user['role'] != 'billing':
         raise HTTPException(403, "Only billing staff can process payments")
+    if amount <= 0:
+        raise HTTPException(400, "Payment amount must be positive")
+    
+    invoice = INVOICES_BY_ID.get(invoice_id)
+    if not invoice:
+        raise HTTPException(404, "Invoice not found")
+    balance = round(max(0.0, invoice['patient_balance'] - amount), 2)
+    await write_through(
+        "invoices", invoice, lambda **c: hospital_stats.update("invoice", invoice, **c),
+        patient_balance=balance,
+        status="Paid" if balance == 0 else "Partially Paid"
+    )
+    invoices_cache.bump()
     
     return {
         "success": True,
@@ -544,11 +897,17 @@ async def process_payment(invoice_id: str, amount: float, user=Depends(verify_to
 # ============== RECEPTIONIST API ==============
 
 @app.get("/api/reception/appointments")
-async def get_appointments(user=Depends(verify_token)):
+async def get_appointments(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    user=Depends(verify_token)
+):
     """Get today's appointments"""
     if user['role'] not in ['receptionist', 'doctor', 'admin']:
         raise HTTPException(403, "Access denied")
-    return {"appointments": APPOINTMENTS}
+    page, next_cursor = keyset_page(APPOINTMENTS, cursor, limit)
+    return page_response("appointments", page, next_cursor, fields)
 
 @app.post("/api/reception/checkin")
 async def checkin_patient(appointment_id: str, user=Depends(verify_token)):
@@ -556,6 +915,14 @@ async def checkin_patient(appointment_id: str, user=Depends(verify_token)):
     if user['role'] != 'receptionist':
         raise HTTPException(403, "Only reception can check in patients")
     
+    appointment = APPOINTMENTS_BY_ID.get(appointment_id)
+    if not appointment:
+        raise HTTPException(404, "Appointment not found")
+    await write_through("appointments", appointment,
+                        lambda **c: hospital_stats.update("appointment", appointment, **c),
+                        status="Checked In")
+    broadcaster.publish("appointments", appointment)
+    
     return {
         "success": True,
         "message": f"Patient checked in for appointment {appointment_id}",
@@ -564,45 +931,208 @@ async def checkin_patient(appointment_id: str, user=Depends(verify_token)):
 
 # ============== ADMIN API ==============
 
+INCIDENTS_DIR = os.getenv("INCIDENTS_DIR", "/home/ec2-user/hospital-app/incident-response/incidents")
+incident_reader = IncidentReader(INCIDENTS_DIR)
+INCIDENT_PUSH_LIMIT = 1000
+
 @app.get("/api/admin/incidents")
-async def get_security_incidents(user=Depends(verify_token)):
-    """Get security incidents from incident responder"""
+async def get_security_incidents(
+    since: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=1000),
+    type: Optional[str] = None,
+    severity: Optional[str] = None,
+    user=Depends(verify_token)
+):
+    """Get security incidents from incident responder, optionally by type/severity"""
     if user['role'] != 'admin':
         raise HTTPException(403, "Admin access required")
     
     try:
-        with open('/home/ec2-user/hospital-app/incident-response/incidents.log', 'r') as f:
-            incidents = [json.loads(line) for line in f.readlines()]
-        return {"incidents": incidents[-10:]}  # Last 10 incidents
-    except:
+        incidents = await asyncio.to_thread(incident_reader.read, since, limit, type, severity)
+        return {"incidents": incidents}
+    except OSError:
         return {"incidents": []}
 
+@app.get("/api/admin/incidents/summary")
+async def get_incident_summary(user=Depends(verify_token)):
+    """Incident totals by type and severity, from the store's index"""
+    if user['role'] != 'admin':
+        raise HTTPException(403, "Admin access required")
+    
+    try:
+        return await asyncio.to_thread(incident_reader.summary)
+    except OSError:
+        return {"total": 0, "by_type": {}, "by_severity": {}, "first": None, "last": None}
+
 @app.get("/api/admin/stats")
-async def get_system_stats(user=Depends(verify_token)):
-    """Get system statistics"""
+async def get_system_stats(verify: bool = False, user=Depends(verify_token)):
+    """Get system statistics (verify=true recomputes from scratch and reports drift)"""
     if user['role'] != 'admin':
         raise HTTPException(403, "Admin access required")
     
-    return {
-        "total_patients": len(PATIENTS),
-        "active_users": len(USERS),
-        "pending_lab_orders": len([o for o in LAB_ORDERS if o['status'] == 'Pending']),
-        "total_invoices": len(INVOICES),
-        "total_revenue": sum(inv['total'] for inv in INVOICES),
-        "appointments_today": len(APPOINTMENTS)
+    stats = hospital_stats.snapshot()
+    stats["active_users"] = len(USERS)
+    if verify:
+        stats["drift"] = hospital_stats.drift(stats_collections())
+    return stats
+
+# ============== PUSH FEEDS ==============
+
+STATS_PUSH_INTERVAL = float(os.getenv("STATS_PUSH_INTERVAL", "1"))
+# How long a stream ticket can wait before it is used to open a stream
+STREAM_TICKET_SECONDS = float(os.getenv("STREAM_TICKET_SECONDS", "30"))
+INCIDENT_PUSH_INTERVAL = float(os.getenv("INCIDENT_PUSH_INTERVAL", "2"))
+
+# Topic -> roles allowed to subscribe (same as the matching list endpoints)
+STREAM_TOPICS = {
+    "incidents": {"admin"},
+    "stats": {"admin"},
+    "lab_orders": {"lab", "doctor", "admin"},
+    "appointments": {"receptionist", "doctor", "admin"},
+}
+
+broadcaster = Broadcaster(subscriber_gauge=stream_subscribers)
+
+# EventSource cannot set headers, and a session token in the URL would land in
+# access and proxy logs. The page trades its token for a short-lived ticket that
+# opens one stream: it names the session it came from (sid) and carries its iat
+# and exp, so logging out or revoking the user also voids unused tickets.
+def create_stream_ticket(token: str, session: dict) -> str:
+    now = time.time()
+    payload = {
+        "typ": "stream",
+        "username": session["username"],
+        "role": session["role"],
+        "sid": token_cache.digest(token).hex(),
+        "iat": session.get("iat", 0),
+        "session_exp": session["exp"],
+        "exp": min(now + STREAM_TICKET_SECONDS, session["exp"]),
+        "jti": secrets.token_hex(16)
     }
+    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+
+async def spend_stream_ticket(ticket: str):
+    """Check a ticket and use it up, here at once and in the other workers within a sync"""
+    try:
+        payload = jwt.decode(ticket, SECRET_KEY, algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        raise HTTPException(401, "Invalid stream ticket")
+    if (payload.get("typ") != "stream" or token_cache.is_revoked(ticket, payload)
+            or token_cache.digest_revoked(bytes.fromhex(payload["sid"]))):
+        raise HTTPException(401, "Invalid stream ticket")
+    # revoked before the first await, so a second use in this worker is refused
+    token_cache.revoke(ticket, payload["exp"])
+    await asyncio.to_thread(account_events.revoke_token, ticket, payload["exp"])
+    return payload
+
+@app.post("/api/stream/ticket")
+async def stream_ticket(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Single-use ticket for /api/stream?ticket=, good for STREAM_TICKET_SECONDS"""
+    session = decode_token(credentials.credentials)
+    return {"ticket": create_stream_ticket(credentials.credentials, session),
+            "expires_in": STREAM_TICKET_SECONDS}
+
+async def push_stats():
+    """Publish the stats keys that changed since the last push"""
+    previous = hospital_stats.snapshot()
+    while True:
+        await asyncio.sleep(STATS_PUSH_INTERVAL)
+        if not broadcaster.has_subscribers("stats"):
+            continue
+        current = hospital_stats.snapshot()
+        delta = {k: v for k, v in current.items() if previous.get(k) != v}
+        if delta:
+            broadcaster.publish("stats", delta)
+        previous = current
+
+async def push_incidents():
+    """Poll the incident store once for every subscriber and publish new entries"""
+    latest = ""
+    while True:
+        try:
+            incidents = await asyncio.to_thread(incident_reader.read, latest or None, INCIDENT_PUSH_LIMIT)
+        except OSError:
+            incidents = []
+        for incident in incidents:
+            if latest and broadcaster.has_subscribers("incidents"):
+                broadcaster.publish("incidents", incident)
+        if incidents:
+            latest = max(latest, incidents[-1].get("timestamp", ""))
+        elif not latest:
+            latest = datetime.now().isoformat()
+        await asyncio.sleep(INCIDENT_PUSH_INTERVAL)
+
+@app.on_event("startup")
+async def start_push_feeds():
+    app.state.push_tasks = [
+        asyncio.create_task(push_stats()),
+        asyncio.create_task(push_incidents()),
+        asyncio.create_task(broadcaster.run_keepalive())
+    ]
+
+@app.on_event("shutdown")
+async def stop_push_feeds():
+    for task in getattr(app.state, "push_tasks", []):
+        task.cancel()
+
+@app.on_event("startup")
+async def start_blocklist_reload():
+    app.state.blocklist_task = asyncio.create_task(blocklist.run_reload())
+
+@app.on_event("shutdown")
+async def stop_blocklist_reload():
+    task = getattr(app.state, "blocklist_task", None)
+    if task is not None:
+        task.cancel()
+
+@app.get("/api/stream")
+async def stream(request: Request, topics: str, ticket: str, last_event_id: Optional[int] = None):
+    """Server-Sent Events feed of deltas, e.g. /api/stream?topics=incidents,stats&ticket=...
+
+    A reopened stream passes last_event_id, since a new EventSource cannot send Last-Event-ID.
+    """
+    user = await spend_stream_ticket(ticket)
+    wanted = {t.strip() for t in topics.split(",") if t.strip()}
+    unknown = wanted - STREAM_TOPICS.keys()
+    if not wanted or unknown:
+        raise HTTPException(400, f"Unknown topics: {', '.join(sorted(unknown)) or '(none)'}")
+    if any(user['role'] not in STREAM_TOPICS[t] for t in wanted):
+        raise HTTPException(403, "Access denied")
+    try:
+        last_event_id = int(request.headers.get("last-event-id", ""))
+    except ValueError:
+        pass
+    subscription = broadcaster.subscribe(wanted, last_event_id)
+    expires = user["session_exp"]
+
+    async def events():
+        try:
+            yield b"retry: 5000\n\n"
+            async for chunk in subscription.frames():
+                if time.time() >= expires:
+                    break  # token expired, the client has to log in again
+                yield chunk
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # also covers a client that disconnects before the generator starts
+        background=BackgroundTask(broadcaster.unsubscribe, subscription)
+    )
 
 # ============== MONITORING ==============
 
 @app.get("/metrics")
 def metrics():
     """Prometheus metrics endpoint"""
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/health")
 def health():
     """Health check endpoint"""
-    request_count.labels(method='GET', endpoint='/health', status='200').inc()
     return {
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
@@ -616,7 +1146,7 @@ def test_credentials():
     for username, data in USERS.items():
         creds[username] = {
             "username": username,
-            "password": data["password"],
+            "password": TEST_PASSWORDS[username],
             "role": data["role"],
             "name": data["name"],
             "mfa_code": "Use Google Authenticator with secret: JBSWY3DPEHPK3PXP"
@@ -627,46 +1157,27 @@ if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=5000)
 
-# Add this import at the top if not already there
-from fastapi.responses import StreamingResponse
-import io
-
 @app.get("/mfa-setup", response_class=HTMLResponse)
 async def mfa_setup_page(request: Request):
     """MFA Setup page"""
-    return templates.TemplateResponse("mfa-setup.html", {"request": request})
+    return pages.response(request, "mfa-setup.html")
 
 @app.get("/api/auth/mfa-qr/{username}")
-async def get_mfa_qr(username: str):
-    """Generate QR code for user MFA setup"""
+async def get_mfa_qr(username: str, format: str = Query("png", pattern="^(png|svg)$")):
+    """Generate QR code for user MFA setup (format=svg is cheaper to produce)"""
     if username not in USERS:
         raise HTTPException(404, "User not found")
     
+    # Generate TOTP provisioning URI
+    secret = USERS[username]["mfa_secret"]
+    uri = pyotp.TOTP(secret).provisioning_uri(
+        name=f"{username}",
+        issuer_name="Mount Sinai Hospital"
+    )
+    
     try:
-        import qrcode
-        from io import BytesIO
-        
-        # Generate TOTP provisioning URI
-        secret = USERS[username]["mfa_secret"]
-        name = USERS[username]["name"]
-        totp = pyotp.TOTP(secret)
-        uri = totp.provisioning_uri(
-            name=f"{username}",
-            issuer_name="Mount Sinai Hospital"
-        )
-        
-        # Generate QR code
-        qr = qrcode.QRCode(version=1, box_size=10, border=4)
-        qr.add_data(uri)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Convert to bytes
-        buf = BytesIO()
-        img.save(buf, format='PNG')
-        buf.seek(0)
-        
-        return StreamingResponse(buf, media_type="image/png")
+        image = await mfa_qr_cache.get(username, secret, uri, format)
     except ImportError:
         raise HTTPException(500, "QR code library not installed")
+    # the image encodes the TOTP secret, keep it out of every cache but ours
+    return Response(image, media_type=QR_FORMATS[format], headers={"Cache-Control": "no-store"})
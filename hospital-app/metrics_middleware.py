@@ -0,0 +1,85 @@
+"""
+ASGI request metrics middleware
+Records every HTTP request into the request counter and latency histogram,
+labeled by route template (/api/doctor/patient/{patient_id}) rather than the
+raw path so label cardinality stays fixed.
+
+Multi-worker: start uvicorn with PROMETHEUS_MULTIPROC_DIR pointing at an
+empty directory, e.g.
+    rm -rf /tmp/hospital-metrics && mkdir /tmp/hospital-metrics
+    PROMETHEUS_MULTIPROC_DIR=/tmp/hospital-metrics uvicorn main:app --workers 4
+and /metrics aggregates all workers through metrics_registry().
+"""
+import os
+import time
+
+from prometheus_client import CollectorRegistry, REGISTRY
+from prometheus_client import multiprocess
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+UNMATCHED = "<unmatched>"
+
+
+def metrics_registry():
+    """Registry to expose on /metrics, merged across workers in multiprocess mode"""
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def mark_worker_dead():
+    """Drop this worker's live gauges from the shared directory on shutdown"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def route_template(scope):
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if "endpoint" in scope:
+        # matched a Mount such as /static, whose prefix ends up in root_path
+        return scope.get("root_path") or UNMATCHED
+    return UNMATCHED
+
+
+class MetricsMiddleware:
+    def __init__(self, app, request_count, response_time):
+        self.app = app
+        self.request_count = request_count
+        self.response_time = response_time
+        # labels() lookups are the expensive part, cache the bound children
+        self._counters = {}
+        self._timers = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            endpoint = route_template(scope)
+            key = (scope["method"], endpoint, status)
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = self.request_count.labels(
+                    method=scope["method"], endpoint=endpoint, status=str(status))
+            counter.inc()
+            timer = self._timers.get(endpoint)
+            if timer is None:
+                timer = self._timers[endpoint] = self.response_time.labels(endpoint=endpoint)
+            timer.observe(elapsed)
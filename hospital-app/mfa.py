@@ -0,0 +1,72 @@
+"""
+TOTP verification with replay protection
+Verifiers are built once per user; used (user, time-step) pairs are kept in
+per-step buckets so expiring old pairs is a popleft, never a scan
+"""
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import pyotp
+from pyotp.utils import strings_equal
+
+
+class TotpVerifier:
+    """Precomputed verifier for one user's TOTP secret"""
+
+    def __init__(self, secret: str, valid_window: int = 1):
+        self.totp = pyotp.TOTP(secret)
+        self.valid_window = valid_window
+        # time-step -> expected code, holds only the steps of the current window
+        self._codes = {}
+
+    def _code(self, step: int) -> str:
+        code = self._codes.get(step)
+        if code is None:
+            if len(self._codes) > 4 * self.valid_window + 2:
+                self._codes.clear()
+            code = self._codes[step] = self.totp.generate_otp(step)
+        return code
+
+    def match(self, code: str, for_time: Optional[float] = None) -> Optional[int]:
+        """Return the time-step the code belongs to, or None if it is not valid now"""
+        now_step = int((time.time() if for_time is None else for_time) // self.totp.interval)
+        for step in range(now_step - self.valid_window, now_step + self.valid_window + 1):
+            if strings_equal(code, self._code(step)):
+                return step
+        return None
+
+
+class ReplayCache:
+    """Records which (user, time-step) pairs have already been accepted"""
+
+    def __init__(self, retain_steps: int = 3):
+        self.retain_steps = retain_steps
+        self._buckets = {}
+        self._order = deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, current_step: int):
+        while self._order and self._order[0] < current_step - self.retain_steps:
+            del self._buckets[self._order.popleft()]
+
+    def claim(self, username: str, step: int) -> bool:
+        """Mark (username, step) as used; False if it was already used"""
+        with self._lock:
+            self._expire(step)
+            bucket = self._buckets.get(step)
+            if bucket is None:
+                bucket = self._buckets[step] = set()
+                # steps normally arrive in order; keep the deque sorted when they don't
+                if self._order and step < self._order[-1]:
+                    self._order = deque(sorted((*self._order, step)))
+                else:
+                    self._order.append(step)
+            if username in bucket:
+                return False
+            bucket.add(username)
+            return True
+
+    def __len__(self):
+        return sum(len(b) for b in self._buckets.values())
@@ -0,0 +1,82 @@
+"""
+Keyset pagination and field projection for list endpoints
+"""
+import base64
+import json
+import re
+from bisect import bisect_right
+from typing import Optional
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+_DIGITS = re.compile(r"(\d+)")
+
+
+def id_key(value):
+    """Sort key ordering ids by their numeric runs: L999 < L1000 and 9 < 10"""
+    # split() alternates text and digit runs, so tuples always compare str to str and int to int
+    parts = _DIGITS.split(str(value))
+    return tuple(int(part) if i % 2 else part for i, part in enumerate(parts))
+
+
+def id_order(value):
+    """Total order on ids: id_key, then the id itself, since P7 and P007 share an id_key"""
+    return id_key(value), str(value)
+
+
+def record_key(record: dict, key: str = "id"):
+    """Where a record sits in a listing sorted on `key`: (id_key of the value, id), the id breaking ties"""
+    return id_key(record[key]), str(record["id"])
+
+
+def encode_cursor(record: dict, key: str = "id") -> str:
+    """Opaque cursor for the position just after `record`"""
+    raw = json.dumps([record[key], record["id"]], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """The record_key a cursor points past; a bare id (the old cursor format) is read as one"""
+    try:
+        value, record_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        value = record_id = cursor
+    return id_key(value), str(record_id)
+
+
+def parse_fields(fields: Optional[str]):
+    """Turn a comma separated fields= parameter into a tuple (None means all fields)"""
+    if not fields:
+        return None
+    return tuple(f.strip() for f in fields.split(",") if f.strip()) or None
+
+
+def project(record: dict, fields):
+    """Keep only the requested top-level fields of a record"""
+    if fields is None:
+        return record
+    return {f: record[f] for f in fields if f in record}
+
+
+def keyset_page(records, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE, key: str = "id"):
+    """Return (page, next_cursor) for records sorted ascending by record_key(record, key).
+
+    The cursor holds the (sort value, id) of the last record on the previous
+    page, so records sharing a sort value are neither skipped nor repeated, and
+    each page costs O(log n + limit) no matter how deep the client has paged.
+    """
+    start = bisect_right(records, decode_cursor(cursor), key=lambda r: record_key(r, key)) if cursor else 0
+    page = records[start:start + limit]
+    next_cursor = encode_cursor(page[-1], key) if start + limit < len(records) and page else None
+    return page, next_cursor
+
+
+def page_response(name: str, page, next_cursor: Optional[str], fields: Optional[str] = None):
+    """Build the JSON body shared by every paginated list endpoint"""
+    selected = parse_fields(fields)
+    return {
+        name: [project(r, selected) for r in page],
+        "next_cursor": next_cursor,
+        "count": len(page),
+    }
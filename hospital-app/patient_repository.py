@@ -0,0 +1,124 @@
+"""
+Indexed in-memory patient repository
+Primary hash index on patient id plus secondary indexes on doctor, room and condition
+"""
+from bisect import bisect_left, bisect_right, insort
+from typing import Optional
+
+from pagination import decode_cursor, encode_cursor, id_order
+
+INDEXED_FIELDS = ("doctor", "room", "condition")
+
+
+class PatientRepository:
+    def __init__(self, patients=()):
+        self._by_id = {}
+        # Patient ids sorted by id_order, backing keyset pagination
+        self._ordered_ids = []
+        # field -> value -> {patient_id: None} (dict used as an insertion-ordered set)
+        self._indexes = {field: {} for field in INDEXED_FIELDS}
+        # callbacks(before, after) notified on every write; None marks add/remove
+        self._observers = []
+        for patient in patients:
+            self.add(patient)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, patient_id):
+        return patient_id in self._by_id
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def subscribe(self, callback):
+        """Register callback(before, after) to be told about every write"""
+        self._observers.append(callback)
+
+    def _notify(self, before, after):
+        for callback in self._observers:
+            callback(before, after)
+
+    def _index(self, patient):
+        for field in INDEXED_FIELDS:
+            value = patient.get(field)
+            if value is not None:
+                self._indexes[field].setdefault(value, {})[patient["id"]] = None
+
+    def _unindex(self, patient):
+        for field in INDEXED_FIELDS:
+            value = patient.get(field)
+            bucket = self._indexes[field].get(value)
+            if bucket is None:
+                continue
+            bucket.pop(patient["id"], None)
+            if not bucket:
+                del self._indexes[field][value]
+
+    def get(self, patient_id: str) -> Optional[dict]:
+        """O(1) lookup by patient id"""
+        return self._by_id.get(patient_id)
+
+    def all(self):
+        """All patients in insertion order"""
+        return list(self._by_id.values())
+
+    def add(self, patient: dict):
+        """Insert a new patient record"""
+        if patient["id"] in self._by_id:
+            raise KeyError(f"Patient {patient['id']} already exists")
+        self._by_id[patient["id"]] = patient
+        insort(self._ordered_ids, patient["id"], key=id_order)
+        self._index(patient)
+        self._notify(None, patient)
+        return patient
+
+    def update(self, patient_id: str, **changes):
+        """Apply field changes, keeping secondary indexes in sync"""
+        patient = self._by_id.get(patient_id)
+        if patient is None:
+            return None
+        if "id" in changes and changes["id"] != patient_id:
+            raise ValueError("Patient id cannot be changed")
+        before = dict(patient) if self._observers else None
+        reindex = any(field in changes for field in INDEXED_FIELDS)
+        if reindex:
+            self._unindex(patient)
+        patient.update(changes)
+        if reindex:
+            self._index(patient)
+        if before is not None:
+            self._notify(before, patient)
+        return patient
+
+    def remove(self, patient_id: str) -> Optional[dict]:
+        """Delete a patient and drop it from every index"""
+        patient = self._by_id.pop(patient_id, None)
+        if patient is not None:
+            self._ordered_ids.pop(bisect_left(self._ordered_ids, id_order(patient_id), key=id_order))
+            self._unindex(patient)
+            self._notify(patient, None)
+        return patient
+
+    def page(self, cursor: Optional[str] = None, limit: int = 50):
+        """Keyset page of patients ordered by id, returns (page, next_cursor)"""
+        start = bisect_right(self._ordered_ids, decode_cursor(cursor), key=id_order) if cursor else 0
+        ids = self._ordered_ids[start:start + limit]
+        next_cursor = encode_cursor(self._by_id[ids[-1]]) if ids and start + limit < len(self._ordered_ids) else None
+        return [self._by_id[pid] for pid in ids], next_cursor
+
+    def find_by(self, field: str, value):
+        """Patients whose indexed field equals value"""
+        if field not in self._indexes:
+            raise KeyError(f"{field} is not an indexed field")
+        ids = self._indexes[field].get(value, ())
+        return [self._by_id[pid] for pid in ids]
+
+    def by_doctor(self, doctor: str):
+        return self.find_by("doctor", doctor)
+
+    def by_room(self, room: str):
+        return self.find_by("room", room)
+
+    def by_condition(self, condition: str):
+        return self.find_by("condition", condition)
@@ -0,0 +1,79 @@
+"""
+MFA provisioning QR codes
+Images are rendered in a worker pool, off the event loop, and kept in an LRU
+keyed by (username, secret hash, format): a rotated secret never matches an old
+entry, and repeat visits to /mfa-setup cost a dict lookup.
+"""
+import asyncio
+import hashlib
+import io
+import os
+from collections import OrderedDict
+
+QR_CACHE_SIZE = int(os.getenv("QR_CACHE_SIZE", "1024"))
+QR_WORKERS = int(os.getenv("QR_WORKERS", "2"))
+QR_MAX_PENDING = int(os.getenv("QR_MAX_PENDING", "256"))
+QR_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def render_qr(data: str, fmt: str = "png") -> bytes:
+    """Encode data as a QR code image (PNG via Pillow, or a single-path SVG)"""
+    import qrcode
+    import qrcode.image.svg
+
+    buf = io.BytesIO()
+    if fmt == "svg":
+        qr = qrcode.QRCode(version=1, box_size=10, border=4, image_factory=qrcode.image.svg.SvgPathImage)
+        qr.add_data(data)
+        qr.make(fit=True)
+        qr.make_image().save(buf)
+    else:
+        qr = qrcode.QRCode(version=1, box_size=10, border=4)
+        qr.add_data(data)
+        qr.make(fit=True)
+        qr.make_image(fill_color="black", back_color="white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class QrCodeCache:
+    def __init__(self, executor, maxsize: int = QR_CACHE_SIZE):
+        self.executor = executor
+        self.maxsize = maxsize
+        self._images = OrderedDict()
+        self._inflight = {}
+        # bumped by invalidate() so renders started before it are not cached
+        self._generation = {}
+
+    @staticmethod
+    def key(username: str, secret: str, fmt: str):
+        return username, hashlib.sha256(secret.encode()).hexdigest()[:16], fmt
+
+    async def get(self, username: str, secret: str, uri: str, fmt: str = "png") -> bytes:
+        key = self.key(username, secret, fmt)
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+            return image
+        task = self._inflight.get(key)
+        if task is None:
+            # concurrent requests for the same image share one render
+            task = self._inflight[key] = asyncio.ensure_future(self._render(key, uri, fmt))
+        return await asyncio.shield(task)
+
+    async def _render(self, key, uri, fmt):
+        generation = self._generation.get(key[0], 0)
+        try:
+            image = await self.executor.run(render_qr, uri, fmt)
+        finally:
+            del self._inflight[key]
+        if self._generation.get(key[0], 0) == generation:
+            self._images[key] = image
+            if len(self._images) > self.maxsize:
+                self._images.popitem(last=False)
+        return image
+
+    def invalidate(self, username: str):
+        """Drop a user's images, e.g. after their MFA secret is reset"""
+        self._generation[username] = self._generation.get(username, 0) + 1
+        for key in [k for k in self._images if k[0] == username]:
+            del self._images[key]
@@ -0,0 +1,149 @@
+"""
+Token-bucket rate limiting for the auth endpoints
+One bucket per client IP and one per username, checked before any bcrypt or
+TOTP work. A bucket that has been idle long enough to refill completely is
+indistinguishable from a new one, so idle keys are evicted for free; max_keys
+bounds memory when an attacker rotates through many IPs or usernames.
+
+Limits come from the rate_limits section of alert_rules.yml, e.g.
+    rate_limits:
+      login:
+        per_ip: {attempts: 60, window_minutes: 1}
+        per_username: {attempts: 10, window_minutes: 5}
+"""
+import math
+import os
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+
+from auth_events import EDGE_AUTH_SECRET, from_edge
+
+ALERT_RULES_PATH = os.getenv(
+    "ALERT_RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "incident-response", "alert_rules.yml")
+)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Proxies in front of the app that each append to X-Forwarded-For: 2 for
+# CloudFront -> ALB (main.tf). Each appends the address it received from, so
+# the viewer is the 2nd entry from the right; anything further left is
+# client-supplied. 0 uses the socket peer.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+DEFAULT_LIMITS = {
+    "login": {
+        "per_ip": {"attempts": 60, "window_minutes": 1},
+        "per_username": {"attempts": 10, "window_minutes": 5},
+    },
+    "mfa": {
+        "per_ip": {"attempts": 60, "window_minutes": 1},
+        "per_username": {"attempts": 10, "window_minutes": 5},
+    },
+}
+
+
+def load_limits(path: str = ALERT_RULES_PATH):
+    """rate_limits from alert_rules.yml merged over DEFAULT_LIMITS"""
+    limits = {endpoint: dict(keys) for endpoint, keys in DEFAULT_LIMITS.items()}
+    try:
+        import yaml
+        with open(path, "r") as f:
+            configured = (yaml.safe_load(f) or {}).get("rate_limits") or {}
+    except (ImportError, OSError):
+        return limits
+    for endpoint, keys in configured.items():
+        limits.setdefault(endpoint, {}).update(keys or {})
+    return limits
+
+
+class RateLimiter:
+    def __init__(self, attempts: int, window_seconds: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.capacity = float(attempts)
+        self.rate = attempts / window_seconds  # tokens per second
+        self.idle_after = window_seconds  # a bucket idle this long is full again
+        self.max_keys = max_keys
+        # key -> [tokens, last update]; least recently used first
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def acquire(self, key, now: float = None) -> float:
+        """Take one token; returns 0 if allowed, else seconds until one is available"""
+        if now is None:
+            now = time.monotonic()
+        buckets = self._buckets
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [self.capacity, now]
+        else:
+            buckets.move_to_end(key)
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        self._evict(now)
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        return (1.0 - bucket[0]) / self.rate
+
+    def _evict(self, now):
+        buckets = self._buckets
+        # amortised: at most two idle buckets per call, plus whatever max_keys forces
+        for _ in range(2):
+            if not buckets:
+                return
+            key, (_, last) = next(iter(buckets.items()))
+            if now - last < self.idle_after:
+                break
+            del buckets[key]
+        while len(buckets) > self.max_keys:
+            buckets.popitem(last=False)
+
+
+def viewer_address(value: str) -> str:
+    """Address part of CloudFront-Viewer-Address ("198.51.100.10:46532", IPv6 too)"""
+    host = value.rsplit(":", 1)[0] if ":" in value else value
+    return host.strip("[]")
+
+
+def client_ip(request: Request, hops: int = TRUSTED_PROXY_HOPS, secret: str = EDGE_AUTH_SECRET) -> str:
+    """The viewer's address, not that of the CDN or load balancer in front of us"""
+    # CloudFront states the viewer outright; believed only alongside the origin secret
+    viewer = request.headers.get("cloudfront-viewer-address")
+    if viewer and from_edge(request, secret):
+        return viewer_address(viewer)
+    if hops:
+        hops_seen = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+        if len(hops_seen) >= hops:
+            return hops_seen[-hops]
+        if hops_seen:
+            # came in past some of the proxies; the leftmost entry is the best we have
+            return hops_seen[0]
+    return request.client.host if request.client else "unknown"
+
+
+class AuthRateLimits:
+    """Per-IP and per-username limiters for each auth endpoint"""
+
+    def __init__(self, limits=None, rejected_counter=None):
+        limits = limits if limits is not None else load_limits()
+        self.rejected_counter = rejected_counter
+        self.limiters = {
+            (endpoint, scope): RateLimiter(cfg["attempts"], cfg["window_minutes"] * 60)
+            for endpoint, scopes in limits.items()
+            for scope, cfg in scopes.items()
+        }
+
+    def check(self, endpoint: str, request: Request, username: str):
+        """Raise 429 with Retry-After if this IP or username is over its limit"""
+        for scope, key in (("per_ip", client_ip(request)), ("per_username", username)):
+            limiter = self.limiters.get((endpoint, scope))
+            if limiter is None:
+                continue
+            wait = limiter.acquire(key)
+            if wait:
+                if self.rejected_counter is not None:
+                    self.rejected_counter.labels(endpoint=endpoint, scope=scope).inc()
+                raise HTTPException(429, "Too many attempts, try again later",
+                                    headers={"Retry-After": str(math.ceil(wait))})
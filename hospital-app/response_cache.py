@@ -0,0 +1,59 @@
+"""
+Pre-encoded, ETag-aware responses for read-mostly collections
+Each collection carries a version counter that writes bump. Encoded bodies are
+cached per (version, query parameters); ETags are derived from the same
+values, so a matching If-None-Match gets a 304 without building or encoding
+anything.
+"""
+import hashlib
+import os
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+# Distinguishes ETags across restarts and workers, whose version counters start over
+BOOT_ID = os.urandom(4).hex()
+CACHE_CONTROL = "private, no-cache"
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class CollectionCache:
+    def __init__(self, name: str, max_entries: int = 256):
+        self.name = name
+        self.max_entries = max_entries
+        self.version = 0
+        self._bodies = {}
+
+    def bump(self):
+        """Call after every write to the collection"""
+        self.version += 1
+        self._bodies = {}
+
+    def etag(self, key) -> str:
+        digest = hashlib.blake2s(repr(key).encode(), digest_size=6).hexdigest()
+        return f'"{self.name}-{BOOT_ID}-{self.version}-{digest}"'
+
+    def respond(self, request: Request, key, build) -> Response:
+        """304 if the client's copy is current, else the cached or freshly encoded body"""
+        etag = self.etag(key)
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+        bodies = self._bodies
+        body = bodies.get(key)
+        if body is None:
+            body = orjson.dumps(build())
+            if len(bodies) >= self.max_entries:
+                bodies.clear()
+            bodies[key] = body
+        return Response(body, media_type="application/json", headers=headers)
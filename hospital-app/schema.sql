@@ -0,0 +1,42 @@
+-- Hospital app storage schema (PostgreSQL 12+)
+-- Each record is a JSONB document keyed by id. The app loads every table
+-- at startup and reads from memory, so the primary key is the only index
+-- and writes pay for nothing else.
+-- version goes up on every update; db.py refuses a write carrying an older one,
+-- so workers with stale copies cannot overwrite each other.
+
+CREATE TABLE IF NOT EXISTS patients (
+    id          TEXT PRIMARY KEY,
+    data        JSONB NOT NULL,
+    version     BIGINT NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS lab_orders (
+    id          TEXT PRIMARY KEY,
+    data        JSONB NOT NULL,
+    version     BIGINT NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS invoices (
+    id          TEXT PRIMARY KEY,
+    data        JSONB NOT NULL,
+    version     BIGINT NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS appointments (
+    id          TEXT PRIMARY KEY,
+    data        JSONB NOT NULL,
+    version     BIGINT NOT NULL DEFAULT 1
+);
+
+-- Token revocations, account locks and password changes, appended by one
+-- worker and replayed by every other (account_events.py). Workers read rows
+-- past the last id they saw; rows are pruned once expires has passed.
+CREATE TABLE IF NOT EXISTS account_events (
+    id          BIGSERIAL PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    subject     TEXT NOT NULL,
+    at          DOUBLE PRECISION NOT NULL,
+    expires     DOUBLE PRECISION,
+    value       TEXT
+);
@@ -0,0 +1,73 @@
+// List endpoints return keyset pages. PageLoader fetches one page at a time:
+// the first on load, the next when the "Load more" button under the table is
+// clicked or scrolled into view. onPage(records) gets everything loaded so far.
+class PageLoader {
+    constructor(url, key, token, onPage, limit = 100) {
+        this.url = url;
+        this.key = key;
+        this.token = token;
+        this.onPage = onPage;
+        this.limit = limit;
+        this.button = null;
+        this.reset();
+    }
+
+    reset() {
+        this.records = [];
+        this.cursor = null;
+        this.done = false;
+        this.loading = false;
+    }
+
+    async next() {
+        if (this.done || this.loading) return;
+        this.loading = true;
+        try {
+            const separator = this.url.includes('?') ? '&' : '?';
+            const pageUrl = `${this.url}${separator}limit=${this.limit}` +
+                (this.cursor ? `&cursor=${encodeURIComponent(this.cursor)}` : '');
+            const response = await fetch(pageUrl, {
+                headers: { 'Authorization': `Bearer ${this.token}` }
+            });
+            if (response.status === 401) {
+                // expired or revoked: sign in again
+                localStorage.clear();
+                window.location.href = '/login';
+                return;
+            }
+            if (!response.ok) {
+                throw new Error(`${this.url}: HTTP ${response.status}`);
+            }
+            const data = await response.json();
+            this.records.push(...data[this.key]);
+            this.cursor = data.next_cursor;
+            this.done = !this.cursor;
+            this.onPage(this.records);
+        } finally {
+            this.loading = false;
+            if (this.button) this.button.style.display = this.done ? 'none' : '';
+        }
+    }
+
+    // Put the "Load more" button after element (the table)
+    attach(element) {
+        this.button = document.createElement('button');
+        this.button.className = 'btn';
+        this.button.textContent = 'Load more';
+        this.button.style.display = this.done ? 'none' : '';
+        const more = () => this.next().catch(error => console.error('Error:', error));
+        this.button.addEventListener('click', more);
+        element.after(this.button);
+        if (window.IntersectionObserver) {
+            new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) more();
+            }).observe(this.button);
+        }
+        return this;
+    }
+
+    // A count or sum over the loaded records, with a + while more pages remain
+    count(n) {
+        return this.done ? `${n}` : `${n}+`;
+    }
+}
@@ -0,0 +1,50 @@
+// Server-Sent Events feed. The stream is opened with a single-use ticket from
+// POST /api/stream/ticket, never the bearer token (it would end up in logs).
+// A ticket is spent by the connection it opens, so EventSource's own reconnect
+// cannot be used: on an error the feed is reopened with a fresh ticket, passing
+// the last event id so missed events are replayed (or a reset is sent).
+// listeners maps event names to handlers, e.g. {incidents: e => ..., reset: () => ...}
+function openStream(topics, token, listeners, retryMs = 5000) {
+    let feed = null;
+    let lastEventId = null;
+
+    async function open() {
+        let response;
+        try {
+            response = await fetch('/api/stream/ticket', {
+                method: 'POST',
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
+        } catch (error) {
+            setTimeout(open, retryMs);
+            return;
+        }
+        if (response.status === 401) {
+            // expired or revoked: sign in again
+            localStorage.clear();
+            window.location.href = '/login';
+            return;
+        }
+        if (!response.ok) {
+            setTimeout(open, retryMs);
+            return;
+        }
+        const { ticket } = await response.json();
+        let url = `/api/stream?topics=${encodeURIComponent(topics)}&ticket=${encodeURIComponent(ticket)}`;
+        if (lastEventId !== null) url += `&last_event_id=${encodeURIComponent(lastEventId)}`;
+        feed = new EventSource(url);
+        for (const [name, listener] of Object.entries(listeners)) {
+            feed.addEventListener(name, e => {
+                if (e.lastEventId) lastEventId = e.lastEventId;
+                listener(e);
+            });
+        }
+        feed.onerror = () => {
+            feed.close();
+            setTimeout(open, retryMs);
+        };
+    }
+
+    open();
+    return { close: () => feed && feed.close() };
+}
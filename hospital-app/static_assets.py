@@ -0,0 +1,225 @@
+"""
+Precompiled pages and precompressed static assets
+Role pages have no per-request data, so they are rendered once at startup and
+kept alongside their gzip/brotli encodings. Static files are served from
+gzip/brotli variants written at build time by
+
+    python3 static_assets.py static
+
+chosen by Accept-Encoding. Asset URLs carry a content fingerprint (?v=...)
+so they can be cached as immutable. Any other HTML is compressed on the fly
+above HTML_COMPRESS_MIN_SIZE.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from response_cache import etag_matches
+
+try:
+    import brotli
+except ImportError:  # brotli variants are skipped, gzip still works
+    brotli = None
+
+HTML_COMPRESS_MIN_SIZE = int(os.getenv("HTML_COMPRESS_MIN_SIZE", "1024"))
+COMPRESSIBLE = (".css", ".js", ".html", ".svg", ".json", ".txt", ".map")
+# Preference order when the client accepts several
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11)
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def available_encodings():
+    return [e for e in SUFFIXES if e != "br" or brotli is not None]
+
+
+def negotiate_encoding(accept_encoding: str, available) -> str:
+    """Best of `available` acceptable to the client, or None for identity"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name] = q
+    for encoding in available:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def precompress_dir(directory: str):
+    """Write .gz (and .br, if brotli is installed) next to every compressible file"""
+    written = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                body = f.read()
+            for encoding in available_encodings():
+                variant = path + SUFFIXES[encoding]
+                with open(variant, "wb") as f:
+                    f.write(compress(body, encoding))
+                written.append(variant)
+    return written
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves prebuilt .br/.gz variants and fingerprinted URLs"""
+
+    def __init__(self, *args, prefix: str = "/static", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prefix = prefix
+        self._fingerprints = {}
+
+    def fingerprint(self, full_path: str) -> str:
+        stat = os.stat(full_path)
+        key = (full_path, stat.st_mtime_ns, stat.st_size)
+        digest = self._fingerprints.get(key)
+        if digest is None:
+            with open(full_path, "rb") as f:
+                digest = self._fingerprints[key] = hashlib.sha256(f.read()).hexdigest()[:12]
+        return digest
+
+    def url(self, path: str) -> str:
+        """Versioned URL for templates: static_url('css/main.css')"""
+        full_path, _ = self.lookup_path(path)
+        return f"{self.prefix}/{path}?v={self.fingerprint(full_path)}"
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        variants = {}
+        for encoding, suffix in SUFFIXES.items():
+            try:
+                variant_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            # a variant older than its source is stale, ignore it
+            if variant_stat.st_mtime_ns >= stat_result.st_mtime_ns:
+                variants[encoding] = variant_stat
+        encoding = negotiate_encoding(request_headers.get("accept-encoding", ""), list(variants))
+
+        media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        if encoding is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result,
+                                    media_type=media_type, method=scope["method"])
+        else:
+            response = FileResponse(full_path + SUFFIXES[encoding], status_code=status_code,
+                                    stat_result=variants[encoding], media_type=media_type,
+                                    method=scope["method"])
+            response.headers["content-encoding"] = encoding
+        response.headers["vary"] = "Accept-Encoding"
+        version = QueryParams(scope.get("query_string", b"")).get("v")
+        immutable = version is not None and version == self.fingerprint(full_path)
+        response.headers["cache-control"] = IMMUTABLE if immutable else REVALIDATE
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class Page:
+    def __init__(self, html: str):
+        self.body = html.encode()
+        self.etag = hashlib.sha256(self.body).hexdigest()[:16]
+        self.variants = {e: compress(self.body, e) for e in available_encodings()}
+
+
+class PageCache:
+    """Templates rendered once; served with ETags and the client's best encoding"""
+
+    def __init__(self, templates, names, **context):
+        self.pages = {name: Page(templates.get_template(name).render(**context)) for name in names}
+
+    def response(self, request: Request, name: str) -> Response:
+        page = self.pages[name]
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), list(page.variants))
+        # each encoding is a different representation, so it gets its own ETag
+        etag = f'"{page.etag}-{encoding}"' if encoding else f'"{page.etag}"'
+        headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+        if encoding is None:
+            return Response(page.body, media_type="text/html; charset=utf-8", headers=headers)
+        headers["Content-Encoding"] = encoding
+        return Response(page.variants[encoding], media_type="text/html; charset=utf-8", headers=headers)
+
+
+class HtmlCompressionMiddleware:
+    """gzip text/html responses over min_size that are not already encoded.
+
+    Unlike GZipMiddleware this leaves JSON and event streams untouched.
+    """
+
+    def __init__(self, app, min_size: int = HTML_COMPRESS_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        if negotiate_encoding(accept, ["gzip"]) is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        chunks = []
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (headers.get("content-type", "").startswith("text/html")
+                        and "content-encoding" not in headers):
+                    start = message  # hold until the body is complete
+                    return
+            elif message["type"] == "http.response.body" and start is not None:
+                chunks.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    return
+                await self._send_buffered(start, b"".join(chunks), send)
+                return
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _send_buffered(self, start, body, send):
+        headers = [(k, v) for k, v in start["headers"] if k.lower() != b"content-length"]
+        if len(body) >= self.min_size:
+            body = gzip.compress(body, compresslevel=6)
+            headers.append((b"content-encoding", b"gzip"))
+            headers.append((b"vary", b"Accept-Encoding"))
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({**start, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+    if brotli is None:
+        print("brotli not installed, writing gzip variants only (pip install brotli)")
+    for path in precompress_dir(target):
+        print(f"  {path}  {os.path.getsize(path)} bytes")
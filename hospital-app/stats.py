@@ -0,0 +1,132 @@
+"""
+Incrementally maintained hospital statistics
+Every write to a tracked record removes its old contribution and adds the new
+one, so reading the stats never touches the underlying collections.
+"""
+import threading
+from collections import defaultdict
+
+UNASSIGNED = "Unassigned"
+
+
+class HospitalStats:
+    def __init__(self, department_of=None):
+        # staff name -> department, used to attribute records to a department
+        self.department_of = department_of or {}
+        self._counts = defaultdict(float)
+        self._lock = threading.RLock()
+
+    def _department(self, staff_name):
+        return self.department_of.get(staff_name, UNASSIGNED)
+
+    def _contributions(self, kind, record):
+        """(counter, label) -> amount pairs a single record adds to the totals"""
+        if kind == "patient":
+            return [
+                (("patients", None), 1),
+                (("patients_by_department", self._department(record.get("doctor"))), 1),
+            ]
+        if kind == "lab_order":
+            return [
+                (("lab_orders", None), 1),
+                (("lab_orders_by_status", record.get("status")), 1),
+                (("lab_orders_by_department", self._department(record.get("ordered_by"))), 1),
+            ]
+        if kind == "invoice":
+            return [
+                (("invoices", None), 1),
+                (("invoices_by_status", record.get("status")), 1),
+                (("revenue", None), record.get("total", 0)),
+                (("outstanding_balance", None), record.get("patient_balance", 0)),
+            ]
+        if kind == "appointment":
+            return [
+                (("appointments", None), 1),
+                (("appointments_by_status", record.get("status")), 1),
+                (("appointments_by_department", self._department(record.get("doctor"))), 1),
+            ]
+        raise ValueError(f"Unknown record kind: {kind}")
+
+    def _apply(self, kind, record, sign):
+        for key, amount in self._contributions(kind, record):
+            self._counts[key] += sign * amount
+            if abs(self._counts[key]) < 1e-9:
+                del self._counts[key]
+
+    def add(self, kind, record):
+        with self._lock:
+            self._apply(kind, record, 1)
+
+    def remove(self, kind, record):
+        with self._lock:
+            self._apply(kind, record, -1)
+
+    def update(self, kind, record, **changes):
+        """Mutate a tracked record in place and adjust the totals"""
+        with self._lock:
+            self._apply(kind, record, -1)
+            record.update(changes)
+            self._apply(kind, record, 1)
+        return record
+
+    def observer(self, kind):
+        """Change callback (before, after) for stores that notify on writes"""
+        def on_change(before, after):
+            with self._lock:
+                if before is not None:
+                    self._apply(kind, before, -1)
+                if after is not None:
+                    self._apply(kind, after, 1)
+        return on_change
+
+    def count(self, counter, label=None):
+        return self._counts.get((counter, label), 0)
+
+    def _grouped(self, counter):
+        return {label: int(v) for (name, label), v in self._counts.items() if name == counter}
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "total_patients": int(self.count("patients")),
+                "pending_lab_orders": int(self.count("lab_orders_by_status", "Pending")),
+                "total_lab_orders": int(self.count("lab_orders")),
+                "total_invoices": int(self.count("invoices")),
+                "total_revenue": round(self.count("revenue"), 2),
+                "outstanding_balance": round(self.count("outstanding_balance"), 2),
+                "appointments_today": int(self.count("appointments")),
+                "by_department": {
+                    "patients": self._grouped("patients_by_department"),
+                    "lab_orders": self._grouped("lab_orders_by_department"),
+                    "appointments": self._grouped("appointments_by_department"),
+                },
+                "by_status": {
+                    "lab_orders": self._grouped("lab_orders_by_status"),
+                    "invoices": self._grouped("invoices_by_status"),
+                    "appointments": self._grouped("appointments_by_status"),
+                },
+            }
+
+    @classmethod
+    def from_collections(cls, collections, department_of=None):
+        """Build stats from scratch; collections maps kind -> iterable of records"""
+        stats = cls(department_of)
+        for kind, records in collections.items():
+            for record in records:
+                stats.add(kind, record)
+        return stats
+
+    def drift(self, collections):
+        """Recompute from scratch and report every counter that disagrees"""
+        fresh = HospitalStats.from_collections(collections, self.department_of)
+        with self._lock:
+            keys = set(self._counts) | set(fresh._counts)
+            report = {}
+            for key in keys:
+                maintained = round(self._counts.get(key, 0), 2)
+                recomputed = round(fresh._counts.get(key, 0), 2)
+                if maintained != recomputed:
+                    counter, label = key
+                    name = counter if label is None else f"{counter}[{label}]"
+                    report[name] = {"maintained": maintained, "recomputed": recomputed}
+        return report
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The app and the incident responder use flat imports from their own directories
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+for path in (APP_DIR, os.path.join(APP_DIR, "incident-response")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
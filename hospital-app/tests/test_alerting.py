@@ -0,0 +1,101 @@
+import threading
+import time
+
+from alerting import Deduplicator, NotificationDispatcher, notification_settings
+
+
+def test_repeats_fold_into_the_open_incident():
+    dedupe = Deduplicator(suppress_seconds=60)
+    assert dedupe.seen("geo:ip:203.0.113.7", "geo", 0) is None
+    dedupe.open("geo:ip:203.0.113.7", {"type": "GEO_VIOLATION"}, 0)
+    for now in (10, 50, 100):
+        entry = dedupe.seen("geo:ip:203.0.113.7", "geo", now)
+    assert entry.occurrences == 4
+    assert entry.last_seen == 100
+    assert dedupe.seen("geo:ip:198.51.100.1", "geo", 100) is None
+
+
+def test_incident_closes_only_after_a_quiet_window():
+    dedupe = Deduplicator(suppress_seconds=60)
+    dedupe.open("a", {"id": "a"}, 0)
+    dedupe.open("b", {"id": "b"}, 0, suppress_seconds=300)  # rule's own window
+    dedupe.seen("a", "rule", 50)
+
+    assert dedupe.expire(60) == []  # a fired again at 50, so it is rescheduled
+    closed = dedupe.expire(110)
+    assert [e.incident["id"] for e in closed] == ["a"]
+    assert closed[0].occurrences == 2
+    assert len(dedupe) == 1
+    assert dedupe.seen("a", "rule", 120) is None  # closed: the next firing is a new incident
+
+    assert [e.incident["id"] for e in dedupe.expire(300)] == ["b"]
+    assert len(dedupe) == 0
+
+
+def test_seen_after_expiry_but_before_expire_is_a_new_incident():
+    dedupe = Deduplicator(suppress_seconds=60)
+    dedupe.open("a", {}, 0)
+    assert dedupe.seen("a", "rule", 60) is None
+
+
+def test_settings_fill_defaults():
+    settings = notification_settings({"notifications": {"per_minute": 2}})
+    assert settings["per_minute"] == 2
+    assert settings["batch_seconds"] == 10
+    assert notification_settings({})["max_batch"] == 50
+
+
+class Recorder:
+    def __init__(self, fail_first=False):
+        self.digests = []
+        self.fail_first = fail_first
+        self.sent = threading.Event()
+
+    def __call__(self, incidents):
+        if self.fail_first:
+            self.fail_first = False
+            raise RuntimeError("smtp down")
+        self.digests.append([i["id"] for i in incidents])
+        self.sent.set()
+
+
+def test_burst_is_one_digest_split_at_max_batch():
+    recorder = Recorder()
+    dispatcher = NotificationDispatcher(recorder, batch_seconds=0.2, max_batch=3, per_minute=60)
+    for i in range(5):
+        dispatcher.submit({"id": i})
+    dispatcher.close()
+    assert recorder.digests == [[0, 1, 2], [3, 4]]
+
+
+def test_over_the_rate_limit_incidents_wait_in_one_digest():
+    recorder = Recorder()
+    dispatcher = NotificationDispatcher(recorder, batch_seconds=0.05, per_minute=1)
+    dispatcher.submit({"id": 0})
+    assert recorder.sent.wait(2)
+    for i in range(1, 4):
+        dispatcher.submit({"id": i})
+    # no token for a minute: nothing more goes out until close() flushes it
+    time.sleep(0.2)
+    assert recorder.digests == [[0]]
+    dispatcher.close()
+    assert recorder.digests == [[0], [1, 2, 3]]
+
+
+def test_failed_send_does_not_stop_the_worker():
+    recorder = Recorder(fail_first=True)
+    dispatcher = NotificationDispatcher(recorder, batch_seconds=0.05, per_minute=60)
+    dispatcher.submit({"id": 0})
+    time.sleep(0.2)
+    dispatcher.submit({"id": 1})
+    dispatcher.close()
+    assert recorder.digests == [[1]]
+
+
+def test_full_queue_drops_instead_of_blocking():
+    gate = threading.Event()
+    dispatcher = NotificationDispatcher(lambda incidents: gate.wait(2), batch_seconds=0, max_queued=2)
+    for i in range(10):
+        dispatcher.submit({"id": i})  # returns at once even though the worker is stuck
+    gate.set()
+    dispatcher.close()
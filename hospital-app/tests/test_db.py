@@ -0,0 +1,55 @@
+import os
+import uuid
+
+import pytest
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="needs DATABASE_URL pointing at a scratch PostgreSQL")
+
+
+@pytest.fixture
+def store():
+    from db import Database, DocumentStore
+    database = Database(DATABASE_URL, minconn=1, maxconn=2)
+    table = f"test_docs_{uuid.uuid4().hex[:8]}"
+    with database.transaction() as cur:
+        cur.execute(f"CREATE TABLE {table} (id TEXT PRIMARY KEY, data JSONB NOT NULL, version BIGINT NOT NULL DEFAULT 1)")
+    store = DocumentStore(database, table)
+    store.other = DocumentStore(database, table)  # a second worker on the same table
+    yield store
+    with database.transaction() as cur:
+        cur.execute(f"DROP TABLE {table}")
+    database.close()
+
+
+def test_insert_then_update(store):
+    store.insert_many([{"id": "L1", "status": "Pending"}, {"id": "L2", "status": "Pending"}])
+    assert store.update_many([{"id": "L2", "status": "Completed"}]) == []
+    assert store.count() == 2
+    assert store.all() == [{"id": "L1", "status": "Pending"}, {"id": "L2", "status": "Completed"}]
+
+
+def test_insert_of_a_taken_id_writes_nothing(store):
+    from db import IdTaken
+    store.insert_many([{"id": "L1"}])
+    with pytest.raises(IdTaken) as taken:
+        store.other.insert_many([{"id": "L2"}, {"id": "L1", "status": "Pending"}])
+    assert taken.value.ids == ["L1"]
+    assert store.all() == [{"id": "L1"}]
+
+
+def test_update_from_a_stale_copy_is_refused(store):
+    store.insert_many([{"id": "L1", "status": "Pending"}, {"id": "L2", "status": "Pending"}])
+    store.other.all()
+    assert store.update_many([{"id": "L1", "status": "Completed"}]) == []
+    # the other worker still holds version 1 of L1
+    assert store.other.update_many([{"id": "L1", "status": "Cancelled"}, {"id": "L2", "status": "Cancelled"}]) == ["L1"]
+    assert store.other.get("L1") == {"id": "L1", "status": "Completed"}
+    assert store.other.update_many([{"id": "L1", "status": "Cancelled"}]) == []
+    assert store.get("L2") == {"id": "L2", "status": "Cancelled"}
+
+
+def test_delete(store):
+    store.insert_many([{"id": "L1"}])
+    store.delete("L1")
+    assert store.all() == []
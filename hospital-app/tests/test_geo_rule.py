@@ -0,0 +1,75 @@
+import pytest
+from starlette.requests import Request
+
+import rule_engine
+from auth_events import client_region
+from rule_engine import GeoRule, RuleEngine, allowed_states
+
+SECRET = "edge-secret"
+GEO_RULE = {"name": "Unauthorized Geographic Access", "allowed_states": [], "window_minutes": 60}
+
+
+def request(headers):
+    scope = {"type": "http", "method": "POST", "path": "/api/auth/login",
+             "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]}
+    return Request(scope)
+
+
+def event(state, ip="203.0.113.7", ts=1000.0):
+    return {"type": "login_success", "username": "dr.smith", "ip": ip, "state": state, "ts": ts}
+
+
+def engine(monkeypatch, states, alerts=None):
+    monkeypatch.setattr(rule_engine, "ALLOWED_STATES", states)
+    fired = []
+    e = RuleEngine({"alerts": alerts or {"geo_violation": GEO_RULE}}, "http://prometheus:9090",
+                   lambda rule, group, key, details: fired.append((rule.name, key)))
+    return e, fired
+
+
+def test_deployment_states_replace_the_rule_list(monkeypatch):
+    e, fired = engine(monkeypatch, "CA", {"geo_violation": {**GEO_RULE, "allowed_states": ["NY"]}})
+    e.observe(event("CA"))
+    assert fired == []
+    e.observe(event("NY"))
+    assert fired == [("geo_violation", "203.0.113.7")]
+
+
+def test_rule_without_allowed_states_is_disabled(monkeypatch):
+    e, fired = engine(monkeypatch, None)
+    assert e.geo_rules == []
+    e.observe(event("TX"))
+    assert fired == []
+
+
+def test_allowed_states_parsing():
+    assert allowed_states({"allowed_states": ["ny"]}) == {"NY"}
+    assert allowed_states({"allowed_states": ["NY"]}, " ca, tx ,") == {"CA", "TX"}
+    assert allowed_states({"allowed_states": ["NY"]}, "") == set()
+
+
+def test_geo_rule_fires_once_per_ip_per_window():
+    rule = GeoRule("geo_violation", GEO_RULE, {"CA"})
+    assert rule.check(event("NV", ts=0))
+    assert not rule.check(event("NV", ts=60))
+    assert rule.check(event("NV", ts=3600))
+    assert not rule.check(event(None))
+
+
+def test_region_header_trusted_only_from_the_edge():
+    geo = {"cloudfront-viewer-country-region": "NV"}
+    assert client_region(request(geo), SECRET) is None
+    assert client_region(request({**geo, "x-origin-verify": "guess"}), SECRET) is None
+    assert client_region(request({**geo, "x-origin-verify": SECRET}), SECRET) == "NV"
+    # no secret configured: the header is never trusted
+    assert client_region(request({**geo, "x-origin-verify": ""}), "") is None
+
+
+def test_actions_must_have_a_group_to_act_on(monkeypatch):
+    rule = {"event": "mfa_failed", "threshold": 3, "window_minutes": 5}
+    engine(monkeypatch, "CA", {"mfa": {**rule, "group_by": ["username", "ip"], "action": "block_ip"}})
+    for bad in ({**rule, "group_by": ["username"], "action": "block_ip"},
+                {**rule, "action": "lock_acount"},
+                {**GEO_RULE, "action": "lock_account"}):
+        with pytest.raises(ValueError):
+            engine(monkeypatch, "CA", {"bad": bad})
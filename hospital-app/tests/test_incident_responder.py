@@ -0,0 +1,62 @@
+import os
+
+from incident_responder import IncidentResponder
+
+RULES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                     "incident-response", "alert_rules.yml")
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def responder(tmp_path):
+    clock = Clock()
+    r = IncidentResponder(config_file=RULES, clock=clock,
+                          blocklist_journal=str(tmp_path / "blocklist.journal"),
+                          incidents_dir=str(tmp_path / "incidents"))
+    r.send_alert = lambda incident: None
+    return r, clock
+
+
+def failures(r, clock, event_type, count, username, ip):
+    for _ in range(count):
+        clock.now += 1
+        r.engine.observe({"type": event_type, "username": username, "ip": ip, "ts": clock.now})
+
+
+def test_failed_logins_lock_the_account_but_never_block_the_ip(tmp_path):
+    r, clock = responder(tmp_path)
+    failures(r, clock, "login_failed", 5, "dr.smith", "198.51.100.7")
+    assert r.blocks.until("account", "dr.smith") is not None
+    assert r.blocks.count("ip") == 0
+
+    # password spraying: one address, many accounts, crosses the ip window
+    for i in range(5):
+        failures(r, clock, "login_failed", 1, f"user{i}", "203.0.113.9")
+    assert r.blocks.count("ip") == 0
+    sprayed = [i for i in r.incidents.query(limit=10) if i.get("ip") == "203.0.113.9"]
+    assert [i["action_taken"] for i in sprayed] == [["Admin notified"]]
+    r.notifier.close()
+    r.incidents.close()
+
+
+def test_mfa_brute_force_blocks_only_the_attacking_address(tmp_path):
+    r, clock = responder(tmp_path)
+    # one account, codes tried from many addresses: notify, block nobody
+    for i in range(10):
+        failures(r, clock, "mfa_failed", 1, "dr.smith", f"198.51.100.{i}")
+    assert r.blocks.count("ip") == 0
+    assert r.blocks.until("account", "dr.smith") is None
+
+    failures(r, clock, "mfa_failed", 10, "nurse.jones", "203.0.113.9")
+    assert r.blocks.until("ip", "203.0.113.9") is not None
+    # the same burst arriving as the load balancer's address is never blocked
+    failures(r, clock, "mfa_failed", 10, "nurse.adams", "10.0.2.15")
+    assert r.blocks.until("ip", "10.0.2.15") is None
+    r.notifier.close()
+    r.incidents.close()
@@ -0,0 +1,131 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+from incident_store import IncidentReader, IncidentStore, list_segments, segment_path
+
+START = datetime(2026, 3, 1, 12, 0, 0)
+
+
+def incident(i, type="EXCESSIVE_FAILED_LOGINS", severity="CRITICAL"):
+    return {"id": i, "timestamp": (START + timedelta(seconds=i)).isoformat(),
+            "type": type, "severity": severity}
+
+
+def ids(incidents):
+    return [i["id"] for i in incidents]
+
+
+def fill(store, n, start=0):
+    for i in range(start, start + n):
+        kind = ("GEO_VIOLATION", "HIGH") if i % 3 == 0 else ("EXCESSIVE_FAILED_LOGINS", "CRITICAL")
+        store.append(incident(i, *kind))
+    store.flush()
+
+
+def test_query_filters_and_limit(tmp_path):
+    store = IncidentStore(str(tmp_path), batch_size=4)
+    fill(store, 30)
+    assert ids(store.query(limit=3)) == [27, 28, 29]
+    assert ids(store.query(limit=3, type="GEO_VIOLATION")) == [21, 24, 27]
+    assert ids(store.query(limit=2, severity="CRITICAL")) == [28, 29]
+    assert ids(store.query(limit=5, type="GEO_VIOLATION", severity="CRITICAL")) == []
+    since = (START + timedelta(seconds=25)).timestamp()
+    assert ids(store.query(since=since, limit=100)) == [26, 27, 28, 29]
+    summary = store.summary()
+    assert summary["total"] == 30
+    assert summary["by_type"] == {"GEO_VIOLATION": 10, "EXCESSIVE_FAILED_LOGINS": 20}
+    store.close()
+
+
+def test_rotation_and_retention(tmp_path):
+    line = len(json.dumps(incident(0)).encode()) + 1
+    store = IncidentStore(str(tmp_path), max_bytes=5 * line, keep=3, batch_size=1)
+    fill(store, 40)
+    # every segment is sealed with its index, and only `keep` remain to be queried
+    segments = list_segments(str(tmp_path))
+    assert len(segments) == 3
+    for seq, path in segments[:-1]:
+        assert os.path.exists(path[:-len(".jsonl")] + ".idx")
+    assert store.summary()["total"] < 40
+    assert ids(store.query(limit=4)) == [36, 37, 38, 39]
+    store.close()
+    # the rest are archived, not deleted
+    archived = list_segments(str(tmp_path / "archive"))
+    assert [seq for seq, _ in archived] == list(range(1, segments[0][0]))
+    lines = sum(len(open(path).readlines()) for _, path in archived + segments)
+    assert lines == 40
+
+
+def test_everything_is_kept_by_default(tmp_path):
+    line = len(json.dumps(incident(0)).encode()) + 1
+    store = IncidentStore(str(tmp_path), max_bytes=5 * line, batch_size=1)
+    fill(store, 40)
+    assert store.summary()["total"] == 40
+    assert not os.path.exists(tmp_path / "archive")
+    store.close()
+
+
+def test_old_incidents_log_is_imported_once(tmp_path):
+    legacy = tmp_path / "incidents.log"
+    legacy.write_text("".join(json.dumps(incident(i)) + "\n" for i in range(3)) + json.dumps(incident(3)))
+    directory = str(tmp_path / "incidents")
+    store = IncidentStore(directory)
+    fill(store, 2, start=4)
+    assert ids(store.query(limit=10)) == [0, 1, 2, 3, 4, 5]
+    store.close()
+    assert legacy.exists()
+
+    store = IncidentStore(directory)  # already imported: not again
+    assert store.summary()["total"] == 6
+    store.close()
+
+
+def test_restart_seals_the_open_segment_and_keeps_appending(tmp_path):
+    store = IncidentStore(str(tmp_path))
+    fill(store, 10)
+    store.close()
+    assert not os.path.exists(segment_path(str(tmp_path), 1)[:-len(".jsonl")] + ".idx")
+
+    store = IncidentStore(str(tmp_path))
+    assert os.path.exists(segment_path(str(tmp_path), 1)[:-len(".jsonl")] + ".idx")
+    fill(store, 5, start=10)
+    assert ids(store.query(limit=7)) == [8, 9, 10, 11, 12, 13, 14]
+    store.close()
+
+
+def test_reader_loads_sealed_indexes_and_tails_the_open_segment(tmp_path):
+    line = len(json.dumps(incident(0)).encode()) + 1
+    store = IncidentStore(str(tmp_path), max_bytes=10 * line, batch_size=1)
+    reader = IncidentReader(str(tmp_path))
+    fill(store, 25)
+    assert ids(reader.read(limit=30)) == list(range(25))
+
+    fill(store, 3, start=25)
+    assert ids(reader.read(limit=4)) == [24, 25, 26, 27]
+    assert reader.summary()["total"] == 28
+    since = (START + timedelta(seconds=26)).isoformat()
+    assert ids(reader.read(since=since, limit=10)) == [27]
+    store.close()
+
+
+def test_torn_lines_are_skipped(tmp_path):
+    path = segment_path(str(tmp_path), 1)
+    with open(path, "wb") as f:
+        f.write(json.dumps(incident(0)).encode() + b"\n")
+        f.write(b'{"id": 1, "timestamp": "2026-03-01T12:0\n')  # crash mid-write, then restart
+        f.write(json.dumps(incident(2)).encode() + b"\n")
+        f.write(b'{"id": 3, "time')  # still being written
+
+    reader = IncidentReader(str(tmp_path))
+    assert ids(reader.read(limit=10)) == [0, 2]
+
+    with open(path, "ab") as f:
+        f.write(b'stamp": "%s", "type": "GEO_VIOLATION", "severity": "HIGH"}\n'
+                % (START + timedelta(seconds=3)).isoformat().encode())
+    assert ids(reader.read(limit=10)) == [0, 2, 3]
+    assert ids(reader.read(limit=10, type="GEO_VIOLATION")) == [3]
+
+    store = IncidentStore(str(tmp_path))
+    assert ids(store.query(limit=10)) == [0, 2, 3]
+    store.close()
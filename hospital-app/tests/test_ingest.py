@@ -0,0 +1,59 @@
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from ingest import ingest
+
+
+class Reading(BaseModel):
+    patient_id: str
+    value: int
+
+
+def client(applied, max_records=5, chunk_size=2):
+    app = FastAPI()
+
+    def apply_chunk(items):
+        applied.extend(index for index, _ in items)
+        return [{"index": index, "status": "created"} for index, _ in items]
+
+    @app.post("/bulk")
+    async def bulk(request: Request):
+        return await ingest(request, Reading, apply_chunk, chunk_size=chunk_size, max_records=max_records)
+
+    return TestClient(app)
+
+
+def records(n):
+    return [{"patient_id": f"P{i:03d}", "value": i} for i in range(n)]
+
+
+def test_oversized_json_array_is_refused_before_anything_is_applied():
+    applied = []
+    response = client(applied).post("/bulk", json=records(6))
+    assert response.status_code == 413
+    assert applied == []
+
+
+def test_oversized_ndjson_stream_reports_what_was_applied_and_where_it_stopped():
+    applied = []
+    body = "\n".join(json.dumps(r) for r in records(8)) + "\n"
+    response = client(applied).post("/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["truncated_at"] == 5
+    assert applied == [0, 1, 2, 3, 4]
+    assert [r["index"] for r in data["results"]] == applied
+
+
+def test_stream_within_the_limit_has_one_result_per_record():
+    applied = []
+    lines = [json.dumps(r) for r in records(3)] + ["{not json", json.dumps({"patient_id": "P9"})]
+    response = client(applied).post("/bulk", content="\n".join(lines),
+                                    headers={"content-type": "application/x-ndjson"})
+    data = response.json()
+    assert "truncated_at" not in data
+    assert data["summary"] == {"created": 3, "invalid": 2}
+    assert [r["index"] for r in data["results"]] == [0, 1, 2, 3, 4]
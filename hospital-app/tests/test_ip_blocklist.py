@@ -0,0 +1,190 @@
+import asyncio
+
+from starlette.responses import PlainTextResponse
+
+from blocklist import BlockStore, allowlist_networks
+from ip_blocklist import BlocklistFile, BlocklistMiddleware, IpBlocklist
+
+NOW = 1_000_000.0
+LATER = NOW + 3600
+
+
+def test_hosts_and_ranges():
+    bl = IpBlocklist()
+    assert bl.add("198.51.100.7", LATER)
+    assert bl.add("203.0.113.0/24", LATER)
+    assert bl.add("10.0.0.0/13", LATER)  # ends mid-byte
+    assert bl.add("2001:db8::/32", LATER)
+    assert not bl.add("not-an-ip", LATER)
+    assert not bl.add("300.0.0.0/8", LATER)
+
+    blocked = ["198.51.100.7", "203.0.113.0", "203.0.113.255", "10.0.0.1", "10.7.255.255",
+               "2001:db8::1", "2001:db8:ffff::", "::ffff:198.51.100.7"]
+    allowed = ["198.51.100.8", "203.0.114.1", "10.8.0.0", "2001:db9::1", "garbage"]
+    assert [ip for ip in blocked if not bl.is_blocked(ip, NOW)] == []
+    assert [ip for ip in allowed if bl.is_blocked(ip, NOW)] == []
+
+
+def test_block_lapses_at_its_expiry_and_longest_block_wins():
+    bl = IpBlocklist()
+    bl.add("203.0.113.0/24", NOW + 60)
+    bl.add("203.0.113.0/25", NOW + 600)
+    bl.add("203.0.113.9", NOW + 30)
+    assert bl.blocked_until("203.0.113.9") == NOW + 600
+    assert bl.blocked_until("203.0.113.200") == NOW + 60
+    assert bl.is_blocked("203.0.113.200", NOW + 59)
+    assert not bl.is_blocked("203.0.113.200", NOW + 60)
+
+
+def test_everything_range():
+    bl = IpBlocklist()
+    bl.add("0.0.0.0/0", LATER)
+    assert bl.is_blocked("192.0.2.1", NOW)
+    assert not bl.is_blocked("2001:db8::1", NOW)
+
+
+def test_tails_the_responder_journal(tmp_path):
+    path = str(tmp_path / "blocklist.journal")
+    store = BlockStore(path, now=NOW)
+    follower = BlocklistFile(path)
+    follower.refresh()
+    assert len(follower.current) == 0
+
+    store.add("ip", "198.51.100.7", LATER)
+    store.add("account", "dr.smith", LATER)
+    store.flush()
+    follower.refresh()
+    first = follower.current
+    assert first.is_blocked("198.51.100.7", NOW)
+    assert len(first) == 1  # account locks are not IP blocks
+
+    store.add("ip", "203.0.113.0/24", LATER)
+    store.flush()
+    follower.refresh()
+    assert follower.current is first  # appended lines are applied in place
+    assert follower.current.is_blocked("203.0.113.50", NOW)
+    store.close()
+
+
+def test_torn_line_waits_for_its_newline(tmp_path):
+    path = tmp_path / "blocklist.journal"
+    path.write_text('["ip", "198.51.100.7", %r]\n["ip", "203.0.1' % LATER)
+    follower = BlocklistFile(str(path))
+    follower.refresh()
+    assert follower.current.is_blocked("198.51.100.7", NOW)
+    assert len(follower.current) == 1
+
+    with open(path, "a") as f:
+        f.write('13.9", %r]\nnot json\n' % LATER)
+    follower.refresh()
+    assert follower.current.is_blocked("203.0.113.9", NOW)
+    assert len(follower.current) == 2
+
+
+def test_compaction_rebuilds_without_released_blocks(tmp_path):
+    path = str(tmp_path / "blocklist.journal")
+    store = BlockStore(path, now=NOW)
+    store.add("ip", "198.51.100.7", NOW + 10)
+    store.add("ip", "203.0.113.9", LATER)
+    store.flush()
+    follower = BlocklistFile(path)
+    follower.refresh()
+    old = follower.current
+
+    store.expire(NOW + 10)
+    store.compact()
+    follower.refresh()
+    assert follower.current is not old
+    assert not follower.current.is_blocked("198.51.100.7", NOW)
+    assert follower.current.is_blocked("203.0.113.9", NOW)
+    store.close()
+
+
+def test_journal_removed_clears_the_list(tmp_path):
+    path = tmp_path / "blocklist.journal"
+    path.write_text('["ip", "198.51.100.7", %r]\n' % LATER)
+    follower = BlocklistFile(str(path))
+    follower.refresh()
+    path.unlink()
+    follower.refresh()
+    assert len(follower.current) == 0
+
+
+def call(app, host):
+    """Status code of a GET / from `host`, driven straight through the ASGI app"""
+    scope = {"type": "http", "method": "GET", "path": "/", "raw_path": b"/", "root_path": "",
+             "query_string": b"", "headers": [], "client": (host, 5000), "server": ("testserver", 80),
+             "scheme": "http", "http_version": "1.1"}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"]
+
+
+def test_middleware_rejects_blocked_clients(tmp_path):
+    path = tmp_path / "blocklist.journal"
+    path.write_text('["ip", "192.0.2.0/24", 9999999999]\n')
+    follower = BlocklistFile(str(path))
+    app = BlocklistMiddleware(PlainTextResponse("ok"), blocklist=follower, enforce=True)
+
+    assert call(app, "192.0.2.1") == 200  # not loaded yet
+    follower.refresh()
+    assert call(app, "192.0.2.1") == 403
+    assert call(app, "198.51.100.1") == 200
+
+
+class Counted:
+    def __init__(self):
+        self.modes = []
+
+    def labels(self, mode):
+        self.modes.append(mode)
+        return self
+
+    def inc(self):
+        pass
+
+
+def test_middleware_only_reports_until_enforcing(tmp_path):
+    path = tmp_path / "blocklist.journal"
+    path.write_text('["ip", "192.0.2.0/24", 9999999999]\n')
+    follower = BlocklistFile(str(path))
+    follower.refresh()
+    counter = Counted()
+    app = BlocklistMiddleware(PlainTextResponse("ok"), blocklist=follower, blocked_counter=counter)
+    assert call(app, "192.0.2.1") == 200
+    assert counter.modes == ["report"]
+
+
+def test_proxy_and_private_ranges_are_never_blocked(tmp_path):
+    path = str(tmp_path / "blocklist.journal")
+    store = BlockStore(path, now=NOW, allowlist=allowlist_networks(["130.176.0.0/16"]))
+    for ip in ("10.0.2.15", "172.31.4.4", "127.0.0.1", "::1", "130.176.12.34", "0.0.0.0/0", "10.0.0.0/16"):
+        assert not store.add("ip", ip, LATER), ip
+    assert store.add("ip", "198.51.100.7", LATER)
+    assert store.add("account", "10.0.2.15", LATER)  # usernames are not addresses
+    assert store.count("ip") == 1
+    store.close()
+
+
+def test_allowlisted_blocks_in_an_old_journal_are_dropped_on_load(tmp_path):
+    path = tmp_path / "blocklist.journal"
+    path.write_text('["ip", "10.0.2.15", %r]\n["ip", "198.51.100.7", %r]\n' % (LATER, LATER))
+    store = BlockStore(str(path), now=NOW)
+    assert store.until("ip", "10.0.2.15") is None
+    assert store.until("ip", "198.51.100.7") == LATER
+    store.close()
+
+
+def test_account_locks_in_force_are_handed_on(tmp_path):
+    path = tmp_path / "blocklist.journal"
+    path.write_text('["account", "dr.smith", 9999999999]\n["account", "nurse.jones", 1]\n')
+    locked = []
+    BlocklistFile(str(path), on_account=lambda username, until: locked.append(username)).refresh()
+    assert locked == ["dr.smith"]
@@ -0,0 +1,52 @@
+from pagination import decode_cursor, id_key, keyset_page, record_key
+from patient_repository import PatientRepository
+
+
+def walk(page):
+    seen, cursor = [], None
+    while True:
+        records, cursor = page(cursor)
+        seen.extend(r["id"] for r in records)
+        if cursor is None:
+            return seen
+
+
+def test_ids_order_by_number_not_text():
+    assert id_key("L999") < id_key("L1000")
+    assert id_key(9) < id_key(10)
+    assert id_key("9") == id_key(9)
+
+
+def test_keyset_pages_cross_digit_boundaries():
+    records = [{"id": f"L{i}"} for i in range(1, 1201)]
+    assert walk(lambda cursor: keyset_page(records, cursor, 50)) == [r["id"] for r in records]
+
+
+def test_integer_ids_with_a_bare_id_cursor():
+    records = [{"id": i} for i in range(1, 120)]
+    page, cursor = keyset_page(records, "9", 5)
+    assert [r["id"] for r in page] == [10, 11, 12, 13, 14]
+    assert decode_cursor(cursor) == record_key({"id": 14})
+
+
+def test_ids_sharing_an_id_key_are_not_skipped():
+    records = sorted(({"id": i} for i in ("P7", "P007", "P07", "P8")), key=record_key)
+    assert walk(lambda cursor: keyset_page(records, cursor, 1)) == ["P007", "P07", "P7", "P8"]
+    repo = PatientRepository(records)
+    assert walk(lambda cursor: repo.page(cursor, 1)) == ["P007", "P07", "P7", "P8"]
+    repo.remove("P07")
+    assert walk(lambda cursor: repo.page(cursor, 2)) == ["P007", "P7", "P8"]
+
+
+def test_records_sharing_a_sort_value_are_not_skipped():
+    records = sorted(({"id": f"A{i}", "date": f"2025-11-0{i // 3 + 1}"} for i in range(9)),
+                     key=lambda r: record_key(r, "date"))
+    ids = walk(lambda cursor: keyset_page(records, cursor, 2, key="date"))
+    assert ids == [r["id"] for r in records]
+
+
+def test_patient_repository_pages_every_patient_once():
+    repo = PatientRepository({"id": f"P{i}"} for i in range(1, 1100))
+    repo.remove("P1000")
+    ids = walk(lambda cursor: repo.page(cursor, 64))
+    assert ids == [f"P{i}" for i in range(1, 1100) if i != 1000]
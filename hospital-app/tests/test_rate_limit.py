@@ -0,0 +1,49 @@
+from starlette.requests import Request
+
+from rate_limit import RateLimiter, client_ip
+
+ALB = "10.0.2.15"
+EDGE = "130.176.12.34"  # CloudFront origin-facing address
+VIEWER = "198.51.100.23"
+SECRET = "edge-secret"
+
+
+def request(headers=None, peer=ALB):
+    scope = {"type": "http", "method": "POST", "path": "/api/auth/login", "client": (peer, 41000),
+             "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]}
+    return Request(scope)
+
+
+def test_viewer_is_found_behind_cloudfront_and_the_alb():
+    # CloudFront appends the viewer, the ALB appends the CloudFront edge
+    headers = {"X-Forwarded-For": f"{VIEWER}, {EDGE}"}
+    assert client_ip(request(headers), hops=2, secret="") == VIEWER
+    # the old behaviour (last hop) put the whole hospital in one bucket
+    assert client_ip(request(headers), hops=1, secret="") == EDGE
+
+
+def test_client_supplied_entries_are_ignored():
+    headers = {"X-Forwarded-For": f"6.6.6.6, 7.7.7.7, {VIEWER}, {EDGE}"}
+    assert client_ip(request(headers), hops=2, secret="") == VIEWER
+
+
+def test_fewer_hops_than_proxies_and_no_header():
+    assert client_ip(request({"X-Forwarded-For": VIEWER}), hops=2, secret="") == VIEWER
+    assert client_ip(request(), hops=2, secret="") == ALB
+    assert client_ip(request({"X-Forwarded-For": f"{VIEWER}, {EDGE}"}), hops=0, secret="") == ALB
+
+
+def test_cloudfront_viewer_address_needs_the_origin_secret():
+    headers = {"X-Forwarded-For": f"{VIEWER}, {EDGE}", "CloudFront-Viewer-Address": "203.0.113.9:46532"}
+    assert client_ip(request(headers), hops=2, secret=SECRET) == VIEWER
+    headers["X-Origin-Verify"] = SECRET
+    assert client_ip(request(headers), hops=2, secret=SECRET) == "203.0.113.9"
+    headers["CloudFront-Viewer-Address"] = "2001:db8::7:46532"
+    assert client_ip(request(headers), hops=2, secret=SECRET) == "2001:db8::7"
+
+
+def test_limiter_refuses_after_the_burst():
+    limiter = RateLimiter(3, 60)
+    waits = [limiter.acquire("k", now=0) for _ in range(4)]
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3] == 20
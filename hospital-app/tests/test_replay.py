@@ -0,0 +1,35 @@
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+import replay
+
+RULES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                     "incident-response", "alert_rules.yml")
+
+
+def run(monkeypatch, tmp_path, *args):
+    scratch_root = tmp_path / "tmp"
+    scratch_root.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(scratch_root))
+    monkeypatch.setattr(sys, "argv", ["replay.py", "--rules", RULES, *args])
+    replay.main()
+    return scratch_root
+
+
+def test_scratch_directory_is_removed(monkeypatch, tmp_path, capsys):
+    scratch_root = run(monkeypatch, tmp_path, "--synthetic", "2000", "--json")
+    assert json.loads(capsys.readouterr().out)["events"] == 2000
+    assert os.listdir(scratch_root) == []
+
+
+def test_audit_log_needs_a_rule_that_reads_it(monkeypatch, tmp_path):
+    audit = tmp_path / "audit.log"
+    audit.write_text(json.dumps({"ts": "2026-03-01T12:00:00", "user": "dr.smith", "role": "doctor",
+                                 "endpoint": "/patients/P1", "patient": "P1"}) + "\n")
+    with pytest.raises(SystemExit):
+        run(monkeypatch, tmp_path, "--audit", str(audit))
+    assert os.listdir(tmp_path / "tmp") == []
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import main
+
+
+def ticket_for(client, token):
+    response = client.post("/api/stream/ticket", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    return response.json()["ticket"]
+
+
+def spend(ticket):
+    return asyncio.run(main.spend_stream_ticket(ticket))
+
+
+def test_ticket_opens_one_stream():
+    client = TestClient(main.app)
+    token = main.create_token("admin", "admin")
+    ticket = ticket_for(client, token)
+    user = spend(ticket)
+    assert user["username"] == "admin" and user["session_exp"] > user["exp"]
+    with pytest.raises(HTTPException):
+        spend(ticket)
+
+
+def test_tickets_and_sessions_are_not_interchangeable():
+    client = TestClient(main.app)
+    token = main.create_token("lab.wilson", "lab")
+    ticket = ticket_for(client, token)
+    with pytest.raises(HTTPException):
+        spend(token)
+    assert client.get("/api/lab/orders", headers={"Authorization": f"Bearer {ticket}"}).status_code == 401
+
+
+def test_logout_voids_unused_tickets():
+    client = TestClient(main.app)
+    token = main.create_token("lab.wilson", "lab")
+    ticket = ticket_for(client, token)
+    assert client.post("/api/auth/logout", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+    with pytest.raises(HTTPException):
+        spend(ticket)
@@ -0,0 +1,116 @@
+import time
+
+import jwt
+
+from account_events import AccountEvents
+from token_cache import TokenCache
+
+SECRET = "test-secret-of-at-least-thirty-two-bytes"
+
+
+def issue(username="dr.smith", iat=None, ttl=3600):
+    now = time.time() if iat is None else iat
+    payload = {"username": username, "role": "doctor", "iat": int(now), "exp": int(now) + ttl}
+    return jwt.encode(payload, SECRET, algorithm="HS256")
+
+
+def verify(cache, token):
+    """verify_token's flow: cached payload, else decode and check the denylist"""
+    payload = cache.get(token)
+    if payload is not None:
+        return payload
+    payload = jwt.decode(token, SECRET, algorithms=["HS256"])
+    if cache.is_revoked(token, payload):
+        return None
+    cache.put(token, payload)
+    return payload
+
+
+def test_revoked_token_is_rejected_after_eviction():
+    cache = TokenCache()
+    token = issue()
+    assert verify(cache, token) is not None  # now cached
+    cache.revoke(token, jwt.decode(token, SECRET, algorithms=["HS256"])["exp"])
+    assert cache.get(token) is None
+    assert verify(cache, token) is None
+    assert verify(cache, issue(username="nurse.jones")) is not None
+
+
+def test_revoked_token_is_not_recached():
+    cache = TokenCache()
+    token = issue()
+    payload = jwt.decode(token, SECRET, algorithms=["HS256"])
+    cache.revoke(token, payload["exp"])
+    cache.put(token, payload)
+    assert cache.get(token) is None
+
+
+def test_revoke_user_rejects_tokens_issued_before_only():
+    cache = TokenCache()
+    old = issue(iat=time.time() - 60)
+    assert verify(cache, old) is not None
+    cache.revoke_user("dr.smith", at=time.time() - 30)
+    assert verify(cache, old) is None
+    assert verify(cache, issue()) is not None
+
+
+def test_revocations_survive_a_disabled_cache():
+    cache = TokenCache(enabled=False)
+    token = issue()
+    cache.revoke(token, time.time() + 60)
+    assert verify(cache, token) is None
+
+
+def test_revoked_digests_are_forgotten_once_expired():
+    cache = TokenCache()
+    cache.revoke(issue(), time.time() - 1)
+    cache.revoke(issue(username="a"), time.time() + 60)
+    assert cache.revoked_count() == 1
+
+
+def test_token_issued_in_the_same_second_after_revoke_user_is_accepted():
+    cache = TokenCache()
+    at = int(time.time()) + 0.4
+    cache.revoke_user("dr.smith", at=at)
+    before = jwt.encode({"username": "dr.smith", "iat": at - 0.2, "exp": at + 60}, SECRET, algorithm="HS256")
+    after = jwt.encode({"username": "dr.smith", "iat": at + 0.2, "exp": at + 60}, SECRET, algorithm="HS256")
+    assert verify(cache, before) is None
+    assert verify(cache, after) is not None
+
+
+class EventLog:
+    """In-memory stand-in for db.AccountEventStore"""
+
+    def __init__(self):
+        self.rows = []
+
+    def add(self, kind, subject, at, expires=None, value=None):
+        self.rows.append((len(self.rows) + 1, kind, subject, at, expires, value))
+
+    def since(self, last_id):
+        return self.rows[last_id:]
+
+
+def test_revocations_locks_and_passwords_reach_the_other_workers():
+    log = EventLog()
+    passwords = {}
+    one = AccountEvents(TokenCache(), 3600, store=log)
+    two = AccountEvents(TokenCache(), 3600, store=log, on_password=passwords.__setitem__)
+    token, other = issue(iat=time.time() - 10), issue(username="nurse.jones", iat=time.time() - 10)
+    assert verify(two.token_cache, token) is not None  # cached in worker two
+
+    one.revoke_token(token, time.time() + 60)
+    assert verify(two.token_cache, token) is not None  # not synced yet
+    two.sync()
+    assert verify(two.token_cache, token) is None
+
+    one.lock("nurse.jones", time.time() + 60)
+    one.change_password("dr.smith", "new-hash")
+    two.sync()
+    assert two.is_locked("nurse.jones")
+    assert verify(two.token_cache, other) is None
+    assert passwords == {"dr.smith": "new-hash"}
+
+    one.unlock("nurse.jones")
+    two.sync()
+    assert not two.is_locked("nurse.jones")
@@ -0,0 +1,154 @@
+"""
+Bounded LRU cache of validated JWT payloads, plus the revocation denylist
+Keyed by SHA-256 digest of the raw token so the cache never holds bearer tokens.
+A revoked token's digest is denied until the token's own exp, and revoking a
+user denies every token of theirs issued (iat) at or before the revocation;
+tokens carry a fractional iat so one issued just after, in the same second,
+is still accepted. verify_token checks is_revoked() on freshly decoded tokens;
+cached entries are dropped on revocation and put() refuses revoked ones.
+The denylist is per process: account_events.py shares it between workers.
+"""
+import hashlib
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class TokenCache:
+    def __init__(self, maxsize=10000, enabled=True, hit_counter=None, miss_counter=None):
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._hit_counter = hit_counter
+        self._miss_counter = miss_counter
+        # digest -> (payload, exp)
+        self._entries = OrderedDict()
+        # username -> set of digests, for revoking every token of a user
+        self._by_user = {}
+        # digest -> exp of revoked tokens, with a min-heap to forget them once they expire
+        self._revoked = {}
+        self._revoked_heap = []
+        # username -> time before which (inclusive) their tokens are rejected
+        self._not_before = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop(self, digest):
+        payload, _ = self._entries.pop(digest)
+        digests = self._by_user.get(payload.get("username"))
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_user[payload.get("username")]
+
+    def _record(self, hit: bool):
+        if hit:
+            self.hits += 1
+            if self._hit_counter is not None:
+                self._hit_counter.inc()
+        else:
+            self.misses += 1
+            if self._miss_counter is not None:
+                self._miss_counter.inc()
+
+    def get(self, token: str) -> Optional[dict]:
+        """Return the cached payload, or None if absent or past its exp"""
+        if not self.enabled:
+            return None
+        digest = self.digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[1] <= time.time():
+                self._drop(digest)
+                entry = None
+            if entry is None:
+                self._record(False)
+                return None
+            self._entries.move_to_end(digest)
+            self._record(True)
+            return entry[0]
+
+    def put(self, token: str, payload: dict):
+        """Cache a payload that has just passed full signature verification"""
+        exp = payload.get("exp")
+        if not self.enabled or exp is None or exp <= time.time():
+            return
+        digest = self.digest(token)
+        with self._lock:
+            if self._denied(digest, payload):
+                return
+            if digest in self._entries:
+                self._drop(digest)
+            self._entries[digest] = (payload, exp)
+            self._by_user.setdefault(payload.get("username"), set()).add(digest)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    # ---- Revocation ----
+
+    def _denied(self, digest: bytes, payload: dict) -> bool:
+        if digest in self._revoked:
+            return True
+        not_before = self._not_before.get(payload.get("username"))
+        # tokens minted before iat was added carry none; treat them as old
+        return not_before is not None and payload.get("iat", 0) <= not_before
+
+    def _expire_revoked(self, now: float):
+        heap = self._revoked_heap
+        while heap and heap[0][0] <= now:
+            _, digest = heapq.heappop(heap)
+            self._revoked.pop(digest, None)
+
+    def is_revoked(self, token: str, payload: dict) -> bool:
+        """Whether a token that passed signature verification has been revoked since"""
+        digest = self.digest(token)
+        with self._lock:
+            return self._denied(digest, payload)
+
+    def digest_revoked(self, digest: bytes) -> bool:
+        """Whether the token with this digest was revoked on its own (logout)"""
+        with self._lock:
+            return digest in self._revoked
+
+    def revoke(self, token: str, exp: float):
+        """Deny a single token until its exp (logout, stolen token)"""
+        self.revoke_digest(self.digest(token), exp)
+
+    def revoke_digest(self, digest: bytes, exp: float):
+        """revoke() by the token's digest, as shared with other workers"""
+        now = time.time()
+        with self._lock:
+            self._expire_revoked(now)
+            if digest in self._entries:
+                self._drop(digest)
+            if exp > now and digest not in self._revoked:
+                self._revoked[digest] = exp
+                heapq.heappush(self._revoked_heap, (exp, digest))
+
+    def revoke_user(self, username: str, at: float = None):
+        """Deny every token of a user issued up to now (account lock, password change)"""
+        at = time.time() if at is None else at
+        with self._lock:
+            self._not_before[username] = max(at, self._not_before.get(username, 0))
+            for digest in list(self._by_user.get(username, ())):
+                self._drop(digest)
+
+    def revoked_count(self) -> int:
+        with self._lock:
+            self._expire_revoked(time.time())
+            return len(self._revoked)
+
+    def clear(self):
+        """Empty the cache; revocations are kept"""
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
@@ -5,6 +5,10 @@ terraform {
       source  = "hashicorp/aws"
       version = "~> 5.0"
     }
+    random = {
+      source  = "hashicorp/random"
+      version = "~> 3.0"
+    }
   }
 }
 
@@ -329,6 +333,13 @@ resource "aws_wafv2_web_acl" "main" {
   }
 }
 
+# Shared secret CloudFront adds to origin requests; the app trusts the
+# viewer-region header only when it is present (EDGE_AUTH_SECRET)
+resource "random_password" "edge_auth" {
+  length  = 32
+  special = false
+}
+
 # CloudFront Distribution
 resource "aws_cloudfront_distribution" "main" {
   enabled         = true
@@ -341,6 +352,11 @@ resource "aws_cloudfront_distribution" "main" {
     domain_name = aws_lb.app.dns_name
     origin_id   = "hospital-alb"
 
+    custom_header {
+      name  = "X-Origin-Verify"
+      value = random_password.edge_auth.result
+    }
+
     custom_origin_config {
       http_port              = 80
       https_port             = 443
@@ -357,6 +373,7 @@ resource "aws_cloudfront_distribution" "main" {
 
     forwarded_values {
       query_string = true
+      headers      = ["CloudFront-Viewer-Country-Region", "CloudFront-Viewer-Address"]
       cookies {
         forward = "all"
       }
@@ -396,6 +413,11 @@ output "cloudfront_url" {
   value = aws_cloudfront_distribution.main.domain_name
 }
 
+output "edge_auth_secret" {
+  value     = random_password.edge_auth.result
+  sensitive = true
+}
+
 output "app_sg_id" {
   value = aws_security_group.app.id
 }